@@ -0,0 +1,151 @@
+"""Admission control for outbound model calls.
+
+Each kind of provider call (chat, spell text, images) gets its own
+concurrency pool. Requests beyond a pool's capacity wait in a priority
+queue (paid before free before anonymous, first come first served within
+a tier) for at most `queue_timeout` seconds. When the queue is full a new
+request is turned away immediately, unless it outranks the lowest-priority
+waiter, which is turned away in its place. Rejections carry a Retry-After
+estimate derived from the pool's recent call durations.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple
+
+PRIORITY_PAID = 0
+PRIORITY_FREE = 1
+PRIORITY_ANONYMOUS = 2
+
+# Weight of the newest call duration in the running average
+HOLD_SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(f'{pool} capacity exhausted, retry after {retry_after}s')
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class _Pool:
+    def __init__(self, name: str, capacity: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiters = []
+        self.avg_hold = 5.0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.evicted = 0
+        self._queue_seconds = 0.0
+
+
+class AdmissionController:
+    def __init__(self, pools: Dict[str, Tuple[int, int, float]]):
+        """`pools` maps a pool name to (capacity, max_queue, queue_timeout seconds)"""
+        self._pools = {name: _Pool(name, *limits) for name, limits in pools.items()}
+        self._sequence = itertools.count()
+
+    def retry_after(self, name: str) -> int:
+        pool = self._pools[name]
+        return max(1, math.ceil((len(pool.waiters) + 1) * pool.avg_hold / pool.capacity))
+
+    def saturated(self, name: str, priority: int) -> bool:
+        """True when a request at `priority` would be turned away right now"""
+        pool = self._pools[name]
+        if len(pool.waiters) < pool.max_queue:
+            return False
+        return not pool.waiters or priority >= max(pool.waiters)[0]
+
+    @asynccontextmanager
+    async def slot(self, name: str, priority: int):
+        pool = self._pools[name]
+        await self._acquire(pool, priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            pool.avg_hold += HOLD_SMOOTHING * (held - pool.avg_hold)
+            self._release(pool)
+
+    async def _acquire(self, pool: _Pool, priority: int):
+        if pool.active < pool.capacity and not pool.waiters:
+            pool.active += 1
+            pool.admitted += 1
+            return
+
+        if len(pool.waiters) >= pool.max_queue:
+            worst = max(pool.waiters) if pool.waiters else None
+            if worst is None or priority >= worst[0]:
+                pool.rejected += 1
+                raise AdmissionRejected(pool.name, self.retry_after(pool.name))
+            # Make room by turning away the lowest-priority, most recent waiter
+            self._remove(pool, worst)
+            pool.evicted += 1
+            worst[2].set_exception(AdmissionRejected(pool.name, self.retry_after(pool.name)))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._sequence), future)
+        heapq.heappush(pool.waiters, entry)
+        pool.queued += 1
+        enqueued = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), pool.queue_timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._remove(pool, entry)
+                future.cancel()
+                pool.timed_out += 1
+                raise AdmissionRejected(pool.name, self.retry_after(pool.name))
+        except asyncio.CancelledError:
+            # The caller went away; hand on a slot that was granted in the meantime
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release(pool)
+            elif not future.done():
+                self._remove(pool, entry)
+                future.cancel()
+            raise
+        # Evicted waiters see their AdmissionRejected here
+        future.result()
+        pool.admitted += 1
+        pool._queue_seconds += time.monotonic() - enqueued
+
+    def _release(self, pool: _Pool):
+        # Hand the slot straight to the best waiter so the count never dips below capacity
+        while pool.waiters:
+            _, _, future = heapq.heappop(pool.waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        pool.active -= 1
+
+    @staticmethod
+    def _remove(pool: _Pool, entry):
+        pool.waiters.remove(entry)
+        heapq.heapify(pool.waiters)
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                'capacity': pool.capacity,
+                'active': pool.active,
+                'waiting': len(pool.waiters),
+                'admitted': pool.admitted,
+                'queued': pool.queued,
+                'rejected': pool.rejected,
+                'timed_out': pool.timed_out,
+                'evicted': pool.evicted,
+                'avg_hold_seconds': round(pool.avg_hold, 2),
+                'avg_queue_ms': round(pool._queue_seconds / (pool.queued or 1) * 1000, 1)
+            }
+            for name, pool in self._pools.items()
+        }
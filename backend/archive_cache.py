@@ -0,0 +1,159 @@
+"""In-memory snapshots of the reference archive.
+
+The archive collections (deities, figures, sites, rituals, timeline) only
+change when seed_data.py runs, so each one is loaded once into an immutable
+snapshot indexed by id (and rituals by category) and served without
+touching Mongo. Snapshots are rebuilt when a change stream reports a write,
+or, on deployments without a replica set, when the version document that
+seed_data.py bumps changes.
+"""
+import asyncio
+import logging
+from types import MappingProxyType
+from typing import Optional
+
+from pymongo.errors import PyMongoError
+
+# Collection name -> sort applied when the snapshot is built
+ARCHIVE_COLLECTIONS = {
+    'deities': None,
+    'historical_figures': None,
+    'sacred_sites': None,
+    'rituals': None,
+    'timeline_events': ('year', 1),
+}
+
+ARCHIVE_VERSION_ID = 'archive'
+
+
+class ArchiveSnapshot:
+    """Read-only view of one collection; callers must not mutate the items"""
+
+    __slots__ = ('name', 'version', 'items', 'by_id', 'by_category')
+
+    def __init__(self, name: str, version: int, items: list):
+        self.name = name
+        self.version = version
+        self.items = tuple(items)
+        self.by_id = MappingProxyType({item['id']: item for item in self.items if 'id' in item})
+        categories = {}
+        for item in self.items:
+            if 'category' in item:
+                categories.setdefault(item['category'], []).append(item)
+        self.by_category = MappingProxyType({key: tuple(value) for key, value in categories.items()})
+
+
+class ArchiveCache:
+    def __init__(self, db, poll_interval: float = 30, debounce: float = 0.5):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.snapshots = {}
+        self.mode = None
+        self.reloads = 0
+        self._seed_version = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._pending = set()
+        self._reload_task: Optional[asyncio.Task] = None
+        self._listeners = []
+
+    async def start(self):
+        self._seed_version = await self._read_seed_version()
+        await self.reload(ARCHIVE_COLLECTIONS)
+        self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        for task in (self._watch_task, self._reload_task):
+            if task:
+                task.cancel()
+        await asyncio.gather(
+            *[task for task in (self._watch_task, self._reload_task) if task],
+            return_exceptions=True
+        )
+
+    def on_reload(self, callback):
+        """Register `callback(name, snapshot)` to run after a collection is reloaded"""
+        self._listeners.append(callback)
+
+    def list(self, name: str) -> tuple:
+        return self.snapshots[name].items
+
+    def get(self, name: str, item_id: str) -> Optional[dict]:
+        return self.snapshots[name].by_id.get(item_id)
+
+    def by_category(self, name: str, category: str) -> tuple:
+        return self.snapshots[name].by_category.get(category, ())
+
+    def version(self, name: str) -> int:
+        return self.snapshots[name].version
+
+    async def reload(self, names):
+        for name in names:
+            cursor = self.db[name].find({}, {'_id': 0})
+            sort = ARCHIVE_COLLECTIONS[name]
+            if sort:
+                cursor = cursor.sort(*sort)
+            items = await cursor.to_list(None)
+            previous = self.snapshots.get(name)
+            snapshot = ArchiveSnapshot(name, previous.version + 1 if previous else 1, items)
+            # Swap the whole snapshot at once so readers never see a partial load
+            self.snapshots[name] = snapshot
+            self.reloads += 1
+            for callback in self._listeners:
+                callback(name, snapshot)
+
+    def stats(self) -> dict:
+        return {
+            'mode': self.mode,
+            'reloads': self.reloads,
+            'collections': {
+                name: {'items': len(snapshot.items), 'version': snapshot.version}
+                for name, snapshot in self.snapshots.items()
+            }
+        }
+
+    async def _read_seed_version(self):
+        doc = await self.db.archive_meta.find_one({'_id': ARCHIVE_VERSION_ID})
+        return doc.get('version') if doc else None
+
+    async def _watch(self):
+        try:
+            self.mode = 'change_stream'
+            pipeline = [{'$match': {'ns.coll': {'$in': list(ARCHIVE_COLLECTIONS)}}}]
+            async with self.db.watch(pipeline) as stream:
+                async for change in stream:
+                    self._schedule_reload(change['ns']['coll'])
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            # Change streams need a replica set; standalone servers fall back to polling
+            logging.info(f'Archive change stream unavailable ({str(e)}), polling archive version')
+        self.mode = 'poll'
+        await self._poll()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                version = await self._read_seed_version()
+                if version != self._seed_version:
+                    self._seed_version = version
+                    await self.reload(ARCHIVE_COLLECTIONS)
+            except PyMongoError as e:
+                logging.error(f'Archive version poll failed: {str(e)}')
+
+    def _schedule_reload(self, name: str):
+        # A reseed is a delete_many plus insert_many; batch its events into one reload
+        self._pending.add(name)
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload_pending())
+
+    async def _reload_pending(self):
+        # Events that arrive while reloading are picked up by the next pass
+        while self._pending:
+            await asyncio.sleep(self.debounce)
+            names, self._pending = self._pending, set()
+            try:
+                await self.reload(names)
+            except PyMongoError as e:
+                logging.error(f'Archive reload failed: {str(e)}')
@@ -0,0 +1,155 @@
+"""Content-addressed storage for generated images.
+
+Blobs are stored once under the SHA-256 of their bytes, so saving the same
+image to several grimoires (or generating it twice) costs one copy.
+Documents keep only the hash and clients fetch the bytes from
+/api/images/{hash}, which can be cached forever since a hash never changes.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+
+_HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_content_hash(value: str) -> bool:
+    return bool(value and _HASH_RE.match(value))
+
+
+def sniff_content_type(data: bytes) -> str:
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    return 'application/octet-stream'
+
+
+class FileSystemBlobStore:
+    """Blobs as files under `root/ab/cd/<hash>`; a stand-in for an object store"""
+
+    name = 'filesystem'
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    async def setup(self):
+        await asyncio.to_thread(self.root.mkdir, parents=True, exist_ok=True)
+
+    def _path(self, blob_hash: str) -> Path:
+        return self.root / blob_hash[:2] / blob_hash[2:4] / blob_hash
+
+    async def put(self, data: bytes) -> str:
+        blob_hash = content_hash(data)
+        await asyncio.to_thread(self._write, self._path(blob_hash), data)
+        return blob_hash
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+
+    async def get(self, blob_hash: str) -> Optional[bytes]:
+        path = self._path(blob_hash)
+        try:
+            return await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            return None
+
+    async def exists(self, blob_hash: str) -> bool:
+        return await asyncio.to_thread(self._path(blob_hash).exists)
+
+    async def delete(self, blob_hash: str):
+        try:
+            await asyncio.to_thread(self._path(blob_hash).unlink)
+        except FileNotFoundError:
+            pass
+
+
+class GridFSBlobStore:
+    """Blobs in a GridFS bucket, using the hash as the file name"""
+
+    name = 'gridfs'
+
+    def __init__(self, db, bucket_name: str = 'images'):
+        self.db = db
+        self.bucket_name = bucket_name
+        self.files = db[f'{bucket_name}.files']
+        self._bucket = None
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        # Built on first use: the bucket binds to the running event loop, and the store is created at import time
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(self.db, bucket_name=self.bucket_name)
+        return self._bucket
+
+    async def setup(self):
+        # The unique filename index is declared in db_indexes and built by ensure_indexes
+        pass
+
+    async def put(self, data: bytes) -> str:
+        blob_hash = content_hash(data)
+        if not await self.exists(blob_hash):
+            try:
+                await self.bucket.upload_from_stream(
+                    blob_hash, data, metadata={'content_type': sniff_content_type(data)}
+                )
+            except Exception:
+                # A concurrent upload of the same bytes won the unique index race
+                if not await self.exists(blob_hash):
+                    raise
+        return blob_hash
+
+    async def get(self, blob_hash: str) -> Optional[bytes]:
+        try:
+            stream = await self.bucket.open_download_stream_by_name(blob_hash)
+        except NoFile:
+            return None
+        return await stream.read()
+
+    async def exists(self, blob_hash: str) -> bool:
+        return await self.files.find_one({'filename': blob_hash}, {'_id': 1}) is not None
+
+    async def delete(self, blob_hash: str):
+        doc = await self.files.find_one({'filename': blob_hash}, {'_id': 1})
+        if doc:
+            await self.bucket.delete(doc['_id'])
+
+
+async def read_blob(store, blob_hash: str) -> Optional[Tuple[bytes, str]]:
+    """Return (bytes, content type) for a stored blob, or None"""
+    if not is_content_hash(blob_hash):
+        return None
+    data = await store.get(blob_hash)
+    if data is None:
+        return None
+    return data, sniff_content_type(data)
+
+
+def create_blob_store(db, backend: str = 'gridfs', root: Optional[str] = None):
+    if backend == 'gridfs':
+        return GridFSBlobStore(db)
+    if backend == 'filesystem':
+        return FileSystemBlobStore(root or str(Path(__file__).parent / 'blobs'))
+    raise ValueError(f'Unknown blob store backend: {backend}')
@@ -0,0 +1,150 @@
+"""Persistent chat sessions with a bounded prompt history.
+
+/api/ai/chat used to rely on the provider library's in-process memory for
+continuity, which was lost across workers and restarts and grew without
+limit. Sessions now live in Mongo: each turn is appended atomically, and
+once the stored turns exceed the session's token budget the oldest ones
+are folded into a short running summary (an excerpt per turn, itself
+capped in size). Only the summary and the recent turns are sent to the
+model, so prompt size stays bounded however long a conversation runs.
+
+Each session belongs to the user who started it (`owner`, None for an
+anonymous seeker). Loads and appends are filtered by owner, and a client
+that sends a session id belonging to someone else is given a new session
+instead, so one seeker can never read or extend another's conversation.
+"""
+import re
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from token_metrics import estimate_tokens
+
+# Turns always kept verbatim, however long they are
+MIN_RECENT_TURNS = 2
+
+# The running summary keeps its newest lines within this many characters
+SUMMARY_MAX_CHARS = 1500
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def _excerpt(turn: dict, limit: int = 160) -> str:
+    first_sentence = _SENTENCE_RE.split(turn['content'].strip(), 1)[0]
+    if len(first_sentence) > limit:
+        first_sentence = first_sentence[:limit].rsplit(' ', 1)[0] + '...'
+    speaker = 'Seeker' if turn['role'] == 'user' else 'Guide'
+    return f'{speaker}: {first_sentence}'
+
+
+class ChatSession:
+    __slots__ = ('id', 'archetype', 'summary', 'turns', 'version')
+
+    def __init__(self, session_id: str, archetype: Optional[str] = None, summary: str = '', turns=None, version: int = 0):
+        self.id = session_id
+        self.archetype = archetype
+        self.summary = summary
+        self.turns = list(turns or [])
+        self.version = version
+
+    @property
+    def tokens(self) -> int:
+        return sum(turn['tokens'] for turn in self.turns)
+
+
+class ChatSessionStore:
+    def __init__(self, collection, token_budget: int = 3000, ttl_days: int = 30):
+        self.collection = collection
+        self.token_budget = token_budget
+        self.ttl_days = ttl_days
+        self.compactions = 0
+        self.compacted_turns = 0
+
+    async def resolve(self, session_id: Optional[str], owner: Optional[str]) -> str:
+        """The session id to use: the requested one if it is new or the owner's, else a fresh one"""
+        if session_id:
+            doc = await self.collection.find_one({'id': session_id}, {'_id': 0, 'owner': 1})
+            if doc is None or doc.get('owner') == owner:
+                return session_id
+        return str(uuid.uuid4())
+
+    async def load(self, session_id: str, owner: Optional[str]) -> Optional[ChatSession]:
+        doc = await self.collection.find_one({'id': session_id, 'owner': owner}, {'_id': 0})
+        if not doc:
+            return None
+        return ChatSession(doc['id'], doc.get('archetype'), doc.get('summary', ''), doc.get('turns'), doc.get('version', 0))
+
+    def context(self, session: Optional[ChatSession]) -> Tuple[str, List[dict]]:
+        """Return (summary, messages) to send, within budget even if a compaction write was skipped"""
+        if session is None:
+            return '', []
+        summary, turns, _ = self._fold(session)
+        return summary, [{'role': turn['role'], 'content': turn['content']} for turn in turns]
+
+    @staticmethod
+    def system_message(base: str, summary: str) -> str:
+        if summary:
+            return f'{base}\n\nEarlier in this conversation:\n{summary}'
+        return base
+
+    async def append(self, session_id: str, owner: Optional[str], archetype: Optional[str], user_text: str, reply: str) -> ChatSession:
+        """Record one exchange, compacting the session if it is now over budget"""
+        now = datetime.now(timezone.utc)
+        turns = [
+            {'role': 'user', 'content': user_text, 'tokens': estimate_tokens(user_text)},
+            {'role': 'assistant', 'content': reply, 'tokens': estimate_tokens(reply)},
+        ]
+        # Filtering on the owner means another seeker's session id fails the unique index instead of matching
+        doc = await self.collection.find_one_and_update(
+            {'id': session_id, 'owner': owner},
+            {
+                '$push': {'turns': {'$each': turns}},
+                '$inc': {'version': 1},
+                '$set': {'archetype': archetype, 'updated_at': now.isoformat(), 'expires_at': now + timedelta(days=self.ttl_days)},
+                '$setOnInsert': {'created_at': now.isoformat(), 'summary': ''}
+            },
+            projection={'_id': 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        session = ChatSession(doc['id'], doc.get('archetype'), doc.get('summary', ''), doc.get('turns'), doc.get('version', 0))
+        if session.tokens > self.token_budget:
+            await self._compact(session)
+        return session
+
+    def _fold(self, session: ChatSession) -> Tuple[str, list, int]:
+        turns = list(session.turns)
+        lines = session.summary.splitlines() if session.summary else []
+        tokens = session.tokens
+        folded = 0
+        while tokens > self.token_budget and len(turns) > MIN_RECENT_TURNS:
+            turn = turns.pop(0)
+            tokens -= turn['tokens']
+            lines.append(_excerpt(turn))
+            folded += 1
+        while lines and sum(len(line) + 1 for line in lines) > SUMMARY_MAX_CHARS:
+            lines.pop(0)
+        return '\n'.join(lines), turns, folded
+
+    async def _compact(self, session: ChatSession):
+        summary, turns, folded = self._fold(session)
+        if not folded:
+            return
+        # Another turn may have been appended meanwhile; it will compact on its own write
+        result = await self.collection.update_one(
+            {'id': session.id, 'version': session.version},
+            {'$set': {'summary': summary, 'turns': turns}, '$inc': {'version': 1}}
+        )
+        if result.modified_count:
+            session.summary, session.turns, session.version = summary, turns, session.version + 1
+            self.compactions += 1
+            self.compacted_turns += folded
+
+    def stats(self) -> dict:
+        return {
+            'token_budget': self.token_budget,
+            'compactions': self.compactions,
+            'compacted_turns': self.compacted_turns
+        }
@@ -0,0 +1,250 @@
+"""Index definitions for every collection the API queries.
+
+The server looks users up by id and email on every authenticated request,
+pages grimoires by (user_id, created_at) and finds payments by Stripe
+session id; without these indexes each of those is a collection scan.
+The caches, job queue and image pool declare theirs here too, including
+the TTL indexes that expire their documents, so this is the one place a
+deployment's indexes are defined. `ensure_indexes` is idempotent and runs
+at startup. The same module is a CLI for checking a deployment and for
+measuring lookup latency:
+
+    python db_indexes.py             # create missing indexes, report extras
+    python db_indexes.py --check     # report only, change nothing
+    python db_indexes.py --benchmark --users 1000000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import time
+import uuid
+from pathlib import Path
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Collection -> indexes the code relies on. Unique where the code assumes
+# at most one match (register/update-email check emails, ids are uuids).
+INDEXES = {
+    'users': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+    ],
+    'user_spells': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+        IndexModel([('user_id', ASCENDING), ('created_at', DESCENDING), ('id', DESCENDING)], name='user_created'),
+        # The image cache checks whether a saved spell still references a blob before deleting it
+        IndexModel([('image_hash', ASCENDING)], name='image_hash', sparse=True),
+    ],
+    'payment_transactions': [
+        IndexModel([('session_id', ASCENDING)], name='session_id_unique', unique=True),
+    ],
+    'waitlist': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+    ],
+    'deities': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+    ],
+    'historical_figures': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+    ],
+    'sacred_sites': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+    ],
+    'rituals': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+        IndexModel([('category', ASCENDING)], name='category'),
+    ],
+    'timeline_events': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+        IndexModel([('year', ASCENDING)], name='year'),
+    ],
+    'chat_sessions': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+    ],
+    'spell_cache': [
+        IndexModel([('key', ASCENDING)], name='key_unique', unique=True),
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+        IndexModel([('last_access', ASCENDING)], name='last_access'),
+        IndexModel([('value.image_hash', ASCENDING)], name='image_hash', sparse=True),
+    ],
+    'image_jobs': [
+        IndexModel([('id', ASCENDING)], name='id_unique', unique=True),
+        IndexModel([('expires_at', ASCENDING)], name='expires_at_ttl', expireAfterSeconds=0),
+        IndexModel([('image_hash', ASCENDING)], name='image_hash', sparse=True),
+    ],
+    'image_cache': [
+        IndexModel([('key', ASCENDING)], name='key_unique', unique=True),
+        IndexModel([('last_used_at', ASCENDING)], name='last_used_at'),
+        IndexModel([('image_hash', ASCENDING)], name='image_hash'),
+    ],
+    'image_cache_releases': [
+        IndexModel([('image_hash', ASCENDING)], name='image_hash_unique', unique=True),
+        IndexModel([('release_after', ASCENDING)], name='release_after'),
+    ],
+    'image_pool': [
+        IndexModel([('key', ASCENDING), ('created_at', ASCENDING)], name='key_created'),
+    ],
+    'image_derivatives': [
+        IndexModel([('source', ASCENDING)], name='source_unique', unique=True),
+    ],
+    # GridFS image store: one file per content hash. The second index is the
+    # one the driver builds itself, declared so it is not reported as extra.
+    'images.files': [
+        IndexModel([('filename', ASCENDING)], name='filename_unique', unique=True),
+        IndexModel([('filename', ASCENDING), ('uploadDate', ASCENDING)], name='filename_1_uploadDate_1'),
+    ],
+}
+
+
+def _signature(key, unique) -> tuple:
+    return tuple((field, int(direction)) for field, direction in key), bool(unique)
+
+
+async def _existing_signatures(collection) -> dict:
+    info = await collection.index_information()
+    return {
+        _signature(spec['key'], spec.get('unique')): name
+        for name, spec in info.items() if name != '_id_'
+    }
+
+
+async def index_report(db, collections=None) -> dict:
+    """Return {collection: {'present', 'missing', 'extra'}} without changing anything"""
+    report = {}
+    for name in collections or INDEXES:
+        existing = await _existing_signatures(db[name])
+        declared = {
+            _signature(model.document['key'].items(), model.document.get('unique')): model.document['name']
+            for model in INDEXES[name]
+        }
+        report[name] = {
+            'present': sorted(declared[signature] for signature in declared if signature in existing),
+            'missing': sorted(declared[signature] for signature in declared if signature not in existing),
+            'extra': sorted(existing[signature] for signature in existing if signature not in declared)
+        }
+    return report
+
+
+async def ensure_indexes(db, collections=None) -> dict:
+    """Create missing indexes and return the report, with any failures under 'failed'"""
+    report = await index_report(db, collections)
+    for name, entry in report.items():
+        entry['created'] = []
+        entry['failed'] = {}
+        for model in INDEXES[name]:
+            index_name = model.document['name']
+            if index_name not in entry['missing']:
+                continue
+            try:
+                await db[name].create_indexes([model])
+                entry['created'].append(index_name)
+            except OperationFailure as e:
+                # Usually duplicate values under a unique index; the data needs fixing first
+                entry['failed'][index_name] = str(e)
+                logging.error(f'Could not create index {name}.{index_name}: {str(e)}')
+        entry['missing'] = sorted(entry['failed'])
+    return report
+
+
+def _print_report(report: dict):
+    for name, entry in report.items():
+        print(f'{name}:')
+        for key in ('present', 'created', 'missing', 'extra'):
+            if entry.get(key):
+                print(f"  {key}: {', '.join(entry[key])}")
+        for index_name, error in entry.get('failed', {}).items():
+            print(f'  failed: {index_name} ({error})')
+
+
+async def _time_lookups(collection, queries) -> list:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        await collection.find_one(query, {'_id': 0})
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _summary(label: str, timings: list) -> str:
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    return f'{label}: p50 {statistics.median(timings):.2f} ms, p99 {p99:.2f} ms ({len(timings)} lookups)'
+
+
+async def benchmark(client, db_name: str, users: int, lookups: int, scan_lookups: int):
+    """Time users lookups by id and email before and after indexing, in a scratch database"""
+    bench_db = client[f'{db_name}_index_benchmark']
+    await client.drop_database(bench_db.name)
+    try:
+        print(f'Inserting {users} users into {bench_db.name}...')
+        ids = []
+        batch = []
+        for i in range(users):
+            user_id = str(uuid.uuid4())
+            ids.append(user_id)
+            batch.append({
+                'id': user_id,
+                'email': f'seeker{i}@example.com',
+                'name': f'Seeker {i}',
+                'subscription_tier': 'free',
+                'spell_generation_count': 0
+            })
+            if len(batch) == 10000:
+                await bench_db.users.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            await bench_db.users.insert_many(batch, ordered=False)
+
+        def sample(count):
+            picks = random.sample(range(users), min(count, users))
+            return [{'id': ids[i]} for i in picks], [{'email': f'seeker{i}@example.com'} for i in picks]
+
+        # Unindexed lookups scan the whole collection, so take fewer of them
+        by_id, by_email = sample(scan_lookups)
+        print(_summary('no index, by id', await _time_lookups(bench_db.users, by_id)))
+        print(_summary('no index, by email', await _time_lookups(bench_db.users, by_email)))
+
+        start = time.perf_counter()
+        await ensure_indexes(bench_db, ['users'])
+        print(f'Index build: {time.perf_counter() - start:.1f} s')
+
+        by_id, by_email = sample(lookups)
+        print(_summary('indexed, by id', await _time_lookups(bench_db.users, by_id)))
+        print(_summary('indexed, by email', await _time_lookups(bench_db.users, by_email)))
+    finally:
+        await client.drop_database(bench_db.name)
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description='Create and check MongoDB indexes')
+    parser.add_argument('--check', action='store_true', help='report missing and extra indexes without creating any')
+    parser.add_argument('--benchmark', action='store_true', help='time users lookups in a scratch database')
+    parser.add_argument('--users', type=int, default=1000000, help='users to insert for --benchmark')
+    parser.add_argument('--lookups', type=int, default=1000, help='indexed lookups to time for --benchmark')
+    parser.add_argument('--scan-lookups', type=int, default=20, help='unindexed lookups to time for --benchmark')
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db_name = os.environ['DB_NAME']
+    try:
+        if args.benchmark:
+            await benchmark(client, db_name, args.users, args.lookups, args.scan_lookups)
+        elif args.check:
+            _print_report(await index_report(client[db_name]))
+        else:
+            _print_report(await ensure_indexes(client[db_name]))
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,190 @@
+"""Persistent cache of rendered images by prompt.
+
+An image call is the slowest and most expensive request the API makes, and
+the final styled prompt (archetype style prefix plus the seeker's prompt)
+is often byte-identical to a recent one. Renders are recorded in Mongo
+under the SHA-256 of (model, prompt) and point at the content-addressed
+blob, so every worker shares hits. The cache is bounded by the total size
+of the blobs it references, counting a blob shared by several prompts once:
+once over budget, the least recently used entries are dropped. Each process
+keeps a running byte count and only pays for the aggregate over the whole
+collection when that count crosses the budget, or every `RESYNC_EVERY`
+puts to pick up what other workers stored.
+
+A dropped or replaced image may still be on a seeker's screen, in a cached
+spell or in an image job result, so its blob is not deleted straight away.
+It is queued for release after `grace_seconds`. That period is longer than
+those caches keep results, and the blob is only deleted then if nothing
+(another cache entry, or the `in_use` check) references it any more.
+"""
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from pymongo import ReturnDocument
+
+RESYNC_EVERY = 100
+
+
+def image_cache_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f'{model}\n{prompt}'.encode('utf-8')).hexdigest()
+
+
+class ImagePromptCache:
+    def __init__(
+        self,
+        collection,
+        releases,
+        store,
+        max_bytes: int = 1024 * 1024 * 1024,
+        in_use: Optional[Callable[[str], Awaitable[bool]]] = None,
+        on_release: Optional[Callable[[str], Awaitable[None]]] = None,
+        grace_seconds: int = 2 * 86400,
+    ):
+        self.collection = collection
+        self.releases = releases
+        self.store = store
+        self.max_bytes = max_bytes
+        self.in_use = in_use
+        self.on_release = on_release
+        self.grace_seconds = grace_seconds
+        self._evicting = False
+        self._bytes: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.released = 0
+
+    async def get(self, model: str, prompt: str) -> Optional[str]:
+        """The image hash of an earlier render of this exact prompt, marking it recently used"""
+        doc = await self.collection.find_one_and_update(
+            {'key': image_cache_key(model, prompt)},
+            {'$set': {'last_used_at': datetime.now(timezone.utc)}, '$inc': {'hits': 1}},
+            projection={'_id': 0, 'image_hash': 1}
+        )
+        if doc is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return doc['image_hash']
+
+    async def put(self, model: str, prompt: str, image_hash: str, size: int):
+        """Record a render; a fresh variation replaces the prompt's earlier image"""
+        now = datetime.now(timezone.utc)
+        previous = await self.collection.find_one_and_update(
+            {'key': image_cache_key(model, prompt)},
+            {
+                '$set': {'image_hash': image_hash, 'bytes': size, 'last_used_at': now},
+                '$setOnInsert': {'model': model, 'prompt': prompt, 'hits': 0, 'created_at': now}
+            },
+            projection={'_id': 0, 'image_hash': 1, 'bytes': 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        self.stored += 1
+        replaced = previous is not None and previous['image_hash'] != image_hash
+        if replaced:
+            await self._retire(previous['image_hash'])
+        try:
+            if self._bytes is None or self.stored % RESYNC_EVERY == 0:
+                await self._release_due()
+                self._bytes = await self.total_bytes()
+            else:
+                if (previous is None or replaced) and await self._references(image_hash) == 1:
+                    self._bytes += size
+                if replaced and not await self._references(previous['image_hash']):
+                    self._bytes -= previous.get('bytes', 0)
+        except Exception as e:
+            logging.error(f'Image cache accounting failed: {str(e)}')
+            self._bytes = None
+            return
+        if self._bytes > self.max_bytes:
+            await self._evict()
+
+    async def total_bytes(self) -> int:
+        """Size of the distinct blobs the cache references"""
+        result = await self.collection.aggregate([
+            {'$group': {'_id': '$image_hash', 'bytes': {'$first': '$bytes'}}},
+            {'$group': {'_id': None, 'bytes': {'$sum': '$bytes'}}}
+        ]).to_list(1)
+        return result[0]['bytes'] if result else 0
+
+    async def _references(self, image_hash: str) -> int:
+        """How many entries point at a blob, counting no further than two"""
+        return await self.collection.count_documents({'image_hash': image_hash}, limit=2)
+
+    async def _evict(self):
+        # One eviction pass per process at a time; concurrent puts leave it to the running one
+        if self._evicting:
+            return
+        self._evicting = True
+        try:
+            await self._release_due()
+            total = await self.total_bytes()
+            if total <= self.max_bytes:
+                return
+            oldest = self.collection.find({}, {'_id': 0, 'key': 1, 'image_hash': 1, 'bytes': 1}).sort('last_used_at', 1)
+            async for doc in oldest:
+                if total <= self.max_bytes:
+                    break
+                # Guard on the hash so an entry refreshed by a fresh render meanwhile survives
+                result = await self.collection.delete_one({'key': doc['key'], 'image_hash': doc['image_hash']})
+                if not result.deleted_count:
+                    continue
+                self.evicted += 1
+                # A blob another prompt still uses keeps its bytes in the cache
+                if not await self._references(doc['image_hash']):
+                    total -= doc.get('bytes', 0)
+                    self.evicted_bytes += doc.get('bytes', 0)
+                await self._retire(doc['image_hash'])
+        except Exception as e:
+            logging.error(f'Image cache eviction failed: {str(e)}')
+            total = None
+        finally:
+            self._bytes = total
+            self._evicting = False
+
+    async def _retire(self, image_hash: str):
+        """Queue a blob for release once the grace period has passed"""
+        await self.releases.update_one(
+            {'image_hash': image_hash},
+            {'$set': {'release_after': datetime.now(timezone.utc) + timedelta(seconds=self.grace_seconds)}},
+            upsert=True
+        )
+
+    async def _release_due(self):
+        now = datetime.now(timezone.utc)
+        due = await self.releases.find({'release_after': {'$lte': now}}, {'_id': 0, 'image_hash': 1}).to_list(100)
+        for doc in due:
+            # Claim the release, so only one worker deletes the blob and a re-retired hash waits again
+            result = await self.releases.delete_one({'image_hash': doc['image_hash'], 'release_after': {'$lte': now}})
+            if result.deleted_count:
+                await self._release(doc['image_hash'])
+
+    async def _release(self, image_hash: str):
+        """Delete a blob no cache entry or other user of images references any more"""
+        if await self.collection.find_one({'image_hash': image_hash}, {'_id': 1}):
+            return
+        if self.in_use is not None and await self.in_use(image_hash):
+            return
+        if self.on_release is not None:
+            await self.on_release(image_hash)
+        await self.store.delete(image_hash)
+        self.released += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'max_bytes': self.max_bytes,
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            'stored': self.stored,
+            'evicted': self.evicted,
+            'evicted_bytes': self.evicted_bytes,
+            'released_blobs': self.released
+        }
@@ -0,0 +1,238 @@
+"""Resized WebP/AVIF derivatives of stored images.
+
+The image model returns full-resolution PNGs of well over a megabyte, while
+the grimoire shows them at card size. After an image is stored, a process
+pool decodes it once and encodes WebP (and AVIF, when Pillow has an
+encoder for it) at a few widths, plus a tiny blurred placeholder that list
+responses inline as a data URI. Derivatives are blobs like any other, so
+they are stored and cached by content hash; a manifest per source image
+maps (format, width) to the derivative's hash. /api/images/{hash}?w=640
+picks the smallest derivative at least that wide in the best format the
+client accepts.
+"""
+import asyncio
+import base64
+import io
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image, features
+
+from singleflight import SingleFlight
+
+DERIVATIVE_WIDTHS = (320, 640, 1024)
+
+# Preferred first; AVIF is dropped when this Pillow build cannot encode it
+DERIVATIVE_FORMATS = ('avif', 'webp')
+
+CONTENT_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+ENCODE_OPTIONS = {
+    'avif': {'quality': 55, 'speed': 6},
+    'webp': {'quality': 78, 'method': 4},
+}
+
+PLACEHOLDER_WIDTH = 16
+
+
+def _encoder_available(fmt: str) -> bool:
+    try:
+        return bool(features.check(fmt))
+    except ValueError:
+        return False
+
+
+def build_derivatives(data: bytes, widths: Tuple[int, ...], formats: Tuple[str, ...]) -> dict:
+    """Decode an image and encode every (format, width) derivative; runs in a worker process"""
+    with Image.open(io.BytesIO(data)) as source:
+        source.load()
+        image = source.convert('RGBA' if 'A' in source.getbands() else 'RGB')
+    width, height = image.size
+
+    variants = {fmt: {} for fmt in formats}
+    for target in widths:
+        # Never upscale; the original serves anything at least as wide as itself
+        if target >= width:
+            continue
+        resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+        for fmt in formats:
+            out = io.BytesIO()
+            resized.save(out, format=fmt.upper(), **ENCODE_OPTIONS[fmt])
+            variants[fmt][target] = out.getvalue()
+
+    tiny = image.convert('RGB').resize(
+        (PLACEHOLDER_WIDTH, max(1, round(height * PLACEHOLDER_WIDTH / width))), Image.BILINEAR
+    )
+    out = io.BytesIO()
+    tiny.save(out, format='WEBP', quality=30)
+    return {'width': width, 'height': height, 'variants': variants, 'placeholder': out.getvalue()}
+
+
+class ImageDerivatives:
+    def __init__(
+        self,
+        store,
+        collection,
+        widths: Iterable[int] = DERIVATIVE_WIDTHS,
+        formats: Iterable[str] = DERIVATIVE_FORMATS,
+        workers: int = 2,
+        max_manifests: int = 2048,
+    ):
+        self.store = store
+        self.collection = collection
+        self.widths = tuple(sorted(widths))
+        self.formats = tuple(fmt for fmt in formats if _encoder_available(fmt))
+        self.workers = workers
+        self.max_manifests = max_manifests
+        self._executor = None
+        self._manifests: OrderedDict = OrderedDict()
+        self._builds = SingleFlight()
+        self._pending = set()
+        self.built = 0
+        self.failed = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._build_seconds = 0.0
+
+    def start(self):
+        # Spawned workers only import this module, not a copy of the running server
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    async def stop(self):
+        for task in list(self._pending):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _remember(self, manifest: dict):
+        self._manifests[manifest['source']] = manifest
+        self._manifests.move_to_end(manifest['source'])
+        while len(self._manifests) > self.max_manifests:
+            self._manifests.popitem(last=False)
+
+    async def manifest(self, source_hash: str) -> Optional[dict]:
+        """The stored manifest for an image, without building one"""
+        manifest = self._manifests.get(source_hash)
+        if manifest is not None:
+            self._manifests.move_to_end(source_hash)
+            return manifest
+        manifest = await self.collection.find_one({'source': source_hash}, {'_id': 0})
+        if manifest:
+            self._remember(manifest)
+        return manifest
+
+    async def manifests(self, source_hashes: List[str]) -> Dict[str, dict]:
+        """Manifests for several images in one query, for list responses"""
+        found = {h: self._manifests[h] for h in source_hashes if h in self._manifests}
+        missing = [h for h in source_hashes if h not in found]
+        if missing:
+            async for manifest in self.collection.find({'source': {'$in': missing}}, {'_id': 0}):
+                self._remember(manifest)
+                found[manifest['source']] = manifest
+        return found
+
+    async def ensure(self, source_hash: str) -> Optional[dict]:
+        """Return the image's manifest, building its derivatives first if needed"""
+        manifest = await self.manifest(source_hash)
+        if manifest is not None:
+            self.hits += 1
+            return manifest
+        self.misses += 1
+        return await self._builds.do(source_hash, lambda: self._build(source_hash))
+
+    def schedule(self, source_hash: Optional[str]):
+        """Build derivatives in the background, right after an image is stored"""
+        if not source_hash or self._executor is None or source_hash in self._manifests:
+            return
+        task = asyncio.create_task(self.ensure(source_hash))
+        self._pending.add(task)
+        task.add_done_callback(self._scheduled_done)
+
+    def _scheduled_done(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f'Image derivative build failed: {task.exception()}')
+
+    async def _build(self, source_hash: str) -> Optional[dict]:
+        data = await self.store.get(source_hash)
+        if data is None:
+            return None
+        if self._executor is None:
+            self.start()
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor, build_derivatives, data, self.widths, self.formats)
+        except Exception:
+            self.failed += 1
+            raise
+        self._build_seconds += time.monotonic() - started
+
+        variants = {}
+        for fmt, sizes in result['variants'].items():
+            variants[fmt] = {}
+            for width, encoded in sizes.items():
+                variants[fmt][str(width)] = await self.store.put(encoded)
+                self.bytes_out += len(encoded)
+        manifest = {
+            'source': source_hash,
+            'width': result['width'],
+            'height': result['height'],
+            'variants': variants,
+            'placeholder': 'data:image/webp;base64,' + base64.b64encode(result['placeholder']).decode('ascii'),
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }
+        await self.collection.update_one({'source': source_hash}, {'$setOnInsert': manifest}, upsert=True)
+        self.built += 1
+        self.bytes_in += len(data)
+        self._remember(manifest)
+        return manifest
+
+    async def discard(self, source_hash: str):
+        """Delete an image's derivatives and manifest, when the image itself is deleted"""
+        manifest = await self.manifest(source_hash)
+        self._manifests.pop(source_hash, None)
+        if manifest is None:
+            return
+        for sizes in manifest['variants'].values():
+            for derivative_hash in sizes.values():
+                await self.store.delete(derivative_hash)
+        await self.collection.delete_one({'source': source_hash})
+
+    def choose(self, manifest: dict, width: int, accept: str) -> Optional[Tuple[str, str]]:
+        """(derivative hash, content type) to serve for a requested width, or None for the original"""
+        for fmt in self.formats:
+            if CONTENT_TYPES[fmt] not in accept:
+                continue
+            sizes = manifest['variants'].get(fmt) or {}
+            fitting = sorted(int(w) for w in sizes if int(w) >= width)
+            if fitting:
+                return sizes[str(fitting[0])], CONTENT_TYPES[fmt]
+        return None
+
+    @staticmethod
+    def placeholder(manifest: Optional[dict]) -> Optional[str]:
+        return manifest.get('placeholder') if manifest else None
+
+    def stats(self) -> dict:
+        return {
+            'formats': list(self.formats),
+            'widths': list(self.widths),
+            'manifests_cached': len(self._manifests),
+            'built': self.built,
+            'failed': self.failed,
+            'hits': self.hits,
+            'misses': self.misses,
+            'pending': len(self._pending),
+            'avg_build_ms': round(self._build_seconds / (self.built or 1) * 1000, 1),
+            'source_bytes': self.bytes_in,
+            'derivative_bytes': self.bytes_out
+        }
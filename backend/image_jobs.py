@@ -0,0 +1,164 @@
+"""Background image-generation jobs.
+
+Image renders are slow and expensive, so instead of holding a request open
+they can be submitted here. Each job is persisted in Mongo (so any worker
+can answer status polls) and executed by a fixed-size pool of asyncio
+workers. How many image calls run at once is up to `render`; the server's
+takes a slot in the same admission pool as foreground renders.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Optional
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+PENDING_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class ImageJobQueue:
+    def __init__(
+        self,
+        collection,
+        render: Callable[[str, bool], Awaitable[Optional[str]]],  # (prompt, fresh) -> stored image hash
+        workers: int = 2,
+        max_queue: int = 100,
+        result_ttl_seconds: int = 86400,
+        stale_after_seconds: int = 900,
+    ):
+        self.collection = collection
+        self.render = render
+        self.workers = workers
+        self.result_ttl_seconds = result_ttl_seconds
+        self.stale_after_seconds = stale_after_seconds
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks = []
+        self._done_events = {}
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self):
+        # Jobs held in memory by a dead process never finish; fail them instead of leaving pollers hanging
+        stale_before = (datetime.now(timezone.utc) - timedelta(seconds=self.stale_after_seconds)).isoformat()
+        await self.collection.update_many(
+            {'status': {'$in': list(PENDING_STATUSES)}, 'updated_at': {'$lt': stale_before}},
+            {'$set': {'status': JOB_FAILED, 'error': 'job was interrupted', 'updated_at': self._now_iso()}}
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, prompt: str, kind: str = 'image', metadata: Optional[dict] = None, fresh: bool = False) -> dict:
+        """Persist a job and queue it; raises JobQueueFull when the backlog is at capacity"""
+        if self._queue.full():
+            raise JobQueueFull()
+        now = datetime.now(timezone.utc)
+        job = {
+            'id': str(uuid.uuid4()),
+            'kind': kind,
+            'status': JOB_QUEUED,
+            'prompt': prompt,
+            'fresh': fresh,
+            'metadata': metadata or {},
+            'image_hash': None,
+            'error': None,
+            'created_at': now.isoformat(),
+            'updated_at': now.isoformat(),
+            'expires_at': now + timedelta(seconds=self.result_ttl_seconds)
+        }
+        await self.collection.insert_one(job)
+        self._done_events[job['id']] = asyncio.Event()
+        self._queue.put_nowait(job['id'])
+        return job
+
+    async def get(self, job_id: str, include_result: bool = False) -> Optional[dict]:
+        projection = {'_id': 0, 'prompt': 0, 'expires_at': 0}
+        if not include_result:
+            projection['image_hash'] = 0
+        return await self.collection.find_one({'id': job_id}, projection)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Wait up to `timeout` seconds for a job to finish and return its record with the result"""
+        event = self._done_events.get(job_id)
+        try:
+            if event is not None:
+                await asyncio.wait_for(event.wait(), timeout)
+            else:
+                # Job owned by another worker process: poll the shared record
+                deadline = asyncio.get_running_loop().time() + timeout
+                while asyncio.get_running_loop().time() < deadline:
+                    job = await self.get(job_id)
+                    if not job or job['status'] not in PENDING_STATUSES:
+                        break
+                    await asyncio.sleep(0.5)
+        except asyncio.TimeoutError:
+            pass
+        return await self.get(job_id, include_result=True)
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'queued': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'running': self.running,
+            'completed': self.completed,
+            'failed': self.failed
+        }
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logging.error(f'Image job {job_id} crashed: {str(e)}')
+            finally:
+                self._queue.task_done()
+                event = self._done_events.pop(job_id, None)
+                if event:
+                    event.set()
+
+    async def _run(self, job_id: str):
+        job = await self.collection.find_one_and_update(
+            {'id': job_id, 'status': JOB_QUEUED},
+            {'$set': {'status': JOB_RUNNING, 'updated_at': self._now_iso()}},
+            projection={'_id': 0, 'prompt': 1, 'fresh': 1}
+        )
+        if not job:
+            return
+        self.running += 1
+        try:
+            image_hash = await self.render(job['prompt'], job.get('fresh', False))
+            if not image_hash:
+                raise RuntimeError('No image was generated')
+        except Exception as e:
+            self.failed += 1
+            await self.collection.update_one(
+                {'id': job_id},
+                {'$set': {'status': JOB_FAILED, 'error': str(e), 'updated_at': self._now_iso()}}
+            )
+        else:
+            self.completed += 1
+            await self.collection.update_one(
+                {'id': job_id},
+                {'$set': {'status': JOB_COMPLETED, 'image_hash': image_hash, 'updated_at': self._now_iso()}}
+            )
+        finally:
+            self.running -= 1
+
+    @staticmethod
+    def _now_iso() -> str:
+        return datetime.now(timezone.utc).isoformat()
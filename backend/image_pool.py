@@ -0,0 +1,141 @@
+"""Warm pool of pre-rendered spell header images.
+
+The image call is the long pole of a spell, yet most intentions fall into
+a handful of themes. The pool keeps up to `size` ready images for every
+(archetype style, intention category) pair, so a latency-sensitive spell
+request can take one immediately instead of waiting on the image model.
+Pooled images live in Mongo and are taken atomically, so every worker
+shares them; each worker refills in the background at the lowest
+admission priority after images are taken and on a slow timer. Entries
+are keyed by a hash of their prompt, so changing a style or motif simply
+stops serving (and eventually refilling) the old images.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+def pool_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+class ImagePool:
+    def __init__(
+        self,
+        collection,
+        render: Callable[[str], Awaitable[Optional[str]]],
+        prompts: Dict[Tuple[str, str], str],
+        size: int = 2,
+        check_interval: float = 300,
+        retry_delay: float = 30,
+    ):
+        self.collection = collection
+        self.render = render
+        self.prompts = prompts
+        self.size = size
+        self.check_interval = check_interval
+        self.retry_delay = retry_delay
+        self._wake = asyncio.Event()
+        self._task = None
+        self.taken = 0
+        self.empty = 0
+        self.rendered = 0
+        self.render_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def take(self, archetype: str, category: str) -> Optional[str]:
+        """Claim a ready image for the pair, or None when its pool is empty"""
+        prompt = self.prompts.get((archetype, category))
+        if not self.enabled or prompt is None:
+            return None
+        doc = await self.collection.find_one_and_delete(
+            {'key': pool_key(prompt)},
+            projection={'_id': 0, 'image_hash': 1},
+            sort=[('created_at', 1)]
+        )
+        # Refill whether or not this took the last one
+        self._wake.set()
+        if doc is None:
+            self.empty += 1
+            return None
+        self.taken += 1
+        return doc['image_hash']
+
+    async def levels(self) -> Dict[str, int]:
+        counts = await self.collection.aggregate([{'$group': {'_id': '$key', 'count': {'$sum': 1}}}]).to_list(None)
+        by_key = {entry['_id']: entry['count'] for entry in counts}
+        return {
+            f'{archetype}/{category}': by_key.get(pool_key(prompt), 0)
+            for (archetype, category), prompt in self.prompts.items()
+        }
+
+    async def _refill_loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                if not await self._refill():
+                    # Busy or failing image provider: hold off instead of retrying on every take
+                    await asyncio.sleep(self.retry_delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f'Image pool refill failed: {str(e)}')
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self) -> bool:
+        """Top every pair up to `size`; False when a render failed and the pass stopped early"""
+        levels = await self.levels()
+        # Emptiest pairs first, so a burst on one theme is refilled before topping up others
+        for (archetype, category), prompt in sorted(self.prompts.items(), key=lambda item: levels[f'{item[0][0]}/{item[0][1]}']):
+            key = pool_key(prompt)
+            # Recount before each render; other workers refill the same pool
+            while await self.collection.count_documents({'key': key}) < self.size:
+                try:
+                    image_hash = await self.render(prompt)
+                except Exception as e:
+                    self.render_errors += 1
+                    logging.warning(f'Image pool render for {archetype}/{category} deferred: {str(e)}')
+                    return False
+                if not image_hash:
+                    self.render_errors += 1
+                    return False
+                await self.collection.insert_one({
+                    'key': key,
+                    'archetype': archetype,
+                    'category': category,
+                    'image_hash': image_hash,
+                    'created_at': datetime.now(timezone.utc)
+                })
+                self.rendered += 1
+        return True
+
+    async def stats(self) -> dict:
+        return {
+            'size': self.size,
+            'taken': self.taken,
+            'empty': self.empty,
+            'rendered': self.rendered,
+            'render_errors': self.render_errors,
+            'levels': await self.levels() if self.enabled else {}
+        }
@@ -0,0 +1,119 @@
+"""Local intention classifier and citation index.
+
+Maps a seeker's intention to one of the HISTORICAL_SOURCES categories
+(protection, courage, love, healing, divination, ancestors, general) with
+a weighted keyword table, and retrieves verified citations through an
+inverted index over the source table. Vocabulary from archive entries
+tagged with a category (ritual categories, deity practices) is folded into
+the classifier when the archive snapshots reload. Classification is a
+handful of dictionary lookups, so it can run on every request.
+"""
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from prompt_context import tokenize
+
+DEFAULT_CATEGORY = 'general'
+
+CATEGORY_KEYWORDS = {
+    'protection': '''protection protect protective shield ward warding safe safety guard guardian banish banishing
+        defend defence defense evil harm negative negativity curse hex threat danger home house boundary boundaries
+        intruder enemy enemies psychic attack secure veil''',
+    'courage': '''courage courageous brave bravery fear fears afraid confidence confident strength strong bold
+        interview nerve nerves anxiety anxious stage speech exam challenge difficult conversation resolve willpower''',
+    'love': '''love lover romance romantic partner relationship relationships heart marriage marry attract
+        attraction soulmate desire passion friendship reconcile reconciliation crush dating union''',
+    'healing': '''heal healing health illness sick sickness recover recovery grief grieving pain wellbeing body
+        mind rest restore restoration trauma wound wounds calm peace comfort burnout sleep''',
+    'divination': '''divination divine tarot future decision decisions clarity answer answers dream dreams omen
+        omens sign signs scry scrying vision visions insight guidance choose choice path crossroads foresee''',
+    'ancestors': '''ancestor ancestors ancestral grandmother grandfather grandparent family lineage heritage
+        dead died death departed spirit spirits mother father memory memories honor honour mourning descendants''',
+}
+
+# Archive vocabulary counts for less than the hand-picked keywords
+ARCHIVE_WEIGHT = 0.25
+
+
+def _snapshot_items(archive_cache, name: str) -> tuple:
+    snapshot = archive_cache.snapshots.get(name)
+    return snapshot.items if snapshot else ()
+
+
+class IntentionIndex:
+    def __init__(self, sources: Dict[str, List[dict]]):
+        self.sources = sources
+        self._keyword_weights: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._postings: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+        self._base_keywords()
+        self._index_sources()
+
+    def _base_keywords(self):
+        self._keyword_weights.clear()
+        for category, words in CATEGORY_KEYWORDS.items():
+            for token in tokenize(words):
+                self._keyword_weights[token][category] = 1.0
+
+    def _index_sources(self):
+        # token -> [(category, position in that category's source list)]
+        for category, entries in self.sources.items():
+            for position, source in enumerate(entries):
+                text = f"{source['author']} {source['work']} {source.get('quote', '')}"
+                for token in set(tokenize(text)):
+                    self._postings[token].append((category, position))
+
+    def rebuild(self, archive_cache):
+        """Fold archive vocabulary into the classifier after the snapshots reload"""
+        self._base_keywords()
+        tagged = []
+        for ritual in _snapshot_items(archive_cache, 'rituals'):
+            tagged.append((ritual.get('category', ''), f"{ritual.get('name', '')} {ritual.get('description', '')}"))
+        for deity in _snapshot_items(archive_cache, 'deities'):
+            for practice in deity.get('associated_practices', []):
+                tagged.append((practice, deity.get('description', '')))
+
+        for label, text in tagged:
+            label_tokens = set(tokenize(label))
+            categories = [category for category in CATEGORY_KEYWORDS if tokenize(category)[0] in label_tokens]
+            for token in tokenize(text):
+                for category in categories:
+                    weights = self._keyword_weights[token]
+                    weights[category] = max(weights.get(category, 0.0), ARCHIVE_WEIGHT)
+
+    def classify(self, intention: str) -> Tuple[str, Dict[str, float]]:
+        """Return (category, scores) for an intention; 'general' when nothing matches"""
+        scores: Dict[str, float] = defaultdict(float)
+        for token in tokenize(intention):
+            for category, weight in self._keyword_weights.get(token, {}).items():
+                scores[category] += weight
+        if not scores:
+            return DEFAULT_CATEGORY, {}
+        # Ties go to the category listed first in CATEGORY_KEYWORDS
+        category = max((name for name in CATEGORY_KEYWORDS if name in scores), key=lambda name: scores[name])
+        return category, dict(scores)
+
+    def citations(self, intention: str, limit: int = 3) -> Tuple[str, List[dict]]:
+        """Return the intention's category and up to `limit` verified sources for it"""
+        category, _ = self.classify(intention)
+
+        # Sources named directly by the intention (e.g. "tarot", "Qabalah") come first
+        direct = []
+        for token in set(tokenize(intention)):
+            for posting in self._postings.get(token, []):
+                if posting not in direct:
+                    direct.append(posting)
+        ranked = direct + [(category, position) for position in range(len(self.sources.get(category, [])))]
+        ranked += [(DEFAULT_CATEGORY, position) for position in range(len(self.sources.get(DEFAULT_CATEGORY, [])))]
+
+        citations = []
+        seen = set()
+        for source_category, position in ranked:
+            source = self.sources[source_category][position]
+            key = (source['author'], source['work'])
+            if key in seen:
+                continue
+            seen.add(key)
+            citations.append(source)
+            if len(citations) == limit:
+                break
+        return category, citations
@@ -0,0 +1,122 @@
+"""Token streaming for chat completions.
+
+`LlmChat.send_message` only returns the finished completion, so streaming
+endpoints talk to the model through litellm (the library LlmChat wraps)
+with `stream=True`. When streaming is unavailable (an Emergent universal
+key without `LLM_API_BASE`, or a provider that refuses the request) the
+helper uses a single `send_message` call instead and yields the whole
+reply as one chunk, so callers never have to handle two code paths.
+`send_message` takes no message list, so the fallback replays any history
+as a transcript in the system message. Transient provider errors
+(timeouts, connection errors, 429/5xx) are not a reason to fall back;
+they propagate so the caller's ProviderGuard can retry, hedge and count
+them.
+
+Callers that pass a `usage` dict get the provider-reported token counts
+(prompt, completion, and prompt tokens served from the provider's prefix
+cache) and the time to first token filled in when the stream ends.
+"""
+import logging
+import os
+import time
+import uuid
+from typing import AsyncIterator, Optional
+
+import litellm
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+from resilience import is_transient
+
+# OpenAI-compatible base URL for streamed requests. Unset, litellm calls the provider directly,
+# which only works with a provider key; an Emergent universal key is only accepted by the Emergent
+# proxy, so it is never sent to a provider endpoint and replies go through `send_message` instead.
+LLM_API_BASE = os.environ.get('LLM_API_BASE') or None
+
+EMERGENT_KEY_PREFIX = 'sk-emergent-'
+
+
+def streams_directly(api_key: str) -> bool:
+    """Whether replies can be streamed through litellm with this key and configuration"""
+    return LLM_API_BASE is not None or not (api_key or '').startswith(EMERGENT_KEY_PREFIX)
+
+
+async def stream_chat_completion(
+    api_key: str,
+    system_message: str,
+    text: str,
+    provider: str = 'openai',
+    model: str = 'gpt-5.1',
+    history: Optional[list] = None,
+    usage: Optional[dict] = None,
+) -> AsyncIterator[str]:
+    """Yield completion text deltas for a single user message"""
+    messages = [{'role': 'system', 'content': system_message}]
+    messages.extend(history or [])
+    messages.append({'role': 'user', 'content': text})
+    usage = usage if usage is not None else {}
+    requested_at = time.monotonic()
+
+    if streams_directly(api_key):
+        started = False
+        try:
+            response = await litellm.acompletion(
+                model=f'{provider}/{model}',
+                messages=messages,
+                api_key=api_key,
+                api_base=LLM_API_BASE,
+                stream=True,
+                stream_options={'include_usage': True},
+            )
+            async for chunk in response:
+                if getattr(chunk, 'usage', None):
+                    usage.update(_usage_counts(chunk.usage))
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    if not started:
+                        usage['ttft_seconds'] = time.monotonic() - requested_at
+                    started = True
+                    yield delta
+            return
+        except Exception as e:
+            # Once tokens have reached the client we cannot restart the reply
+            if started or is_transient(e):
+                raise
+            logging.warning(f'LLM streaming unavailable, falling back to send_message: {str(e)}')
+
+    chat = LlmChat(
+        api_key=api_key,
+        session_id=str(uuid.uuid4()),
+        system_message=_with_transcript(system_message, history)
+    ).with_model(provider, model)
+    reply = await chat.send_message(UserMessage(text=text))
+    usage['ttft_seconds'] = time.monotonic() - requested_at
+    yield reply
+
+
+def _with_transcript(system_message: str, history: Optional[list]) -> str:
+    if not history:
+        return system_message
+    lines = [f"{'Seeker' if turn['role'] == 'user' else 'Guide'}: {turn['content']}" for turn in history]
+    return system_message + '\n\nThe conversation so far:\n' + '\n'.join(lines)
+
+
+def _usage_counts(usage) -> dict:
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+        'completion_tokens': getattr(usage, 'completion_tokens', 0) or 0,
+        'cached_tokens': (getattr(details, 'cached_tokens', 0) or 0) if details else 0,
+    }
+
+
+async def complete_chat(
+    api_key: str,
+    system_message: str,
+    text: str,
+    provider: str = 'openai',
+    model: str = 'gpt-5.1',
+    history: Optional[list] = None,
+    usage: Optional[dict] = None,
+) -> str:
+    """Return the whole completion for a message sent after an explicit history"""
+    return ''.join([delta async for delta in stream_chat_completion(api_key, system_message, text, provider, model, history, usage)])
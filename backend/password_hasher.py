@@ -0,0 +1,96 @@
+"""bcrypt hashing on a dedicated thread pool.
+
+A bcrypt hash or check at cost 12 takes a few hundred milliseconds of CPU.
+Run inline in an async handler it stalls every other request on the worker,
+so password work goes to a small thread pool instead (bcrypt releases the
+GIL while hashing). The pool size caps how many cores a login burst can
+take. Hashes made at an older cost are reported by `needs_rehash` so login
+can upgrade them.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+
+def hash_rounds(hashed: str) -> int:
+    """Return the cost factor of a `$2b$12$...` hash"""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+class PasswordHasher:
+    def __init__(self, rounds: int = 12, workers: int = 2):
+        self.rounds = rounds
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rehashes = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _timed(self, submitted_at: float, func, *args):
+        started_at = time.monotonic()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return func(*args)
+        finally:
+            finished_at = time.monotonic()
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self._wait_seconds += started_at - submitted_at
+                self._run_seconds += finished_at - started_at
+
+    async def _run(self, func, *args):
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._timed, time.monotonic(), func, *args)
+
+    @staticmethod
+    def _hash(password: str, rounds: int) -> str:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+    @staticmethod
+    def _check(password: str, hashed: str) -> bool:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self._check, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        return hash_rounds(hashed) != self.rounds
+
+    async def rehash(self, password: str) -> str:
+        """Hash a just-verified password again at the current cost"""
+        self.rehashes += 1
+        return await self.hash(password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            'rounds': self.rounds,
+            'workers': self.workers,
+            'queued': self.queued,
+            'running': self.running,
+            'completed': self.completed,
+            'rehashes': self.rehashes,
+            'avg_wait_ms': round(self._wait_seconds / completed * 1000, 2),
+            'avg_run_ms': round(self._run_seconds / completed * 1000, 2)
+        }
@@ -0,0 +1,150 @@
+"""Archive context for spell prompts, ranked by relevance to the intention.
+
+Spell prompts used to list the first ten deities, rituals and figures in
+the database whatever the seeker asked for. This module keeps a TF-IDF
+index over the archive snapshots (descriptions, bios, practices) and picks
+the few entries that best match the intention, memoizing the rendered
+block per normalized intention. The index is rebuilt whenever the archive
+snapshots reload.
+"""
+import math
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+from spell_cache import normalize_intention
+
+_TOKEN_RE = re.compile(r'[a-z]{3,}')
+
+_STOPWORDS = frozenset('''
+    about after again also and any are because been before being between both but can could did does doing
+    down during each few for from further had has have having her here hers herself him himself his how into
+    its itself just more most myself need needs nor not now off once only other our ours out over own same
+    she should some such than that the their theirs them themselves then there these they this those through
+    too under until very want wants was were what when where which while who whom why will with would you
+    your yours yourself yourselves help make feel like get
+'''.split())
+
+# Archive kind -> (collection, heading, text fields, short description field)
+CONTEXT_SOURCES = {
+    'deities': ('deities', 'RELEVANT DEITIES FROM OUR ARCHIVE', ('name', 'description', 'history', 'associated_practices'), 'description'),
+    'rituals': ('rituals', 'RELEVANT RITUALS FROM OUR ARCHIVE', ('name', 'description', 'category', 'deity_association'), 'description'),
+    'figures': ('historical_figures', 'HISTORICAL FIGURES TO REFERENCE', ('name', 'bio', 'contributions', 'associated_works'), 'contributions'),
+}
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        # Light stemming so "protection"/"protective"/"protect" and plurals meet
+        for suffix in ('ation', 'ion', 'ive', 'ing', 'ies', 's'):
+            if token.endswith(suffix) and len(token) - len(suffix) >= 4 and not token.endswith('ss'):
+                token = token[:-len(suffix)]
+                break
+        tokens.append(token)
+    return tokens
+
+
+def _entry_text(entry: dict, fields) -> str:
+    parts = []
+    for field in fields:
+        value = entry.get(field)
+        if isinstance(value, list):
+            parts.extend(str(item) for item in value)
+        elif value:
+            parts.append(str(value))
+    return ' '.join(parts)
+
+
+def _short(text: Optional[str], limit: int = 90) -> str:
+    text = (text or '').strip()
+    first_sentence = text.split('. ')[0].rstrip('.')
+    if len(first_sentence) <= limit:
+        return first_sentence
+    return first_sentence[:limit].rsplit(' ', 1)[0] + '...'
+
+
+class PromptContextBuilder:
+    def __init__(self, per_kind: int = 3, cache_size: int = 1024):
+        self.per_kind = per_kind
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, list] = {}
+        self._vectors: Dict[str, list] = {}
+        self._idf: Dict[str, float] = {}
+        self._cache: OrderedDict = OrderedDict()
+
+    def rebuild(self, archive_cache):
+        """Re-index the archive snapshots; drops memoized context blocks"""
+        entries = {}
+        documents = {}
+        for kind, (collection, _, fields, _) in CONTEXT_SOURCES.items():
+            snapshot = archive_cache.snapshots.get(collection)
+            entries[kind] = list(snapshot.items) if snapshot else []
+            documents[kind] = [Counter(tokenize(_entry_text(entry, fields))) for entry in entries[kind]]
+
+        all_documents = [doc for docs in documents.values() for doc in docs]
+        document_frequency = Counter(token for doc in all_documents for token in doc)
+        total = len(all_documents) or 1
+        idf = {token: math.log(1 + total / count) for token, count in document_frequency.items()}
+
+        vectors = {}
+        for kind, docs in documents.items():
+            vectors[kind] = []
+            for doc in docs:
+                weights = {token: (1 + math.log(count)) * idf[token] for token, count in doc.items()}
+                norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+                vectors[kind].append({token: weight / norm for token, weight in weights.items()})
+
+        self._entries, self._vectors, self._idf = entries, vectors, idf
+        self._cache.clear()
+
+    def rank(self, intention: str, kind: str) -> List[dict]:
+        """Return up to `per_kind` archive entries of one kind, best match first"""
+        query = set(tokenize(intention))
+        scored = []
+        for position, vector in enumerate(self._vectors.get(kind, [])):
+            score = sum(vector.get(token, 0.0) * self._idf.get(token, 0.0) for token in query)
+            if score > 0:
+                scored.append((score, position))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        positions = [position for _, position in scored[:self.per_kind]]
+        if not positions:
+            # Nothing matched; still give the model a few names to anchor on
+            positions = list(range(min(self.per_kind, len(self._entries.get(kind, [])))))
+        return [self._entries[kind][position] for position in positions]
+
+    def build(self, intention: str) -> str:
+        """Return the compact archive context block for an intention"""
+        key = normalize_intention(intention)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return cached
+        self.misses += 1
+
+        lines = []
+        for kind, (_, heading, _, summary_field) in CONTEXT_SOURCES.items():
+            entries = self.rank(intention, kind)
+            if entries:
+                described = [f"{entry['name']} ({_short(entry.get(summary_field))})" for entry in entries]
+                lines.append(f"{heading}: {'; '.join(described)}")
+        context = '\n'.join(lines)
+
+        self._cache[key] = context
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return context
+
+    def stats(self) -> dict:
+        return {
+            'indexed': {kind: len(entries) for kind, entries in self._entries.items()},
+            'vocabulary': len(self._idf),
+            'cached_contexts': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses
+        }
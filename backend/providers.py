@@ -0,0 +1,109 @@
+"""Long-lived clients for the LLM, image and Stripe integrations.
+
+Handlers used to build a fresh LlmChat, OpenAIImageGeneration or
+StripeCheckout for every call, paying for a new TCP and TLS handshake each
+time. The registry is created once per process: it owns a pooled httpx
+client that litellm uses for every completion (see llm_stream.py), keeps
+one image client and a few Stripe clients alive, and counts in-flight and
+completed calls per provider.
+"""
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import httpx
+import litellm
+from emergentintegrations.llm.openai.image_generation import OpenAIImageGeneration
+from emergentintegrations.payments.stripe.checkout import StripeCheckout
+
+PROVIDERS = ('llm', 'image', 'stripe')
+
+# Checkout clients are keyed by webhook URL, which comes from the request origin
+MAX_STRIPE_CLIENTS = 8
+
+
+class ProviderRegistry:
+    def __init__(
+        self,
+        llm_api_key: str,
+        stripe_api_key: str,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 30,
+        timeout: float = 120,
+    ):
+        self.llm_api_key = llm_api_key
+        self.stripe_api_key = stripe_api_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = timeout
+        self.http = None
+        self._image_generator = None
+        self._stripe_clients: OrderedDict = OrderedDict()
+        self._counters = {name: {'in_flight': 0, 'calls': 0, 'errors': 0, 'seconds': 0.0} for name in PROVIDERS}
+
+    async def start(self):
+        self.http = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        # litellm builds its OpenAI clients on this session instead of a new one per call
+        litellm.aclient_session = self.http
+        self._image_generator = OpenAIImageGeneration(api_key=self.llm_api_key)
+
+    async def close(self):
+        if litellm.aclient_session is self.http:
+            litellm.aclient_session = None
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+        self._image_generator = None
+        self._stripe_clients.clear()
+
+    def image_generator(self) -> OpenAIImageGeneration:
+        if self._image_generator is None:
+            self._image_generator = OpenAIImageGeneration(api_key=self.llm_api_key)
+        return self._image_generator
+
+    def stripe(self, webhook_url: str = '') -> StripeCheckout:
+        client = self._stripe_clients.get(webhook_url)
+        if client is None:
+            client = StripeCheckout(api_key=self.stripe_api_key, webhook_url=webhook_url)
+            self._stripe_clients[webhook_url] = client
+            while len(self._stripe_clients) > MAX_STRIPE_CLIENTS:
+                self._stripe_clients.popitem(last=False)
+        else:
+            self._stripe_clients.move_to_end(webhook_url)
+        return client
+
+    @asynccontextmanager
+    async def track(self, provider: str):
+        """Count one outbound call (in flight, duration, errors) against a provider"""
+        counters = self._counters[provider]
+        counters['in_flight'] += 1
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            counters['errors'] += 1
+            raise
+        finally:
+            counters['in_flight'] -= 1
+            counters['calls'] += 1
+            counters['seconds'] += time.monotonic() - started
+
+    def stats(self) -> dict:
+        providers = {}
+        for name, counters in self._counters.items():
+            providers[name] = {
+                'in_flight': counters['in_flight'],
+                'calls': counters['calls'],
+                'errors': counters['errors'],
+                'avg_ms': round(counters['seconds'] / (counters['calls'] or 1) * 1000, 1)
+            }
+        return {
+            'max_connections': self.limits.max_connections,
+            'max_keepalive': self.limits.max_keepalive_connections,
+            'stripe_clients': len(self._stripe_clients),
+            'providers': providers
+        }
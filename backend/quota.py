@@ -0,0 +1,134 @@
+"""Atomic spell quota reservation for free-tier users.
+
+A generation is reserved with a single conditional find_one_and_update
+before any model call: the filter only matches users who still have quota
+(or are paid, or whose reset window has passed), and the update pipeline
+increments the count, restarting the 30-day window in the same write when
+it has expired. Concurrent requests can therefore never overshoot the free
+limit, and the returned document carries the new count for limit_info.
+A reservation is refunded if the generation fails.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+FREE_SPELL_LIMIT = 3
+RESET_WINDOW = timedelta(days=30)
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, count: int, limit: int):
+        super().__init__(f'Spell limit of {limit} reached')
+        self.count = count
+        self.limit = limit
+
+
+class Reservation:
+    __slots__ = ('user_id', 'subscription_tier', 'count', 'window', 'charged')
+
+    def __init__(self, user_id: str, subscription_tier: str, count: int, window: Optional[str], charged: bool):
+        self.user_id = user_id
+        self.subscription_tier = subscription_tier
+        self.count = count
+        self.window = window
+        self.charged = charged
+
+
+def _reset_due(reset_at: Optional[str], now: str) -> bool:
+    # ISO-8601 UTC timestamps compare correctly as strings
+    return not reset_at or reset_at <= now
+
+
+class SpellQuota:
+    def __init__(self, users, limit: int = FREE_SPELL_LIMIT, window: timedelta = RESET_WINDOW):
+        self.users = users
+        self.limit = limit
+        self.window = window
+        self.reserved = 0
+        self.rejected = 0
+        self.refunded = 0
+
+    def effective_count(self, user: dict) -> int:
+        """The user's count as the next reservation will see it, with an expired window counting as zero"""
+        if _reset_due(user.get('spell_generation_reset'), datetime.now(timezone.utc).isoformat()):
+            return 0
+        return user.get('spell_generation_count', 0)
+
+    async def reserve(self, user_id: str) -> Reservation:
+        """Charge one generation to a user, raising QuotaExceeded when a free user has none left"""
+        current_time = datetime.now(timezone.utc)
+        now = current_time.isoformat()
+        next_reset = (current_time + self.window).isoformat()
+
+        is_free = {'$ne': ['$subscription_tier', 'paid']}
+        reset_due = {'$lte': [{'$ifNull': ['$spell_generation_reset', '']}, now]}
+        count = {'$ifNull': ['$spell_generation_count', 0]}
+        total = {'$ifNull': ['$total_spells_generated', 0]}
+
+        user = await self.users.find_one_and_update(
+            {
+                'id': user_id,
+                '$or': [
+                    {'subscription_tier': 'paid'},
+                    {'spell_generation_count': {'$not': {'$gte': self.limit}}},
+                    {'spell_generation_reset': {'$not': {'$gt': now}}},
+                ]
+            },
+            [{'$set': {
+                # Paid users are not counted; free users restart the window lazily when it has expired
+                'spell_generation_count': {'$cond': [
+                    is_free, {'$cond': [reset_due, 1, {'$add': [count, 1]}]}, count
+                ]},
+                'spell_generation_reset': {'$cond': [
+                    {'$and': [is_free, reset_due]}, next_reset, '$spell_generation_reset'
+                ]},
+                'total_spells_generated': {'$cond': [is_free, {'$add': [total, 1]}, total]},
+            }}],
+            projection={'_id': 0, 'subscription_tier': 1, 'spell_generation_count': 1, 'spell_generation_reset': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if user is None:
+            self.rejected += 1
+            raise QuotaExceeded(self.limit, self.limit)
+
+        self.reserved += 1
+        tier = user.get('subscription_tier', 'free')
+        return Reservation(
+            user_id, tier, user.get('spell_generation_count', 0),
+            user.get('spell_generation_reset'), charged=tier != 'paid'
+        )
+
+    async def refund(self, reservation: Reservation):
+        """Give back a reservation whose generation failed"""
+        if not reservation.charged:
+            return
+        reservation.charged = False
+        reservation.count = max(0, reservation.count - 1)
+        # Only refund within the window it was charged to
+        await self.users.update_one(
+            {
+                'id': reservation.user_id,
+                'spell_generation_reset': reservation.window,
+                'spell_generation_count': {'$gt': 0}
+            },
+            {'$inc': {'spell_generation_count': -1, 'total_spells_generated': -1}}
+        )
+        self.refunded += 1
+
+    def limit_info(self, reservation: Reservation) -> dict:
+        if reservation.subscription_tier == 'paid':
+            return {'remaining': -1, 'limit': -1, 'subscription_tier': 'paid'}
+        return {
+            'remaining': max(0, self.limit - reservation.count),
+            'limit': self.limit,
+            'subscription_tier': reservation.subscription_tier
+        }
+
+    def stats(self) -> dict:
+        return {
+            'limit': self.limit,
+            'reserved': self.reserved,
+            'rejected': self.rejected,
+            'refunded': self.refunded
+        }
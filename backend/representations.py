@@ -0,0 +1,121 @@
+"""Precomputed HTTP representations for read-mostly endpoints.
+
+A representation is the JSON body of a response serialized once, together
+with gzip (and, when the `brotli` package is installed, brotli) variants
+and a strong ETag for each content coding (`"<hash>"`, `"<hash>-gzip"`,
+`"<hash>-br"`), since the encoded bytes differ. Serving one is a dictionary
+lookup: conditional requests get a 304 and everything else gets the
+pre-encoded bytes, with no Pydantic validation or JSON encoding on the
+request path.
+"""
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 512
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        # Weak comparison, as If-None-Match calls for
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class Representation:
+    __slots__ = ('body', 'etag', 'encoded', 'cache_control')
+
+    def __init__(self, body: bytes, cache_control: str):
+        self.body = body
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.encoded = {}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            if brotli is not None:
+                self.encoded['br'] = brotli.compress(body, quality=11)
+            self.encoded['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+
+    def _coding(self, request: Request):
+        accepted = _accepted_encodings(request.headers.get('accept-encoding', ''))
+        for coding in ('br', 'gzip'):
+            if coding in self.encoded and coding in accepted:
+                return coding
+        return None
+
+    def response(self, request: Request) -> Response:
+        coding = self._coding(request)
+        etag = f'"{self.etag}-{coding}"' if coding else f'"{self.etag}"'
+        headers = {
+            'ETag': etag,
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding'
+        }
+        if _etag_matches(request.headers.get('if-none-match', ''), etag):
+            return Response(status_code=304, headers=headers)
+        if coding:
+            headers['Content-Encoding'] = coding
+            return Response(content=self.encoded[coding], media_type='application/json', headers=headers)
+        return Response(content=self.body, media_type='application/json', headers=headers)
+
+
+class RepresentationCache:
+    """Representations built on first use and kept until their group is invalidated.
+
+    Each group holds at most `max_entries` representations, least recently
+    used first out, so keys derived from request input cannot grow it without
+    bound.
+    """
+
+    def __init__(self, cache_control: str = 'public, max-age=300', max_entries: int = 1024):
+        self.cache_control = cache_control
+        self.max_entries = max_entries
+        self._groups: Dict[str, OrderedDict] = {}
+        self.builds = 0
+        self.evictions = 0
+
+    def get(self, group: str, key: Hashable, build: Callable[[], bytes]) -> Representation:
+        entries = self._groups.setdefault(group, OrderedDict())
+        representation = entries.get(key)
+        if representation is not None:
+            entries.move_to_end(key)
+            return representation
+        representation = Representation(build(), self.cache_control)
+        entries[key] = representation
+        self.builds += 1
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return representation
+
+    def invalidate(self, group: str):
+        self._groups.pop(group, None)
+
+    def stats(self) -> dict:
+        return {
+            'builds': self.builds,
+            'evictions': self.evictions,
+            'brotli': brotli is not None,
+            'entries': {group: len(entries) for group, entries in self._groups.items()}
+        }
@@ -0,0 +1,383 @@
+"""Deadlines, hedging, retries and circuit breaking for provider calls.
+
+LLM and image calls used to run without a timeout, so a slow provider held
+a request until the client gave up, and a failing one was called again on
+every request. Each provider gets a ProviderGuard that:
+
+- bounds a call by the provider's own timeout, and by the deadline of the
+  enclosing request (`deadline_scope`, or an explicit `deadline` for
+  streaming responses) when that is sooner, so retries and follow-up calls
+  share one budget instead of each getting a fresh one;
+- sends a duplicate (hedged) request when the first has not answered
+  within the recent p95 latency, and keeps whichever finishes first;
+- retries transient failures (timeouts, connection errors, 429 and 5xx)
+  with jittered exponential backoff while the deadline allows;
+- counts consecutive transient failures in a circuit breaker; once open,
+  calls fail immediately with CircuitOpen (callers degrade to cached or
+  template output) until a single half-open probe succeeds.
+
+Streams are guarded the same way up to their first chunk, which is also
+what gets hedged (against the p95 time to first chunk, tracked separately
+from whole-call latency); once text has reached the client a failure is
+not retried.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import httpx
+
+TRANSIENT_STATUS_CODES = frozenset({408, 409, 425, 429, 500, 502, 503, 504, 529})
+
+# Hedging waits for this many latency samples before trusting the p95
+MIN_HEDGE_SAMPLES = 20
+
+# Marks the end of a guarded stream
+_END = object()
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_deadline: ContextVar[Optional[float]] = ContextVar('provider_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class BudgetSpent(DeadlineExceeded):
+    """The deadline had passed before the provider was called, so it says nothing about the provider"""
+
+
+class CircuitOpen(Exception):
+    def __init__(self, provider: str, retry_after: int):
+        super().__init__(f'{provider} circuit is open')
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def deadline_in(seconds: float) -> float:
+    """An absolute deadline `seconds` from now, for `deadline=` on guarded calls"""
+    return time.monotonic() + seconds
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    """Bound every guarded call inside the block by one shared deadline (nested scopes only shorten it)"""
+    limit = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(min(limit, current) if current is not None else limit)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    status_code = getattr(exc, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status_code in TRANSIENT_STATUS_CODES
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        # Half-open lets exactly one probe through; its outcome closes or reopens the circuit
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def abandon(self):
+        """The caller went away before the call finished; let another request probe"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opens += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def retry_after(self) -> int:
+        if self.state != OPEN:
+            return 1
+        return max(1, int(self.reset_timeout - (time.monotonic() - self.opened_at)) + 1)
+
+
+class ProviderGuard:
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 60,
+        retries: int = 2,
+        backoff: float = 0.5,
+        hedge: bool = True,
+        min_hedge_delay: float = 1.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.min_hedge_delay = min_hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=200)
+        self._first_chunk_latencies = deque(maxlen=200)
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+        self.short_circuited = 0
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise CircuitOpen(self.name, self.breaker.retry_after())
+        self.calls += 1
+
+    def _deadline_at(self, timeout: Optional[float], deadline: Optional[float] = None) -> float:
+        limits = [time.monotonic() + (timeout if timeout is not None else self.timeout), _deadline.get(), deadline]
+        return min(limit for limit in limits if limit is not None)
+
+    def hedge_delay(self, latencies: Optional[deque] = None) -> Optional[float]:
+        latencies = self._latencies if latencies is None else latencies
+        if len(latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(latencies)
+        return max(self.min_hedge_delay, ordered[int(len(ordered) * 0.95) - 1])
+
+    async def _pause(self, attempt: int, deadline_at: float) -> bool:
+        """Sleep a jittered backoff before the next attempt; False when the deadline leaves no room"""
+        delay = random.uniform(0, self.backoff * (2 ** (attempt - 1)))
+        if time.monotonic() + delay >= deadline_at:
+            return False
+        self.retried += 1
+        await asyncio.sleep(delay)
+        return True
+
+    def _failed(self, exc: BaseException) -> bool:
+        """Record a failed attempt; True when it is worth retrying"""
+        if isinstance(exc, DeadlineExceeded):
+            self.deadline_exceeded += 1
+        if isinstance(exc, BudgetSpent) or not is_transient(exc):
+            # Says nothing about the provider's health either way; a half-open
+            # probe that ends like this leaves the circuit for the next request
+            self.breaker.abandon()
+            return False
+        self.failures += 1
+        self.breaker.record_failure()
+        return self.breaker.state != OPEN
+
+    async def call(
+        self,
+        make_call: Callable[[], Awaitable],
+        timeout: Optional[float] = None,
+        hedge: Optional[bool] = None,
+        deadline: Optional[float] = None,
+    ):
+        """Run `make_call()` under the deadline, hedging and retrying transient failures"""
+        self._admit()
+        deadline_at = self._deadline_at(timeout, deadline)
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = await self._attempt(make_call, deadline_at, self.hedge if hedge is None else hedge)
+            except asyncio.CancelledError:
+                self.breaker.abandon()
+                raise
+            except Exception as exc:
+                attempt += 1
+                if not self._failed(exc) or attempt > self.retries or not await self._pause(attempt, deadline_at):
+                    raise
+                logging.warning(f'{self.name} call failed ({type(exc).__name__}), retrying')
+                continue
+            self.breaker.record_success()
+            self._latencies.append(time.monotonic() - started)
+            return result
+
+    async def _attempt(self, make_call: Callable[[], Awaitable], deadline_at: float, hedge: bool):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise BudgetSpent(f'{self.name} deadline exceeded')
+        tasks = [asyncio.create_task(make_call())]
+        try:
+            delay = self.hedge_delay() if hedge else None
+            if delay is not None and delay < remaining:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    self.hedged += 1
+                    tasks.append(asyncio.create_task(make_call()))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            if error is not None and not pending:
+                raise error
+            raise DeadlineExceeded(f'{self.name} deadline exceeded')
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark a losing hedge's exception retrieved
+                    task.exception()
+
+    async def stream(
+        self,
+        open_stream: Callable[[], AsyncIterator[str]],
+        timeout: Optional[float] = None,
+        hedge: Optional[bool] = None,
+        deadline: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """Yield from `open_stream()` under the deadline, hedging and retrying transient failures before the first chunk"""
+        self._admit()
+        deadline_at = self._deadline_at(timeout, deadline)
+        hedge = self.hedge if hedge is None else hedge
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            stream = None
+            streaming = False
+            try:
+                stream, chunk = await self._first_chunk(open_stream, deadline_at, hedge)
+                while chunk is not _END:
+                    if not streaming:
+                        streaming = True
+                        self._first_chunk_latencies.append(time.monotonic() - started)
+                    yield chunk
+                    chunk = await self._next_chunk(stream, deadline_at)
+            except Exception as exc:
+                attempt += 1
+                retry = self._failed(exc)
+                # Once text has reached the client the reply cannot be restarted
+                if streaming or not retry or attempt > self.retries or not await self._pause(attempt, deadline_at):
+                    raise
+                logging.warning(f'{self.name} stream failed before its first chunk ({type(exc).__name__}), retrying')
+                continue
+            except BaseException:
+                # Cancelled, or the consumer stopped reading early
+                if streaming:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.abandon()
+                raise
+            finally:
+                if stream is not None:
+                    await stream.aclose()
+            self.breaker.record_success()
+            return
+
+    async def _next_chunk(self, stream: AsyncIterator[str], deadline_at: float):
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f'{self.name} deadline exceeded')
+        try:
+            return await asyncio.wait_for(stream.__anext__(), remaining)
+        except StopAsyncIteration:
+            return _END
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f'{self.name} deadline exceeded')
+
+    async def _first_chunk(self, open_stream: Callable[[], AsyncIterator[str]], deadline_at: float, hedge: bool):
+        """Open the stream, hedging it if the first chunk is slow; (winning stream, its first chunk)"""
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise BudgetSpent(f'{self.name} deadline exceeded')
+        streams = {}
+
+        def start():
+            stream = open_stream()
+            streams[asyncio.create_task(self._next_chunk(stream, deadline_at))] = stream
+
+        start()
+        primary = next(iter(streams))
+        winner = None
+        try:
+            delay = self.hedge_delay(self._first_chunk_latencies) if hedge else None
+            if delay is not None and delay < remaining:
+                done, _ = await asyncio.wait(list(streams), timeout=delay)
+                if not done:
+                    self.hedged += 1
+                    start()
+
+            pending = set(streams)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        winner = task
+                        return streams[task], task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task, stream in streams.items():
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await stream.aclose()
+
+    def stats(self) -> dict:
+        delay = self.hedge_delay()
+        stream_delay = self.hedge_delay(self._first_chunk_latencies)
+        return {
+            'state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'opens': self.breaker.opens,
+            'calls': self.calls,
+            'failures': self.failures,
+            'retried': self.retried,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'deadline_exceeded': self.deadline_exceeded,
+            'short_circuited': self.short_circuited,
+            'hedge_delay_ms': round(delay * 1000, 1) if delay is not None else None,
+            'stream_hedge_delay_ms': round(stream_delay * 1000, 1) if stream_delay is not None else None
+        }
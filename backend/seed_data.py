@@ -245,6 +245,13 @@ async def seed_database():
     if events:
         await db.timeline_events.insert_many(events)
     
+    # Tell running API servers to refresh their archive snapshots
+    await db.archive_meta.update_one(
+        {'_id': 'archive'},
+        {'$inc': {'version': 1}, '$currentDate': {'updated_at': True}},
+        upsert=True
+    )
+    
     print('Database seeded successfully!')
     client.close()
 
@@ -1,22 +1,45 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, Query, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter
 from typing import List, Optional, Dict
 import uuid
 import json
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
-from emergentintegrations.llm.chat import LlmChat, UserMessage
-from emergentintegrations.llm.openai.image_generation import OpenAIImageGeneration
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+from emergentintegrations.payments.stripe.checkout import CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 import base64
+from spell_cache import create_spell_cache, spell_cache_key, normalize_intention
+from spell_parser import SpellFieldStream, SpellParser
+from llm_stream import stream_chat_completion, complete_chat, streams_directly
+from chat_sessions import ChatSessionStore
+from token_metrics import TokenMetrics
+from image_jobs import ImageJobQueue, JobQueueFull
+from blob_store import create_blob_store, is_content_hash, read_blob
+from image_derivatives import ImageDerivatives, DERIVATIVE_WIDTHS
+from image_cache import ImagePromptCache
+from image_pool import ImagePool
+from resilience import ProviderGuard, CircuitBreaker, CircuitOpen, DeadlineExceeded, deadline_in, deadline_scope
+from spell_templates import template_spell
+from archive_cache import ArchiveCache
+from representations import RepresentationCache
+from prompt_context import PromptContextBuilder
+from intention_index import IntentionIndex
+from db_indexes import ensure_indexes
+from user_cache import UserCache
+from password_hasher import PasswordHasher
+from quota import SpellQuota, QuotaExceeded
+from providers import ProviderRegistry
+from admission import AdmissionController, AdmissionRejected, PRIORITY_PAID, PRIORITY_FREE, PRIORITY_ANONYMOUS
+from singleflight import SingleFlight
+from pymongo.errors import DuplicateKeyError
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -35,6 +58,188 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production'
 JWT_ALGORITHM = 'HS256'
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY', '')
 STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY', '')
+ADMIN_KEY = os.environ.get('ADMIN_KEY', 'change-me-in-production')
+
+# Authenticated user documents, cached briefly per process and invalidated on every user write
+user_cache = UserCache(
+    max_entries=int(os.environ.get('USER_CACHE_MAX_ENTRIES', '10000')),
+    ttl_seconds=float(os.environ.get('USER_CACHE_TTL_SECONDS', '30'))
+)
+
+# Free-tier spell quota, reserved atomically before each generation
+spell_quota = SpellQuota(db.users)
+
+# bcrypt runs on its own thread pool so logins never block the event loop
+password_hasher = PasswordHasher(
+    rounds=int(os.environ.get('BCRYPT_ROUNDS', '12')),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+)
+
+# Outbound LLM, image and Stripe clients sharing one pooled HTTP client per process
+providers = ProviderRegistry(
+    EMERGENT_LLM_KEY,
+    STRIPE_API_KEY,
+    max_connections=int(os.environ.get('PROVIDER_MAX_CONNECTIONS', '100')),
+    max_keepalive=int(os.environ.get('PROVIDER_MAX_KEEPALIVE', '20')),
+    timeout=float(os.environ.get('PROVIDER_TIMEOUT_SECONDS', '120'))
+)
+
+# Deadlines, hedged duplicates after the recent p95, jittered retries and a circuit breaker per provider
+llm_guard = ProviderGuard(
+    'llm',
+    timeout=float(os.environ.get('LLM_TIMEOUT_SECONDS', '60')),
+    retries=int(os.environ.get('LLM_RETRIES', '2')),
+    hedge=os.environ.get('LLM_HEDGE', 'on') == 'on',
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('BREAKER_FAILURES', '5')),
+        reset_timeout=float(os.environ.get('BREAKER_RESET_SECONDS', '30'))
+    )
+)
+# Image calls are slow and costly, so they are not hedged unless asked for
+image_guard = ProviderGuard(
+    'image',
+    timeout=float(os.environ.get('IMAGE_TIMEOUT_SECONDS', '120')),
+    retries=int(os.environ.get('IMAGE_RETRIES', '1')),
+    hedge=os.environ.get('IMAGE_HEDGE', 'off') == 'on',
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('BREAKER_FAILURES', '5')),
+        reset_timeout=float(os.environ.get('BREAKER_RESET_SECONDS', '30'))
+    )
+)
+
+# Whole-request budgets shared by every provider call an endpoint makes
+ENDPOINT_DEADLINES = {
+    'chat': float(os.environ.get('CHAT_DEADLINE_SECONDS', '45')),
+    'spell': float(os.environ.get('SPELL_DEADLINE_SECONDS', '120')),
+    'image': float(os.environ.get('IMAGE_DEADLINE_SECONDS', '150')),
+}
+
+async def _complete_llm(system_message: str, text: str, history: Optional[list] = None, usage: Optional[dict] = None) -> str:
+    """A whole completion through the LLM guard; hedged attempts each count their own usage"""
+    async def attempt():
+        attempt_usage = {}
+        return await complete_chat(EMERGENT_LLM_KEY, system_message, text, history=history, usage=attempt_usage), attempt_usage
+    
+    response, attempt_usage = await llm_guard.call(attempt)
+    if usage is not None:
+        usage.update(attempt_usage)
+    return response
+
+def _stream_llm(system_message: str, text: str, history: Optional[list] = None, usage: Optional[dict] = None, deadline: Optional[float] = None):
+    """Completion deltas through the LLM guard (hedged and retried only before the first delta)
+
+    Streaming endpoints pass their request `deadline`; a `deadline_scope`
+    cannot span the yields of a response generator.
+    """
+    return llm_guard.stream(
+        lambda: stream_chat_completion(EMERGENT_LLM_KEY, system_message, text, history=history, usage=usage),
+        deadline=deadline
+    )
+
+# Prompt/completion/cached token counts and time to first token, per endpoint
+token_metrics = TokenMetrics()
+
+# Chat history per session, compacted to a token budget before it is sent to the model
+chat_sessions = ChatSessionStore(
+    db.chat_sessions,
+    token_budget=int(os.environ.get('CHAT_TOKEN_BUDGET', '3000')),
+    ttl_days=int(os.environ.get('CHAT_SESSION_TTL_DAYS', '30'))
+)
+
+# Concurrency pools for model calls: (capacity, max queue depth, seconds a request may wait)
+_ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '50'))
+_ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_SECONDS', '10'))
+admission = AdmissionController({
+    'chat': (int(os.environ.get('ADMISSION_CHAT_CONCURRENCY', '8')), _ADMISSION_MAX_QUEUE, _ADMISSION_QUEUE_TIMEOUT),
+    'spell': (int(os.environ.get('ADMISSION_SPELL_CONCURRENCY', '8')), _ADMISSION_MAX_QUEUE, _ADMISSION_QUEUE_TIMEOUT),
+    'image': (int(os.environ.get('ADMISSION_IMAGE_CONCURRENCY', '4')), _ADMISSION_MAX_QUEUE, _ADMISSION_QUEUE_TIMEOUT),
+})
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={'detail': 'The oracle is busy, please try again shortly', 'retry_after': exc.retry_after},
+        headers={'Retry-After': str(exc.retry_after)}
+    )
+
+@app.exception_handler(CircuitOpen)
+async def circuit_open_handler(request: Request, exc: CircuitOpen):
+    return JSONResponse(
+        status_code=503,
+        content={'detail': 'The oracle is resting, please try again shortly', 'retry_after': exc.retry_after},
+        headers={'Retry-After': str(exc.retry_after)}
+    )
+
+# Identical spell or image generations already in flight are shared instead of repeated
+generation_flights = SingleFlight()
+
+def _admission_priority(user: Optional[dict]) -> int:
+    """Paid users are admitted ahead of free users, and free users ahead of anonymous ones"""
+    if not user:
+        return PRIORITY_ANONYMOUS
+    return PRIORITY_PAID if user.get('subscription_tier') == 'paid' else PRIORITY_FREE
+
+# Spell result cache (backend: 'memory' per worker, or 'mongo' shared across workers)
+spell_cache = create_spell_cache(
+    db,
+    backend=os.environ.get('SPELL_CACHE_BACKEND', 'memory'),
+    max_entries=int(os.environ.get('SPELL_CACHE_MAX_ENTRIES', '512')),
+    ttl_seconds=int(os.environ.get('SPELL_CACHE_TTL_SECONDS', '86400'))
+)
+
+# Reference archive snapshots, refreshed by change streams or a polled version document
+archive_cache = ArchiveCache(db, poll_interval=float(os.environ.get('ARCHIVE_POLL_SECONDS', '30')))
+
+# Pre-serialized response bodies with ETags; archive entries are dropped whenever a snapshot reloads
+representations = RepresentationCache(
+    cache_control=os.environ.get('ARCHIVE_CACHE_CONTROL', 'public, max-age=300'),
+    max_entries=int(os.environ.get('REPRESENTATION_CACHE_MAX_ENTRIES', '1024'))
+)
+archive_cache.on_reload(lambda name, snapshot: representations.invalidate(name))
+
+# Relevance-ranked archive context for spell prompts, re-indexed with the snapshots
+prompt_context = PromptContextBuilder(per_kind=int(os.environ.get('PROMPT_CONTEXT_PER_KIND', '3')))
+archive_cache.on_reload(lambda name, snapshot: prompt_context.rebuild(archive_cache))
+
+# Content-addressed image storage (backend: 'gridfs', or 'filesystem' under IMAGE_STORE_DIR)
+blob_store = create_blob_store(
+    db,
+    backend=os.environ.get('IMAGE_STORE_BACKEND', 'gridfs'),
+    root=os.environ.get('IMAGE_STORE_DIR')
+)
+
+# WebP/AVIF derivatives at a few widths, encoded in a process pool and stored alongside the originals
+image_derivatives = ImageDerivatives(
+    blob_store,
+    db.image_derivatives,
+    widths=[int(w) for w in os.environ.get('IMAGE_DERIVATIVE_WIDTHS', ','.join(map(str, DERIVATIVE_WIDTHS))).split(',')],
+    workers=int(os.environ.get('IMAGE_DERIVATIVE_WORKERS', '2'))
+)
+
+IMAGE_MODEL = 'gpt-image-1'
+
+IMAGE_JOB_RESULT_TTL = int(os.environ.get('IMAGE_JOB_RESULT_TTL_SECONDS', '86400'))
+
+async def _image_in_use(image_hash: str) -> bool:
+    """Whether a saved spell, an image job result or a cached spell still serves this image"""
+    if await db.user_spells.find_one({'image_hash': image_hash}, {'_id': 1}):
+        return True
+    if await db.image_jobs.find_one({'image_hash': image_hash}, {'_id': 1}):
+        return True
+    return await spell_cache.references(image_hash)
+
+# Renders by (model, styled prompt), evicted least recently used once their blobs pass IMAGE_CACHE_MAX_MB.
+# Dropped blobs outlive every cache that may still hand them out by an hour before they are deleted.
+image_cache = ImagePromptCache(
+    db.image_cache,
+    db.image_cache_releases,
+    blob_store,
+    max_bytes=int(os.environ.get('IMAGE_CACHE_MAX_MB', '1024')) * 1024 * 1024,
+    in_use=_image_in_use,
+    on_release=image_derivatives.discard,
+    grace_seconds=max(spell_cache.backend.ttl_seconds, IMAGE_JOB_RESULT_TTL) + 3600
+)
 
 # Models
 class UserRegister(BaseModel):
@@ -118,9 +323,13 @@ class SpellRequest(BaseModel):
     intention: str
     archetype: Optional[str] = None
     generate_image: bool = True
+    async_image: bool = False  # Return an image_job_id immediately instead of waiting for the image
+    pooled_image: bool = False  # Attach a ready pre-rendered image for the intention's theme when one is available
 
 class ImageGenerationRequest(BaseModel):
     prompt: str
+    async_job: bool = False  # Return a job id to poll instead of waiting for the image
+    fresh: bool = False  # Render a new variation instead of reusing an earlier image of the same prompt
 
 class FavoriteRequest(BaseModel):
     item_type: str
@@ -131,7 +340,8 @@ class SaveSpellRequest(BaseModel):
     archetype_id: Optional[str] = None
     archetype_name: Optional[str] = None
     archetype_title: Optional[str] = None
-    image_base64: Optional[str] = None
+    image_hash: Optional[str] = None
+    image_base64: Optional[str] = None  # Legacy clients; stored in the image store on save
 
 class SavedSpellResponse(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -141,21 +351,37 @@ class SavedSpellResponse(BaseModel):
     archetype_id: Optional[str] = None
     archetype_name: Optional[str] = None
     archetype_title: Optional[str] = None
-    image_base64: Optional[str] = None
+    image_hash: Optional[str] = None
+    image_url: Optional[str] = None
+    image_placeholder: Optional[str] = None
     created_at: str
     title: str
 
+class SavedSpellSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    title: str
+    archetype_id: Optional[str] = None
+    archetype_name: Optional[str] = None
+    created_at: str
+    image_url: Optional[str] = None
+    image_placeholder: Optional[str] = None
+
+class GrimoireListResponse(BaseModel):
+    spells: List[SavedSpellSummary]
+    next_cursor: Optional[str] = None
+
 class WaitlistRequest(BaseModel):
     email: EmailStr
     name: Optional[str] = None
     source: Optional[str] = 'homepage'
 
 # Helper functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password(password: str, hashed: str) -> bool:
+    return await password_hasher.verify(password, hashed)
 
 def create_token(user_id: str) -> str:
     payload = {
@@ -171,9 +397,9 @@ async def check_spell_generation_limit(user: dict) -> dict:
     if subscription_tier == 'paid':
         return {'can_generate': True, 'remaining': -1, 'limit': -1}
     
-    # Free tier - limit to 3 spells
-    count = user.get('spell_generation_count', 0)
-    limit = 3
+    # Free tier - limit to 3 spells per window
+    count = spell_quota.effective_count(user)
+    limit = spell_quota.limit
     
     return {
         'can_generate': count < limit,
@@ -182,24 +408,19 @@ async def check_spell_generation_limit(user: dict) -> dict:
         'current_count': count
     }
 
-async def increment_spell_count(user_id: str):
-    """Increment user's spell generation count"""
-    await db.users.update_one(
-        {'id': user_id},
-        {
-            '$inc': {
-                'spell_generation_count': 1,
-                'total_spells_generated': 1
-            }
-        }
-    )
+async def _find_user(user_id: str) -> Optional[dict]:
+    return await db.users.find_one({'id': user_id}, {'_id': 0})
+
+async def load_user(user_id: str) -> Optional[dict]:
+    """Fetch a user by id through the per-process user cache"""
+    return await user_cache.get_or_load(user_id, _find_user)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get('user_id')
-        user = await db.users.find_one({'id': user_id}, {'_id': 0})
+        user = await load_user(user_id)
         if not user:
             raise HTTPException(status_code=401, detail='User not found')
         return user
@@ -221,7 +442,7 @@ async def register(user_data: UserRegister):
         'id': user_id,
         'email': user_data.email,
         'name': user_data.name,
-        'password_hash': hash_password(user_data.password),
+        'password_hash': await hash_password(user_data.password),
         'favorites': [],
         'created_at': current_time.isoformat(),
         
@@ -243,7 +464,11 @@ async def register(user_data: UserRegister):
         'last_login': current_time.isoformat(),
         'upgraded_at': None
     }
-    await db.users.insert_one(user)
+    try:
+        await db.users.insert_one(user)
+    except DuplicateKeyError:
+        # A concurrent registration with the same email won the unique index
+        raise HTTPException(status_code=400, detail='Email already registered')
     
     token = create_token(user_id)
     user_response = UserResponse(
@@ -259,14 +484,18 @@ async def register(user_data: UserRegister):
 @api_router.post('/auth/login', response_model=AuthResponse)
 async def login(credentials: UserLogin):
     user = await db.users.find_one({'email': credentials.email}, {'_id': 0})
-    if not user or not verify_password(credentials.password, user['password_hash']):
+    if not user or not await verify_password(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail='Invalid credentials')
     
-    # Update last login
+    # Update last login, upgrading the hash if BCRYPT_ROUNDS has changed since it was made
+    updates = {'last_login': datetime.now(timezone.utc).isoformat()}
+    if password_hasher.needs_rehash(user['password_hash']):
+        updates['password_hash'] = await password_hasher.rehash(credentials.password)
     await db.users.update_one(
         {'id': user['id']},
-        {'$set': {'last_login': datetime.now(timezone.utc).isoformat()}}
+        {'$set': updates}
     )
+    user_cache.invalidate(user['id'])
     
     token = create_token(user['id'])
     user_response = UserResponse(
@@ -289,7 +518,7 @@ async def update_email(request: UpdateEmailRequest, user = Depends(get_current_u
     """Update user's email address"""
     
     # Verify password
-    if not verify_password(request.password, user['password_hash']):
+    if not await verify_password(request.password, user['password_hash']):
         raise HTTPException(status_code=401, detail='Incorrect password')
     
     # Check if new email is already taken
@@ -298,10 +527,14 @@ async def update_email(request: UpdateEmailRequest, user = Depends(get_current_u
         raise HTTPException(status_code=400, detail='Email already in use')
     
     # Update email
-    await db.users.update_one(
-        {'id': user['id']},
-        {'$set': {'email': request.new_email}}
-    )
+    try:
+        await db.users.update_one(
+            {'id': user['id']},
+            {'$set': {'email': request.new_email}}
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail='Email already in use')
+    user_cache.invalidate(user['id'])
     
     return UserResponse(
         id=user['id'],
@@ -331,68 +564,75 @@ async def join_waitlist(request: WaitlistRequest):
         'notified': False
     }
     
-    await db.waitlist.insert_one(waitlist_entry)
+    try:
+        await db.waitlist.insert_one(waitlist_entry)
+    except DuplicateKeyError:
+        return {'success': True, 'message': 'Email already registered', 'already_exists': True}
     
     return {'success': True, 'message': 'Successfully joined the waitlist!'}
 
-# Deities endpoints
+# Archive endpoints, served from in-memory snapshots (see archive_cache.py) as
+# representations pre-serialized once per snapshot version (see representations.py)
+def _archive_response(request: Request, collection: str, key, model, value) -> Response:
+    build = lambda: TypeAdapter(model).dump_json(value)
+    return representations.get(collection, key, build).response(request)
+
 @api_router.get('/deities', response_model=List[Deity])
-async def get_deities():
-    deities = await db.deities.find({}, {'_id': 0}).to_list(100)
-    return deities
+async def get_deities(request: Request):
+    return _archive_response(request, 'deities', 'list', List[Deity], archive_cache.list('deities'))
 
 @api_router.get('/deities/{deity_id}', response_model=Deity)
-async def get_deity(deity_id: str):
-    deity = await db.deities.find_one({'id': deity_id}, {'_id': 0})
+async def get_deity(deity_id: str, request: Request):
+    deity = archive_cache.get('deities', deity_id)
     if not deity:
         raise HTTPException(status_code=404, detail='Deity not found')
-    return deity
+    return _archive_response(request, 'deities', ('id', deity_id), Deity, deity)
 
 # Historical Figures endpoints
 @api_router.get('/historical-figures', response_model=List[HistoricalFigure])
-async def get_figures():
-    figures = await db.historical_figures.find({}, {'_id': 0}).to_list(100)
-    return figures
+async def get_figures(request: Request):
+    return _archive_response(request, 'historical_figures', 'list', List[HistoricalFigure], archive_cache.list('historical_figures'))
 
 @api_router.get('/historical-figures/{figure_id}', response_model=HistoricalFigure)
-async def get_figure(figure_id: str):
-    figure = await db.historical_figures.find_one({'id': figure_id}, {'_id': 0})
+async def get_figure(figure_id: str, request: Request):
+    figure = archive_cache.get('historical_figures', figure_id)
     if not figure:
         raise HTTPException(status_code=404, detail='Figure not found')
-    return figure
+    return _archive_response(request, 'historical_figures', ('id', figure_id), HistoricalFigure, figure)
 
 # Sacred Sites endpoints
 @api_router.get('/sacred-sites', response_model=List[SacredSite])
-async def get_sites():
-    sites = await db.sacred_sites.find({}, {'_id': 0}).to_list(100)
-    return sites
+async def get_sites(request: Request):
+    return _archive_response(request, 'sacred_sites', 'list', List[SacredSite], archive_cache.list('sacred_sites'))
 
 @api_router.get('/sacred-sites/{site_id}', response_model=SacredSite)
-async def get_site(site_id: str):
-    site = await db.sacred_sites.find_one({'id': site_id}, {'_id': 0})
+async def get_site(site_id: str, request: Request):
+    site = archive_cache.get('sacred_sites', site_id)
     if not site:
         raise HTTPException(status_code=404, detail='Site not found')
-    return site
+    return _archive_response(request, 'sacred_sites', ('id', site_id), SacredSite, site)
 
 # Rituals endpoints
 @api_router.get('/rituals', response_model=List[Ritual])
-async def get_rituals(category: Optional[str] = None):
-    query = {'category': category} if category else {}
-    rituals = await db.rituals.find(query, {'_id': 0}).to_list(100)
-    return rituals
+async def get_rituals(request: Request, category: Optional[str] = None):
+    if category:
+        rituals = archive_cache.by_category('rituals', category)
+        # Every unknown category is the same empty list; only real categories get their own entry
+        key = ('category', category) if rituals else ('category', None)
+        return _archive_response(request, 'rituals', key, List[Ritual], rituals)
+    return _archive_response(request, 'rituals', 'list', List[Ritual], archive_cache.list('rituals'))
 
 @api_router.get('/rituals/{ritual_id}', response_model=Ritual)
-async def get_ritual(ritual_id: str):
-    ritual = await db.rituals.find_one({'id': ritual_id}, {'_id': 0})
+async def get_ritual(ritual_id: str, request: Request):
+    ritual = archive_cache.get('rituals', ritual_id)
     if not ritual:
         raise HTTPException(status_code=404, detail='Ritual not found')
-    return ritual
+    return _archive_response(request, 'rituals', ('id', ritual_id), Ritual, ritual)
 
 # Timeline endpoints
 @api_router.get('/timeline', response_model=List[TimelineEvent])
-async def get_timeline():
-    events = await db.timeline_events.find({}, {'_id': 0}).sort('year', 1).to_list(100)
-    return events
+async def get_timeline(request: Request):
+    return _archive_response(request, 'timeline_events', 'list', List[TimelineEvent], archive_cache.list('timeline_events'))
 
 # Archetype personas for AI spell generation
 ARCHETYPE_PERSONAS = {
@@ -509,37 +749,173 @@ When creating spells or rituals:
 
 Remember: Every spell is a formula others have used. Users can adapt, break, and build their own. No intermediaries necessary."""
 
+CHAT_FALLBACK_REPLY = ("The oracle is resting for a moment and cannot answer just now. "
+                       "Hold your question close and ask again shortly.")
+
+def _chat_owner(user: Optional[dict]) -> Optional[str]:
+    return user['id'] if user else None
+
+async def _chat_context(session_id: str, owner: Optional[str], archetype: Optional[str]):
+    """Return the system message and compacted history for the next turn of a chat session"""
+    # Determine system message based on archetype
+    if archetype and archetype in ARCHETYPE_PERSONAS:
+        system_message = ARCHETYPE_PERSONAS[archetype]['system_prompt']
+    else:
+        system_message = DEFAULT_SYSTEM_MESSAGE
+    
+    summary, history = chat_sessions.context(await chat_sessions.load(session_id, owner))
+    return chat_sessions.system_message(system_message, summary), history
+
 # AI Chat endpoint
 @api_router.post('/ai/chat')
-async def chat_with_ai(message_data: ChatMessage):
+async def chat_with_ai(
+    message_data: ChatMessage,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
     try:
-        session_id = message_data.session_id or str(uuid.uuid4())
-        
-        # Determine system message based on archetype
-        if message_data.archetype and message_data.archetype in ARCHETYPE_PERSONAS:
-            persona = ARCHETYPE_PERSONAS[message_data.archetype]
-            system_message = persona['system_prompt']
-        else:
-            system_message = DEFAULT_SYSTEM_MESSAGE
-        
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=session_id,
-            system_message=system_message
-        ).with_model('openai', 'gpt-5.1')
+        user = await _get_optional_user(credentials)
+        owner = _chat_owner(user)
+        session_id = await chat_sessions.resolve(message_data.session_id, owner)
+        system_message, history = await _chat_context(session_id, owner, message_data.archetype)
         
-        user_message = UserMessage(text=message_data.message)
-        response = await chat.send_message(user_message)
+        usage = {}
+        try:
+            with deadline_scope(ENDPOINT_DEADLINES['chat']):
+                async with admission.slot('chat', _admission_priority(user)), providers.track('llm'):
+                    response = await _complete_llm(system_message, message_data.message, history=history, usage=usage)
+        except CircuitOpen:
+            # Answer at once rather than wait on a provider that is known to be failing
+            return {'response': CHAT_FALLBACK_REPLY, 'session_id': session_id, 'archetype': message_data.archetype, 'degraded': True}
+        token_metrics.record('chat', usage, system_message + message_data.message, response)
         
+        await chat_sessions.append(session_id, owner, message_data.archetype, message_data.message, response)
         return {'response': response, 'session_id': session_id, 'archetype': message_data.archetype}
+    except AdmissionRejected:
+        raise
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail='The oracle took too long to answer, please try again')
     except Exception as e:
         logging.error(f'AI chat error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to process chat request')
 
+async def _stream_chat_reply(session_id: str, owner: Optional[str], archetype: Optional[str], message: str, priority: int):
+    """Yield reply text deltas for one chat turn and record the turn once it is complete"""
+    deadline = deadline_in(ENDPOINT_DEADLINES['chat'])
+    system_message, history = await _chat_context(session_id, owner, archetype)
+    chunks = []
+    usage = {}
+    try:
+        async with admission.slot('chat', priority), providers.track('llm'):
+            async for delta in _stream_llm(system_message, message, history=history, usage=usage, deadline=deadline):
+                chunks.append(delta)
+                yield delta
+    except CircuitOpen:
+        # Raised before any text is sent; the fallback reply is not recorded in the session
+        yield CHAT_FALLBACK_REPLY
+        return
+    token_metrics.record('chat_stream', usage, system_message + message, ''.join(chunks))
+    await chat_sessions.append(session_id, owner, archetype, message, ''.join(chunks))
+
+@api_router.post('/ai/chat/stream')
+async def chat_with_ai_stream(
+    message_data: ChatMessage,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """Stream a chat reply as Server-Sent Events.
+    
+    Emits `start` (session_id and archetype), a `delta` event per chunk of
+    reply text, then `complete` with the full response, or `error`.
+    """
+    user = await _get_optional_user(credentials)
+    priority = _admission_priority(user)
+    if admission.saturated('chat', priority):
+        raise AdmissionRejected('chat', admission.retry_after('chat'))
+    owner = _chat_owner(user)
+    session_id = await chat_sessions.resolve(message_data.session_id, owner)
+    
+    async def event_stream():
+        yield _sse_event('start', {'session_id': session_id, 'archetype': message_data.archetype})
+        chunks = []
+        try:
+            async for delta in _stream_chat_reply(session_id, owner, message_data.archetype, message_data.message, priority):
+                chunks.append(delta)
+                yield _sse_event('delta', {'text': delta})
+            yield _sse_event('complete', {
+                'response': ''.join(chunks),
+                'session_id': session_id,
+                'archetype': message_data.archetype
+            })
+        except AdmissionRejected as e:
+            yield _sse_event('error', {'detail': 'The oracle is busy, please try again shortly', 'status': 429, 'retry_after': e.retry_after})
+        except Exception as e:
+            logging.error(f'AI chat stream error: {str(e)}')
+            yield _sse_event('error', {'detail': 'Failed to process chat request'})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api_router.websocket('/ai/chat/ws')
+async def chat_websocket(websocket: WebSocket, token: Optional[str] = None):
+    """Chat over one WebSocket for a whole conversation.
+    
+    The optional `token` query parameter is resolved to a user once per
+    connection. Each client frame is a JSON ChatMessage; `session_id` and
+    `archetype` default to the previous turn's, so a client can send just
+    `{"message": ...}`. Each reply arrives as `start`, `delta`... and
+    `complete` frames (or `error`), with the event name in `type`.
+    """
+    await websocket.accept()
+    credentials = HTTPAuthorizationCredentials(scheme='Bearer', credentials=token) if token else None
+    user = await _get_optional_user(credentials)
+    priority = _admission_priority(user)
+    owner = _chat_owner(user)
+    session_id = None
+    archetype = None
+    try:
+        while True:
+            try:
+                message_data = ChatMessage(**await websocket.receive_json())
+            except (ValueError, TypeError) as e:
+                await websocket.send_json({'type': 'error', 'detail': f'Invalid message: {str(e)}'})
+                continue
+            
+            session_id = await chat_sessions.resolve(message_data.session_id or session_id, owner)
+            if 'archetype' in message_data.model_fields_set:
+                archetype = message_data.archetype
+            await websocket.send_json({'type': 'start', 'session_id': session_id, 'archetype': archetype})
+            
+            chunks = []
+            try:
+                async for delta in _stream_chat_reply(session_id, owner, archetype, message_data.message, priority):
+                    chunks.append(delta)
+                    await websocket.send_json({'type': 'delta', 'text': delta})
+            except AdmissionRejected as e:
+                await websocket.send_json({
+                    'type': 'error', 'detail': 'The oracle is busy, please try again shortly',
+                    'status': 429, 'retry_after': e.retry_after
+                })
+                continue
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                logging.error(f'AI chat websocket error: {str(e)}')
+                await websocket.send_json({'type': 'error', 'detail': 'Failed to process chat request'})
+                continue
+            
+            await websocket.send_json({
+                'type': 'complete',
+                'response': ''.join(chunks),
+                'session_id': session_id,
+                'archetype': archetype
+            })
+    except WebSocketDisconnect:
+        pass
+
 # Archetypes endpoint - returns all archetypes data
-@api_router.get('/archetypes')
-async def get_archetypes():
-    """Return all available archetypes for the frontend"""
+def _archetype_list_json() -> bytes:
     archetypes = []
     for archetype_id, persona in ARCHETYPE_PERSONAS.items():
         archetypes.append({
@@ -547,7 +923,12 @@ async def get_archetypes():
             'name': persona['name'],
             'title': persona['title']
         })
-    return archetypes
+    return json.dumps(archetypes, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+@api_router.get('/archetypes')
+async def get_archetypes(request: Request):
+    """Return all available archetypes for the frontend"""
+    return representations.get('archetypes', 'list', _archetype_list_json).response(request)
 
 # Historical sources database for citations
 HISTORICAL_SOURCES = {
@@ -582,6 +963,10 @@ HISTORICAL_SOURCES = {
     ]
 }
 
+# Intention classifier and citation index over HISTORICAL_SOURCES, refreshed with the archive snapshots
+intention_index = IntentionIndex(HISTORICAL_SOURCES)
+archive_cache.on_reload(lambda name, snapshot: intention_index.rebuild(archive_cache))
+
 # Archetype-specific image style prompts
 ARCHETYPE_IMAGE_STYLES = {
     'shiggy': 'vintage WWII era wartime poster style, Rubáiyát of Omar Khayyám illustration, Edmund Dulac aesthetic, muted earth tones with gold accents, birds and poetry motifs, 1940s British home front imagery',
@@ -591,223 +976,674 @@ ARCHETYPE_IMAGE_STYLES = {
     'neutral': 'vintage occult grimoire illustration, woodcut engraving style, parchment texture, mystical symbols, 1920s-1940s esoteric art'
 }
 
-# Enhanced spell generation endpoint with structured output
-@api_router.post('/ai/generate-spell')
-async def generate_spell(
-    request: SpellRequest,
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
-):
-    """Generate a structured spell with historical context and optional imagery"""
+# Subjects for pre-rendered header images, one per intention category
+CATEGORY_IMAGE_MOTIFS = {
+    'protection': 'a warding circle of salt and iron around a candlelit threshold, protective sigils',
+    'courage': 'a lone figure before a rising sun, lion and sword emblems, open road',
+    'love': 'two intertwined roses beneath a crescent moon, rose quartz and red cord',
+    'healing': 'herbs drying above a still bowl of water, soft dawn light, green and gold',
+    'divination': 'tarot cards fanned beside a scrying mirror, stars and an open eye',
+    'ancestors': 'an ancestral altar with old photographs, candles and offerings, family tree roots',
+    'general': 'an open grimoire on an altar, candles, crystals and a crescent moon'
+}
+
+def _image_style_key(archetype_id: Optional[str]) -> str:
+    return archetype_id if archetype_id in ARCHETYPE_IMAGE_STYLES else 'neutral'
+
+def _styled_image_prompt(archetype_id: Optional[str], subject: str) -> str:
+    return f"{ARCHETYPE_IMAGE_STYLES[_image_style_key(archetype_id)]}, {subject}, mystical ritual scene, no text"
+
+def _resolve_archetype(archetype_id: Optional[str]):
+    """Return (id, name, title) for a requested archetype, falling back to the guide"""
+    if archetype_id and archetype_id in ARCHETYPE_PERSONAS:
+        persona = ARCHETYPE_PERSONAS[archetype_id]
+        return archetype_id, persona['name'], persona['title']
+    return None, 'The Crowlands Guide', 'Keeper of Ancestral Wisdom'
+
+async def _get_optional_user(credentials: Optional[HTTPAuthorizationCredentials]):
+    """Resolve the bearer token to a user, or None for anonymous requests"""
+    if not credentials:
+        return None
     try:
-        # Check if user is authenticated
-        user = None
-        if credentials:
-            try:
-                token = credentials.credentials
-                payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-                user_id = payload.get('user_id')
-                user = await db.users.find_one({'id': user_id}, {'_id': 0})
-            except:
-                pass  # Anonymous user
-        
-        # Check generation limits for authenticated users
-        if user:
-            limit_check = await check_spell_generation_limit(user)
-            if not limit_check['can_generate']:
-                raise HTTPException(
-                    status_code=403, 
-                    detail={
-                        'error': 'spell_limit_reached',
-                        'message': f"You've reached your limit of {limit_check['limit']} free spells. Upgrade to Pro for unlimited spell generation!",
-                        'limit': limit_check['limit'],
-                        'current_count': limit_check['current_count']
-                    }
-                )
-        
-        session_id = str(uuid.uuid4())
-        archetype_id = request.archetype
-        
-        # Get archetype info
-        if archetype_id and archetype_id in ARCHETYPE_PERSONAS:
-            persona = ARCHETYPE_PERSONAS[archetype_id]
-            archetype_name = persona['name']
-            archetype_title = persona['title']
-        else:
-            archetype_id = None
-            archetype_name = 'The Crowlands Guide'
-            archetype_title = 'Keeper of Ancestral Wisdom'
-        
-        # Fetch related content from database for context
-        deities = await db.deities.find({}, {'_id': 0, 'name': 1, 'description': 1}).to_list(10)
-        rituals = await db.rituals.find({}, {'_id': 0, 'name': 1, 'description': 1}).to_list(10)
-        figures = await db.historical_figures.find({}, {'_id': 0, 'name': 1, 'bio': 1}).to_list(10)
-        
-        # Build context from database
-        db_context = ""
-        if deities:
-            db_context += f"\\nRELEVANT DEITIES FROM OUR ARCHIVE: {', '.join([d['name'] for d in deities])}"
-        if rituals:
-            db_context += f"\\nRELEVANT RITUALS FROM OUR ARCHIVE: {', '.join([r['name'] for r in rituals])}"
-        if figures:
-            db_context += f"\\nHISTORICAL FIGURES TO REFERENCE: {', '.join([f['name'] for f in figures])}"
-        
-        # Build the structured prompt
-        structured_prompt = f"""Create a spell/ritual for this intention: "{request.intention}"
+        token = credentials.credentials
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        user_id = payload.get('user_id')
+        return await load_user(user_id)
+    except:
+        return None  # Anonymous user
 
-You MUST respond with a JSON object in this EXACT format (no markdown, just pure JSON):
-{{
+async def _reserve_spell(user: Optional[dict]):
+    """Charge one generation to an authenticated user before any model call"""
+    if not user:
+        return None
+    try:
+        reservation = await spell_quota.reserve(user['id'])
+    except QuotaExceeded as e:
+        raise HTTPException(
+            status_code=403, 
+            detail={
+                'error': 'spell_limit_reached',
+                'message': f"You've reached your limit of {e.limit} free spells. Upgrade to Pro for unlimited spell generation!",
+                'limit': e.limit,
+                'current_count': e.count
+            }
+        )
+    user_cache.invalidate(user['id'])
+    return reservation
+
+async def _refund_spell(reservation):
+    """Give a reservation back when its generation failed"""
+    if reservation and reservation.charged:
+        await spell_quota.refund(reservation)
+        user_cache.invalidate(reservation.user_id)
+
+def _limit_info(reservation) -> Optional[dict]:
+    return spell_quota.limit_info(reservation) if reservation else None
+
+# Static spell instructions live in the system message, compiled once per archetype, so every
+# request shares the same long prefix (cacheable by the provider) and only the tail varies
+SPELL_FORMAT_INSTRUCTIONS = """You MUST respond with a JSON object in this EXACT format (no markdown, just pure JSON):
+{
     "title": "A poetic, evocative title for this spell",
     "subtitle": "A brief tagline or description (10 words max)",
+    "image_prompt": "A detailed prompt to generate a header image for this spell (describe visual elements, mood, symbols)",
     "introduction": "A 2-3 sentence personal introduction in your voice, speaking directly to the seeker",
     "materials": [
-        {{"name": "Material name", "icon": "candle|herb|crystal|feather|water|fire|moon|sun|book|pen|mirror|salt|oil|incense|bell|cord|photo|bowl", "note": "Brief note on why/how to use"}},
+        {"name": "Material name", "icon": "candle|herb|crystal|feather|water|fire|moon|sun|book|pen|mirror|salt|oil|incense|bell|cord|photo|bowl", "note": "Brief note on why/how to use"},
     ],
-    "timing": {{
+    "timing": {
         "moon_phase": "New Moon|Waxing|Full Moon|Waning|Any",
         "time_of_day": "Dawn|Morning|Noon|Dusk|Night|Midnight|Any",
         "day": "Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday|Any",
         "note": "Brief explanation of timing significance"
-    }},
+    },
     "steps": [
-        {{"number": 1, "title": "Step title", "instruction": "Detailed instruction", "duration": "5 minutes", "note": "Optional tip or variation"}}
+        {"number": 1, "title": "Step title", "instruction": "Detailed instruction", "duration": "5 minutes", "note": "Optional tip or variation"}
     ],
-    "spoken_words": {{
+    "spoken_words": {
         "invocation": "Words to speak at the beginning (can be poetry, affirmation, or prayer)",
         "main_incantation": "The central words of power for this spell",
         "closing": "Words to seal and close the ritual"
-    }},
-    "historical_context": {{
+    },
+    "historical_context": {
         "tradition": "Name the magical tradition this draws from",
         "time_period": "1910-1945 or relevant era",
         "practitioners": ["Historical figures who used similar practices"],
-        "sources": [
-            {{"author": "Author name", "work": "Book/work title", "year": 1930, "relevance": "How this source relates to the spell"}}
-        ],
         "cultural_notes": "Any important cultural or historical context"
-    }},
+    },
     "variations": [
-        {{"name": "Variation name", "description": "How to adapt for different needs"}}
+        {"name": "Variation name", "description": "How to adapt for different needs"}
     ],
     "warnings": ["Any cautions or ethical considerations"],
-    "closing_message": "A personal message of encouragement in your voice",
-    "image_prompt": "A detailed prompt to generate a header image for this spell (describe visual elements, mood, symbols)"
-}}
+    "closing_message": "A personal message of encouragement in your voice"
+}
 
 IMPORTANT GUIDELINES:
 - Include 4-8 materials with appropriate icons
 - Include 5-8 detailed steps
-- Cite at least 2-3 historical sources with real books/authors from the 1910-1945 period
+- Do not write a sources list; draw on the verified sources given with the intention where they fit
 - The spoken_words should feel authentic to your tradition
 - Make the historical_context genuinely educational
+- Respond ONLY with the JSON object, no other text"""
+
+SPELL_SYSTEM_MESSAGES = {
+    archetype_id: f"{persona['system_prompt']}\n\n{SPELL_FORMAT_INSTRUCTIONS}"
+    for archetype_id, persona in ARCHETYPE_PERSONAS.items()
+}
+SPELL_SYSTEM_MESSAGES[None] = f"{DEFAULT_SYSTEM_MESSAGE}\n\n{SPELL_FORMAT_INSTRUCTIONS}"
+
+def _build_spell_prompt(intention: str, citations: List[dict]) -> str:
+    """The per-request part of the spell prompt: retrieved context first, the intention last"""
+    # Archive entries most relevant to this intention (memoized, no database round trips)
+    db_context = prompt_context.build(intention)
+    
+    # Verified citations are attached after parsing, so the model only needs to know them
+    sources_context = '\n'.join(f"- {source['author']}, {source['work']} ({source['year']})" for source in citations)
+    
+    return f"""VERIFIED SOURCES (attached to the spell automatically):
+{sources_context}
 {db_context}
 
-Respond ONLY with the JSON object, no other text."""
+Create a spell/ritual for this intention: "{intention}\""""
 
-        # Get system message based on archetype
-        if archetype_id and archetype_id in ARCHETYPE_PERSONAS:
-            system_message = ARCHETYPE_PERSONAS[archetype_id]['system_prompt'] + "\\n\\nYou must respond with structured JSON as specified."
-        else:
-            system_message = DEFAULT_SYSTEM_MESSAGE + "\\n\\nYou must respond with structured JSON as specified."
+def _attach_citations(spell_data: dict, citations: List[dict]):
+    """Fill historical_context.sources from the citation index instead of the model"""
+    if spell_data.get('parse_error'):
+        return
+    historical_context = spell_data.setdefault('historical_context', {})
+    if isinstance(historical_context, dict):
+        historical_context['sources'] = [
+            {'author': source['author'], 'work': source['work'], 'year': source['year'], 'relevance': source['quote']}
+            for source in citations
+        ]
+
+def _spell_system_message(archetype_id: Optional[str]) -> str:
+    return SPELL_SYSTEM_MESSAGES.get(archetype_id, SPELL_SYSTEM_MESSAGES[None])
+
+# Schema-aware parsing with local repair of malformed or truncated spell output
+spell_parser = SpellParser()
+
+async def _reask_spell_sections(missing: List[str], system_message: str, structured_prompt: str, priority: int) -> dict:
+    """Ask the model again for only the spell sections that could not be recovered"""
+    prompt = f"""{structured_prompt}
+
+Your previous reply was cut off or malformed. Respond ONLY with a JSON object containing just these keys, in the format above: {', '.join(missing)}"""
+    usage = {}
+    try:
+        async with admission.slot('spell', priority), providers.track('llm'):
+            response = await _complete_llm(system_message, prompt, usage=usage)
+    except Exception as e:
+        logging.error(f'Spell section re-ask error: {str(e)}')
+        return {}
+    token_metrics.record('spell_repair', usage, system_message + prompt, response)
+    sections, _ = spell_parser.parse(response)
+    return {key: sections[key] for key in missing if key in sections}
+
+async def _parse_spell_response(response: str, system_message: str, structured_prompt: str, priority: int) -> dict:
+    spell_data, missing = spell_parser.parse(response)
+    if not spell_data:
+        # Nothing recoverable; return the raw response
+        return {
+            'title': 'Your Custom Spell',
+            'raw_response': response,
+            'parse_error': True
+        }
+    if missing:
+        spell_data.update(await _reask_spell_sections(missing, system_message, structured_prompt, priority))
+        missing = [key for key in missing if key not in spell_data]
+        if missing:
+            spell_data['incomplete_fields'] = missing
+    return spell_data
+
+async def _render_image(prompt: str, cache: bool = True) -> Optional[str]:
+    """Call the image model, store the first image and return its content hash"""
+    async with providers.track('image'):
+        images = await image_guard.call(lambda: providers.image_generator().generate_images(
+            prompt=prompt,
+            model=IMAGE_MODEL,
+            number_of_images=1
+        ))
+    
+    if images and len(images) > 0:
+        image_hash = await blob_store.put(images[0])
+        if cache:
+            await image_cache.put(IMAGE_MODEL, prompt, image_hash, len(images[0]))
+        image_derivatives.schedule(image_hash)
+        return image_hash
+    return None
+
+async def _cached_image(prompt: str, fresh: bool = False) -> Optional[str]:
+    """An earlier render of this exact prompt, unless a fresh variation was asked for"""
+    if fresh:
+        return None
+    try:
+        return await image_cache.get(IMAGE_MODEL, prompt)
+    except Exception as cache_error:
+        logging.error(f'Image cache lookup error: {str(cache_error)}')
+    return None
+
+async def _render_job_image(prompt: str, fresh: bool = False) -> Optional[str]:
+    cached = await _cached_image(prompt, fresh)
+    if cached:
+        return cached
+    # Jobs share the 'image' pool with foreground renders so the provider sees one concurrency budget
+    async with admission.slot('image', PRIORITY_FREE):
+        return await _render_image(prompt)
+
+# Background image jobs; renders still go through the 'image' admission pool, workers only bound queue draining
+image_jobs = ImageJobQueue(
+    db.image_jobs,
+    _render_job_image,
+    workers=int(os.environ.get('IMAGE_JOB_WORKERS', '2')),
+    max_queue=int(os.environ.get('IMAGE_JOB_MAX_QUEUE', '100')),
+    result_ttl_seconds=IMAGE_JOB_RESULT_TTL
+)
+
+async def _render_pool_image(prompt: str) -> Optional[str]:
+    # Pooled images are distinct variations, so they bypass the prompt cache; refills queue behind seekers
+    async with admission.slot('image', PRIORITY_ANONYMOUS):
+        return await _render_image(prompt, cache=False)
+
+# Ready header images per (archetype style, intention category); IMAGE_POOL_SIZE=0 disables the pool
+image_pool = ImagePool(
+    db.image_pool,
+    _render_pool_image,
+    {
+        (style_key, category): _styled_image_prompt(style_key, motif)
+        for style_key in ARCHETYPE_IMAGE_STYLES
+        for category, motif in CATEGORY_IMAGE_MOTIFS.items()
+    },
+    size=int(os.environ.get('IMAGE_POOL_SIZE', '0')),
+    check_interval=float(os.environ.get('IMAGE_POOL_CHECK_SECONDS', '300'))
+)
+
+async def _take_pooled_image(intention: str, archetype_id: Optional[str]) -> Optional[str]:
+    """A ready image for the intention's theme, or None when that pool is empty"""
+    category, _ = intention_index.classify(intention)
+    try:
+        return await image_pool.take(_image_style_key(archetype_id), category)
+    except Exception as pool_error:
+        logging.error(f'Image pool error: {str(pool_error)}')
+    return None
+
+def _image_url(image_hash: Optional[str]) -> Optional[str]:
+    return f'/api/images/{image_hash}' if image_hash else None
+
+def _spell_image_prompt(spell_data: dict, archetype_id: Optional[str]) -> str:
+    return _styled_image_prompt(archetype_id, spell_data['image_prompt'])
+
+async def _generate_spell_image(spell_data: dict, archetype_id: Optional[str], priority: int) -> Optional[str]:
+    """Render and store the spell's header image, returning its hash or None on failure"""
+    if 'image_prompt' not in spell_data:
+        return None
+    try:
+        image_prompt = _spell_image_prompt(spell_data, archetype_id)
+        cached = await _cached_image(image_prompt)
+        if cached:
+            return cached
+        async with admission.slot('image', priority):
+            return await _render_image(image_prompt)
+    except Exception as img_error:
+        logging.error(f'Spell image generation error: {str(img_error)}')
+    return None
+
+async def _submit_spell_image_job(spell_data: dict, archetype_id: Optional[str]) -> Optional[str]:
+    """Queue the spell's header image in the background, returning the job id"""
+    if 'image_prompt' not in spell_data:
+        return None
+    try:
+        job = await image_jobs.submit(
+            _spell_image_prompt(spell_data, archetype_id),
+            kind='spell_image',
+            metadata={'archetype_id': archetype_id}
+        )
+        return job['id']
+    except JobQueueFull:
+        logging.warning('Image job queue full, spell returned without image job')
+    return None
+
+# 'speculative' starts a spell's image as soon as its image_prompt streams in (the schema asks for it
+# early), overlapping the image call with the rest of the text; 'sequential' waits for the whole spell
+SPELL_IMAGE_PIPELINE = os.environ.get('SPELL_IMAGE_PIPELINE', 'speculative')
+
+def _start_spell_image(fields: dict, archetype_id: Optional[str], priority: int) -> Optional[asyncio.Task]:
+    """Start rendering the header image from a streamed image_prompt, if the pipeline allows it"""
+    if SPELL_IMAGE_PIPELINE != 'speculative' or 'image_prompt' not in fields:
+        return None
+    return asyncio.create_task(_generate_spell_image({'image_prompt': fields['image_prompt']}, archetype_id, priority))
+
+async def _finish_spell_image(image_task: Optional[asyncio.Task], spell_data: dict, archetype_id: Optional[str], priority: int) -> Optional[str]:
+    if image_task is not None:
+        return await image_task
+    return await _generate_spell_image(spell_data, archetype_id, priority)
+
+async def _generate_spell_content(intention: str, archetype_id: Optional[str], with_image: bool, priority: int):
+    """Run the LLM (and optional image) generation for a spell request"""
+    _, citations = intention_index.citations(intention)
+    structured_prompt = _build_spell_prompt(intention, citations)
+    system_message = _spell_system_message(archetype_id)
+    
+    field_stream = SpellFieldStream()
+    image_task = None
+    chunks = []
+    usage = {}
+    try:
+        async with admission.slot('spell', priority), providers.track('llm'):
+            async for delta in _stream_llm(system_message, structured_prompt, usage=usage):
+                chunks.append(delta)
+                if with_image and image_task is None:
+                    field_stream.feed(delta)
+                    image_task = _start_spell_image(field_stream.fields, archetype_id, priority)
+        response = ''.join(chunks)
+        token_metrics.record('spell', usage, system_message + structured_prompt, response)
+        spell_data = await _parse_spell_response(response, system_message, structured_prompt, priority)
+        _attach_citations(spell_data, citations)
         
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=session_id,
-            system_message=system_message
-        ).with_model('openai', 'gpt-5.1')
+        # Generate image if requested (or collect the one started mid-stream)
+        image_hash = None
+        if with_image:
+            image_hash = await _finish_spell_image(image_task, spell_data, archetype_id, priority)
+    except BaseException:
+        if image_task is not None:
+            image_task.cancel()
+        raise
+    
+    return spell_data, image_hash
+
+async def _degraded_spell(intention: str, archetype_id: Optional[str], with_image: bool):
+    """A template spell, with a pooled image when one is ready, for when the LLM circuit is open"""
+    category, citations = intention_index.citations(intention)
+    spell_data = template_spell(intention, category)
+    _attach_citations(spell_data, citations)
+    image_hash = await _take_pooled_image(intention, archetype_id) if with_image else None
+    return spell_data, image_hash
+
+async def _cache_spell_result(intention: str, archetype_id: Optional[str], with_image: bool, spell_data: dict, image_hash: Optional[str]):
+    # Only cache complete results, so a failed parse or image is retried next time
+    if not spell_data.get('parse_error') and not spell_data.get('incomplete_fields') and not spell_data.get('degraded') and (image_hash or not with_image):
+        await spell_cache.set(
+            intention, archetype_id, with_image,
+            {'spell': spell_data, 'image_hash': image_hash}
+        )
+
+# Enhanced spell generation endpoint with structured output
+@api_router.post('/ai/generate-spell')
+async def generate_spell(
+    request: SpellRequest,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """Generate a structured spell with historical context and optional imagery"""
+    reservation = None
+    try:
+        # Reserve a generation for authenticated users; refunded below if it fails
+        user = await _get_optional_user(credentials)
+        reservation = await _reserve_spell(user)
         
-        user_message = UserMessage(text=structured_prompt)
-        response = await chat.send_message(user_message)
+        session_id = str(uuid.uuid4())
+        archetype_id, archetype_name, archetype_title = _resolve_archetype(request.archetype)
         
-        # Parse the JSON response
-        import json
-        try:
-            # Clean up response if needed (remove markdown code blocks)
-            clean_response = response.strip()
-            if clean_response.startswith('```'):
-                clean_response = clean_response.split('```')[1]
-                if clean_response.startswith('json'):
-                    clean_response = clean_response[4:]
-            clean_response = clean_response.strip()
-            
-            spell_data = json.loads(clean_response)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return the raw response
-            spell_data = {
-                'title': 'Your Custom Spell',
-                'raw_response': response,
-                'parse_error': True
-            }
+        # Async images are rendered by the job queue, so only the text is generated inline
+        inline_image = request.generate_image and not request.async_image
         
-        # Generate image if requested
-        image_base64 = None
-        if request.generate_image and 'image_prompt' in spell_data:
-            try:
-                style = ARCHETYPE_IMAGE_STYLES.get(archetype_id or 'neutral', ARCHETYPE_IMAGE_STYLES['neutral'])
-                image_prompt = f"{style}, {spell_data['image_prompt']}, mystical ritual scene, no text"
-                
-                image_gen = OpenAIImageGeneration(api_key=EMERGENT_LLM_KEY)
-                images = await image_gen.generate_images(
-                    prompt=image_prompt,
-                    model='gpt-image-1',
-                    number_of_images=1
+        # Serve repeat intentions from the result cache
+        cached = await spell_cache.get(request.intention, archetype_id, inline_image)
+        pooled_hash = None
+        if not cached and inline_image and request.pooled_image:
+            # Latency-sensitive mode: attach a ready themed image and generate only the text
+            pooled_hash = await _take_pooled_image(request.intention, archetype_id)
+            if pooled_hash:
+                inline_image = False
+                cached = await spell_cache.get(request.intention, archetype_id, False)
+        if cached:
+            spell_data = cached['spell']
+            image_hash = cached.get('image_hash')
+        else:
+            async def generate():
+                result = await _generate_spell_content(
+                    request.intention, archetype_id, inline_image, _admission_priority(user)
                 )
-                
-                if images and len(images) > 0:
-                    image_base64 = base64.b64encode(images[0]).decode('utf-8')
-            except Exception as img_error:
-                logging.error(f'Spell image generation error: {str(img_error)}')
-        
-        # Increment spell count for authenticated free users
-        if user and user.get('subscription_tier') == 'free':
-            await increment_spell_count(user['id'])
+                await _cache_spell_result(request.intention, archetype_id, inline_image, *result)
+                return result
+            
+            # Concurrent requests for the same intention share the first one's generation
+            flight_key = ('spell', spell_cache_key(request.intention, archetype_id, inline_image))
+            try:
+                with deadline_scope(ENDPOINT_DEADLINES['spell']):
+                    spell_data, image_hash = await generation_flights.do(flight_key, generate)
+            except CircuitOpen:
+                # Answer at once with a template rather than wait on a failing provider; not charged
+                await _refund_spell(reservation)
+                spell_data, image_hash = await _degraded_spell(request.intention, archetype_id, inline_image)
+        if pooled_hash:
+            image_hash = pooled_hash
         
-        # Get updated limit info for response
-        limit_info = None
-        if user:
-            updated_user = await db.users.find_one({'id': user['id']}, {'_id': 0})
-            limit_check = await check_spell_generation_limit(updated_user)
-            limit_info = {
-                'remaining': limit_check['remaining'],
-                'limit': limit_check['limit'],
-                'subscription_tier': user.get('subscription_tier', 'free')
-            }
+        image_job_id = None
+        if request.generate_image and request.async_image:
+            image_job_id = await _submit_spell_image_job(spell_data, archetype_id)
         
         return {
             'spell': spell_data,
-            'image_base64': image_base64,
+            'image_hash': image_hash,
+            'image_url': _image_url(image_hash),
+            'image_job_id': image_job_id,
             'archetype': {
                 'id': archetype_id,
                 'name': archetype_name,
                 'title': archetype_title
             },
             'session_id': session_id,
-            'limit_info': limit_info
+            'limit_info': _limit_info(reservation)
         }
         
+    except (HTTPException, AdmissionRejected):
+        await _refund_spell(reservation)
+        raise
+    except DeadlineExceeded:
+        await _refund_spell(reservation)
+        raise HTTPException(status_code=504, detail='The oracle took too long to answer, please try again')
     except Exception as e:
+        await _refund_spell(reservation)
         logging.error(f'Spell generation error: {str(e)}')
         raise HTTPException(status_code=500, detail=f'Failed to generate spell: {str(e)}')
 
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@api_router.post('/ai/generate-spell/stream')
+async def generate_spell_stream(
+    request: SpellRequest,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """Stream a structured spell as Server-Sent Events.
+    
+    Emits `start` (archetype and session), one `field` event per top-level spell
+    field as soon as it is complete, then `complete` with the full spell, image
+    and limit_info. Failures after the stream has started arrive as `error`.
+    """
+    # Turn requests away with a 429 while that is still possible; queueing happens inside the stream
+    user = await _get_optional_user(credentials)
+    priority = _admission_priority(user)
+    if admission.saturated('spell', priority):
+        raise AdmissionRejected('spell', admission.retry_after('spell'))
+    
+    # Quota errors must be raised before the 200 stream response begins
+    reservation = await _reserve_spell(user)
+    
+    session_id = str(uuid.uuid4())
+    archetype_id, archetype_name, archetype_title = _resolve_archetype(request.archetype)
+    
+    async def event_stream():
+        deadline = deadline_in(ENDPOINT_DEADLINES['spell'])
+        inline_image = request.generate_image and not request.async_image
+        # The reservation stands once `complete` is sent, or once a template spell has refunded it
+        settled = False
+        try:
+            yield _sse_event('start', {
+                'archetype': {'id': archetype_id, 'name': archetype_name, 'title': archetype_title},
+                'session_id': session_id
+            })
+            cached = await spell_cache.get(request.intention, archetype_id, inline_image)
+            pooled_hash = None
+            if not cached and inline_image and request.pooled_image:
+                pooled_hash = await _take_pooled_image(request.intention, archetype_id)
+                if pooled_hash:
+                    inline_image = False
+                    cached = await spell_cache.get(request.intention, archetype_id, False)
+            if cached:
+                spell_data = cached['spell']
+                image_hash = cached.get('image_hash')
+                for name, value in spell_data.items():
+                    yield _sse_event('field', {'name': name, 'value': value})
+            else:
+                _, citations = intention_index.citations(request.intention)
+                structured_prompt = _build_spell_prompt(request.intention, citations)
+                system_message = _spell_system_message(archetype_id)
+                image_task = None
+                field_stream = SpellFieldStream()
+                chunks = []
+                usage = {}
+                try:
+                    async with admission.slot('spell', priority), providers.track('llm'):
+                        async for delta in _stream_llm(system_message, structured_prompt, usage=usage, deadline=deadline):
+                            chunks.append(delta)
+                            for name, value in field_stream.feed(delta):
+                                yield _sse_event('field', {'name': name, 'value': value})
+                                if inline_image and image_task is None:
+                                    image_task = _start_spell_image(field_stream.fields, archetype_id, priority)
+                                    if image_task is not None:
+                                        yield _sse_event('status', {'stage': 'image'})
+                    token_metrics.record('spell_stream', usage, system_message + structured_prompt, ''.join(chunks))
+                    
+                    # The final parse is authoritative; `complete` carries the whole spell
+                    spell_data = await _parse_spell_response(''.join(chunks), system_message, structured_prompt, priority)
+                    _attach_citations(spell_data, citations)
+                    image_hash = None
+                    if inline_image and (image_task is not None or 'image_prompt' in spell_data):
+                        if image_task is None:
+                            yield _sse_event('status', {'stage': 'image'})
+                        image_hash = await _finish_spell_image(image_task, spell_data, archetype_id, priority)
+                except BaseException:
+                    if image_task is not None:
+                        image_task.cancel()
+                    raise
+                await _cache_spell_result(request.intention, archetype_id, inline_image, spell_data, image_hash)
+            if pooled_hash:
+                image_hash = pooled_hash
+            
+            image_job_id = None
+            if request.generate_image and request.async_image:
+                image_job_id = await _submit_spell_image_job(spell_data, archetype_id)
+            
+            settled = True
+            yield _sse_event('complete', {
+                'spell': spell_data,
+                'image_hash': image_hash,
+                'image_url': _image_url(image_hash),
+                'image_job_id': image_job_id,
+                'limit_info': _limit_info(reservation)
+            })
+        except AdmissionRejected as e:
+            yield _sse_event('error', {'detail': 'The oracle is busy, please try again shortly', 'status': 429, 'retry_after': e.retry_after})
+        except CircuitOpen:
+            # Raised before the first field, so the template can stand in for the whole spell
+            await _refund_spell(reservation)
+            settled = True
+            spell_data, image_hash = await _degraded_spell(request.intention, archetype_id, inline_image)
+            for name, value in spell_data.items():
+                yield _sse_event('field', {'name': name, 'value': value})
+            yield _sse_event('complete', {
+                'spell': spell_data,
+                'image_hash': image_hash,
+                'image_url': _image_url(image_hash),
+                'image_job_id': None,
+                'limit_info': _limit_info(reservation)
+            })
+        except DeadlineExceeded:
+            yield _sse_event('error', {'detail': 'The oracle took too long to answer, please try again', 'status': 504})
+        except Exception as e:
+            logging.error(f'Spell stream error: {str(e)}')
+            yield _sse_event('error', {'detail': f'Failed to generate spell: {str(e)}'})
+        finally:
+            # Errors, and seekers who disconnect mid-stream (GeneratorExit or cancellation), are not charged.
+            # Shielded because a disconnect cancels every await left in this generator.
+            if not settled:
+                await asyncio.shield(_refund_spell(reservation))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # AI Image Generation endpoint
 @api_router.post('/ai/generate-image')
-async def generate_image(request: ImageGenerationRequest):
+async def generate_image(
+    request: ImageGenerationRequest,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    image_prompt = f"1920s-1940s mystical art style, {request.prompt}, art deco influences, rich jewel tones, Bloomsbury aesthetic"
+    
+    if request.async_job:
+        try:
+            job = await image_jobs.submit(image_prompt, kind='image', fresh=request.fresh)
+        except JobQueueFull:
+            raise HTTPException(status_code=503, detail='Image queue is full, please try again shortly')
+        return {'job_id': job['id'], 'status': job['status']}
+    
+    user = await _get_optional_user(credentials)
     try:
-        image_gen = OpenAIImageGeneration(api_key=EMERGENT_LLM_KEY)
-        images = await image_gen.generate_images(
-            prompt=f"1920s-1940s mystical art style, {request.prompt}, art deco influences, rich jewel tones, Bloomsbury aesthetic",
-            model='gpt-image-1',
-            number_of_images=1
-        )
+        async def render():
+            async with admission.slot('image', _admission_priority(user)):
+                return await _render_image(image_prompt)
         
-        if images and len(images) > 0:
-            image_base64 = base64.b64encode(images[0]).decode('utf-8')
-            return {'image_base64': image_base64}
+        image_hash = await _cached_image(image_prompt, request.fresh)
+        if not image_hash:
+            flight_key = ('image', normalize_intention(request.prompt), request.fresh)
+            try:
+                with deadline_scope(ENDPOINT_DEADLINES['image']):
+                    image_hash = await generation_flights.do(flight_key, render)
+            except CircuitOpen:
+                # A fresh variation falls back to the prompt's earlier image; otherwise fail fast with a 503
+                image_hash = await _cached_image(image_prompt) if request.fresh else None
+                if not image_hash:
+                    raise
+                return {'image_hash': image_hash, 'image_url': _image_url(image_hash), 'degraded': True}
+        
+        if image_hash:
+            return {'image_hash': image_hash, 'image_url': _image_url(image_hash)}
         else:
             raise HTTPException(status_code=500, detail='No image was generated')
+    except (AdmissionRejected, CircuitOpen):
+        raise
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail='The image took too long to render, please try again')
     except Exception as e:
         logging.error(f'Image generation error: {str(e)}')
         raise HTTPException(status_code=500, detail='Failed to generate image')
 
+# Image job endpoints
+@api_router.get('/ai/jobs/{job_id}')
+async def get_image_job(job_id: str):
+    """Poll the status of a background image job"""
+    job = await image_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail='Job not found')
+    return job
+
+@api_router.get('/ai/jobs/{job_id}/result')
+async def get_image_job_result(job_id: str, wait: float = 0):
+    """Return a finished job's image, optionally long-polling up to `wait` seconds (max 30)"""
+    if wait > 0:
+        job = await image_jobs.wait(job_id, timeout=min(wait, 30))
+    else:
+        job = await image_jobs.get(job_id, include_result=True)
+    if not job:
+        raise HTTPException(status_code=404, detail='Job not found')
+    
+    if job['status'] == 'failed':
+        raise HTTPException(status_code=500, detail=f"Image job failed: {job.get('error')}")
+    if job['status'] != 'completed':
+        return JSONResponse(status_code=202, content={'id': job['id'], 'status': job['status']})
+    
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'image_hash': job['image_hash'],
+        'image_url': _image_url(job['image_hash'])
+    }
+
+# Stored images, addressed by content hash
+@api_router.get('/images/{image_hash}')
+async def get_image(image_hash: str, request: Request, w: Optional[int] = Query(None, ge=16, le=4096)):
+    """Serve raw image bytes; the hash doubles as a strong, never-changing ETag.
+    
+    With `w`, the smallest WebP/AVIF derivative at least that wide is served
+    instead, in the best format the Accept header allows.
+    """
+    if not is_content_hash(image_hash):
+        raise HTTPException(status_code=404, detail='Image not found')
+    cache_headers = {'Cache-Control': 'public, max-age=31536000, immutable'}
+    if w is not None:
+        cache_headers['Vary'] = 'Accept'
+        try:
+            manifest = await image_derivatives.ensure(image_hash)
+        except Exception as derivative_error:
+            logging.error(f'Image derivative error: {str(derivative_error)}')
+            manifest = None
+        chosen = image_derivatives.choose(manifest, w, request.headers.get('accept', '')) if manifest else None
+        if chosen:
+            image_hash = chosen[0]
+    etag = f'"{image_hash}"'
+    cache_headers['ETag'] = etag
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=cache_headers)
+    
+    blob = await read_blob(blob_store, image_hash)
+    if not blob:
+        raise HTTPException(status_code=404, detail='Image not found')
+    data, content_type = blob
+    return Response(content=data, media_type=content_type, headers=cache_headers)
+
 # Favorites endpoints
 @api_router.post('/favorites')
 async def add_favorite(request: FavoriteRequest, user = Depends(get_current_user)):
@@ -816,12 +1652,12 @@ async def add_favorite(request: FavoriteRequest, user = Depends(get_current_user
         {'id': user['id']},
         {'$addToSet': {'favorites': favorite}}
     )
+    user_cache.invalidate(user['id'])
     return {'success': True}
 
 @api_router.get('/favorites')
 async def get_favorites(user = Depends(get_current_user)):
-    user_data = await db.users.find_one({'id': user['id']}, {'_id': 0})
-    return user_data.get('favorites', [])
+    return user.get('favorites', [])
 
 @api_router.delete('/favorites')
 async def remove_favorite(request: FavoriteRequest, user = Depends(get_current_user)):
@@ -830,6 +1666,7 @@ async def remove_favorite(request: FavoriteRequest, user = Depends(get_current_u
         {'id': user['id']},
         {'$pull': {'favorites': favorite}}
     )
+    user_cache.invalidate(user['id'])
     return {'success': True}
 
 # Grimoire (Saved Spells) endpoints
@@ -849,6 +1686,18 @@ async def save_spell_to_grimoire(request: SaveSpellRequest, user = Depends(get_c
             }
         )
     
+    # Store images once by content hash; the spell document only references them
+    image_hash = request.image_hash
+    if image_hash:
+        if not is_content_hash(image_hash) or not await blob_store.exists(image_hash):
+            raise HTTPException(status_code=400, detail='Unknown image_hash')
+    elif request.image_base64:
+        try:
+            image_hash = await blob_store.put(base64.b64decode(request.image_base64, validate=True))
+        except ValueError:
+            raise HTTPException(status_code=400, detail='Invalid image_base64')
+    image_derivatives.schedule(image_hash)
+    
     spell_id = str(uuid.uuid4())
     
     # Extract title from spell data for easy display
@@ -861,7 +1710,7 @@ async def save_spell_to_grimoire(request: SaveSpellRequest, user = Depends(get_c
         'archetype_id': request.archetype_id,
         'archetype_name': request.archetype_name,
         'archetype_title': request.archetype_title,
-        'image_base64': request.image_base64,
+        'image_hash': image_hash,
         'title': title,
         'created_at': datetime.now(timezone.utc).isoformat()
     }
@@ -873,18 +1722,84 @@ async def save_spell_to_grimoire(request: SaveSpellRequest, user = Depends(get_c
         {'id': user['id']},
         {'$inc': {'total_spells_saved': 1}}
     )
+    user_cache.invalidate(user['id'])
     
-    return SavedSpellResponse(**saved_spell)
+    return SavedSpellResponse(
+        **saved_spell,
+        image_url=_image_url(image_hash),
+        image_placeholder=image_derivatives.placeholder(await image_derivatives.manifest(image_hash)) if image_hash else None
+    )
+
+def _encode_grimoire_cursor(spell: dict) -> str:
+    raw = json.dumps([spell['created_at'], spell['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
 
-@api_router.get('/grimoire/spells', response_model=List[SavedSpellResponse])
-async def get_user_grimoire(user = Depends(get_current_user)):
-    """Retrieve all spells saved by the current user"""
+def _decode_grimoire_cursor(cursor: str):
+    try:
+        created_at, spell_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(created_at), str(spell_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+async def _migrate_legacy_image(spell: dict):
+    """Move the inline image of a spell saved before the image store out of its document"""
+    image_base64 = spell.pop('image_base64', None)
+    if not image_base64 or spell.get('image_hash'):
+        return
+    spell['image_hash'] = await blob_store.put(base64.b64decode(image_base64))
+    await db.user_spells.update_one(
+        {'id': spell['id']},
+        {'$set': {'image_hash': spell['image_hash']}, '$unset': {'image_base64': ''}}
+    )
+    image_derivatives.schedule(spell['image_hash'])
+
+@api_router.get('/grimoire/spells', response_model=GrimoireListResponse)
+async def get_user_grimoire(
+    user = Depends(get_current_user),
+    limit: int = Query(24, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """List the current user's saved spells, newest first, one page at a time.
+    
+    Only summary fields are returned; pass `next_cursor` back as `cursor` for
+    the following page and load full spells from /grimoire/spells/{id}.
+    """
+    query = {'user_id': user['id']}
+    if cursor:
+        # Keyset pagination on (created_at, id) so deep pages stay cheap
+        created_at, spell_id = _decode_grimoire_cursor(cursor)
+        query['$or'] = [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, 'id': {'$lt': spell_id}}
+        ]
+    
     spells = await db.user_spells.find(
-        {'user_id': user['id']}, 
-        {'_id': 0}
-    ).sort('created_at', -1).to_list(100)
+        query,
+        {'_id': 0, 'id': 1, 'title': 1, 'archetype_id': 1, 'archetype_name': 1, 'created_at': 1, 'image_hash': 1, 'image_base64': 1}
+    ).sort([('created_at', -1), ('id', -1)]).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = _encode_grimoire_cursor(spells[limit - 1]) if len(spells) > limit else None
+    spells = spells[:limit]
+    for spell in spells:
+        await _migrate_legacy_image(spell)
+    manifests = await image_derivatives.manifests([spell['image_hash'] for spell in spells if spell.get('image_hash')])
+    for spell in spells:
+        spell['image_url'] = _image_url(spell.get('image_hash'))
+        spell['image_placeholder'] = image_derivatives.placeholder(manifests.get(spell.get('image_hash')))
+    return {'spells': spells, 'next_cursor': next_cursor}
+
+@api_router.get('/grimoire/spells/{spell_id}', response_model=SavedSpellResponse)
+async def get_saved_spell(spell_id: str, user = Depends(get_current_user)):
+    """Load one saved spell in full"""
+    spell = await db.user_spells.find_one({'id': spell_id, 'user_id': user['id']}, {'_id': 0})
+    if not spell:
+        raise HTTPException(status_code=404, detail='Spell not found or unauthorized')
     
-    return spells
+    await _migrate_legacy_image(spell)
+    spell['image_url'] = _image_url(spell.get('image_hash'))
+    if spell.get('image_hash'):
+        spell['image_placeholder'] = image_derivatives.placeholder(await image_derivatives.manifest(spell['image_hash']))
+    return spell
 
 @api_router.delete('/grimoire/spells/{spell_id}')
 async def delete_saved_spell(spell_id: str, user = Depends(get_current_user)):
@@ -910,7 +1825,7 @@ async def get_subscription_status(user = Depends(get_current_user)):
         'subscription_status': user.get('subscription_status', 'active'),
         'spell_limit': limit_check['limit'],
         'spells_remaining': limit_check['remaining'],
-        'spells_used': user.get('spell_generation_count', 0),
+        'spells_used': limit_check.get('current_count', user.get('spell_generation_count', 0)),
         'total_spells_generated': user.get('total_spells_generated', 0),
         'total_spells_saved': user.get('total_spells_saved', 0),
         'can_save_spells': user.get('subscription_tier') == 'paid',
@@ -921,7 +1836,7 @@ async def get_subscription_status(user = Depends(get_current_user)):
 async def manual_upgrade_user(user_email: str, admin_key: str):
     """Admin endpoint to manually upgrade a user (for testing before Stripe)"""
     # Simple admin key check (change this in production!)
-    if admin_key != os.environ.get('ADMIN_KEY', 'change-me-in-production'):
+    if admin_key != ADMIN_KEY:
         raise HTTPException(status_code=403, detail='Unauthorized')
     
     user = await db.users.find_one({'email': user_email}, {'_id': 0})
@@ -941,9 +1856,37 @@ async def manual_upgrade_user(user_email: str, admin_key: str):
             }
         }
     )
+    user_cache.invalidate(user['id'])
     
     return {'success': True, 'message': f'User {user_email} upgraded to paid tier'}
 
+@api_router.get('/metrics')
+async def get_metrics(admin_key: str):
+    """Admin endpoint exposing in-process cache and performance counters"""
+    if admin_key != ADMIN_KEY:
+        raise HTTPException(status_code=403, detail='Unauthorized')
+    
+    return {
+        'spell_cache': await spell_cache.stats(),
+        'image_jobs': image_jobs.stats(),
+        'image_derivatives': image_derivatives.stats(),
+        'image_cache': image_cache.stats(),
+        'image_pool': await image_pool.stats(),
+        'resilience': {'llm': llm_guard.stats(), 'image': image_guard.stats()},
+        'archive_cache': archive_cache.stats(),
+        'representations': representations.stats(),
+        'prompt_context': prompt_context.stats(),
+        'user_cache': user_cache.stats(),
+        'password_hasher': password_hasher.stats(),
+        'providers': providers.stats(),
+        'admission': admission.stats(),
+        'generation_flights': generation_flights.stats(),
+        'spell_quota': spell_quota.stats(),
+        'chat_sessions': chat_sessions.stats(),
+        'tokens': token_metrics.stats(),
+        'spell_parser': spell_parser.stats()
+    }
+
 # Stripe Payment Integration
 class CreateCheckoutRequest(BaseModel):
     origin_url: str
@@ -954,7 +1897,7 @@ async def create_stripe_checkout(request: CreateCheckoutRequest, user = Depends(
     try:
         # Initialize Stripe with webhook URL
         webhook_url = f"{request.origin_url}/api/webhook/stripe"
-        stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+        stripe_checkout = providers.stripe(webhook_url)
         
         # Fixed yearly subscription: $19.00/year
         amount = 19.00
@@ -981,7 +1924,8 @@ async def create_stripe_checkout(request: CreateCheckoutRequest, user = Depends(
             metadata=metadata
         )
         
-        session = await stripe_checkout.create_checkout_session(checkout_request)
+        async with providers.track('stripe'):
+            session = await stripe_checkout.create_checkout_session(checkout_request)
         
         # Create payment transaction record
         transaction = {
@@ -1012,11 +1956,12 @@ async def create_stripe_checkout(request: CreateCheckoutRequest, user = Depends(
 async def get_checkout_status(session_id: str, user = Depends(get_current_user)):
     """Check the status of a Stripe checkout session"""
     try:
-        # Initialize Stripe (webhook URL not needed for status check)
-        stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url="")
+        # Shared Stripe client (webhook URL not needed for status check)
+        stripe_checkout = providers.stripe()
         
         # Get status from Stripe
-        status_response: CheckoutStatusResponse = await stripe_checkout.get_checkout_status(session_id)
+        async with providers.track('stripe'):
+            status_response: CheckoutStatusResponse = await stripe_checkout.get_checkout_status(session_id)
         
         # Find transaction in database
         transaction = await db.payment_transactions.find_one({'session_id': session_id}, {'_id': 0})
@@ -1063,6 +2008,7 @@ async def get_checkout_status(session_id: str, user = Depends(get_current_user))
                     }
                 }
             )
+            user_cache.invalidate(transaction['user_id'])
             
             # Mark transaction as processed
             await db.payment_transactions.update_one(
@@ -1089,11 +2035,12 @@ async def stripe_webhook(request: Request):
         body = await request.body()
         signature = request.headers.get('Stripe-Signature', '')
         
-        # Initialize Stripe
-        stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url="")
+        # Shared Stripe client
+        stripe_checkout = providers.stripe()
         
         # Handle webhook
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
+        async with providers.track('stripe'):
+            webhook_response = await stripe_checkout.handle_webhook(body, signature)
         
         # Process based on event type
         if webhook_response.event_type == 'checkout.session.completed':
@@ -1118,6 +2065,7 @@ async def stripe_webhook(request: Request):
                         }
                     }
                 )
+                user_cache.invalidate(transaction['user_id'])
                 
                 # Mark as processed
                 await db.payment_transactions.update_one(
@@ -1154,6 +2102,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event('startup')
+async def startup_caches():
+    report = await ensure_indexes(db)
+    created = [f'{name}.{index}' for name, entry in report.items() for index in entry['created']]
+    if created:
+        logging.info(f"Created indexes: {', '.join(created)}")
+    await providers.start()
+    if not streams_directly(EMERGENT_LLM_KEY):
+        logging.info('LLM_API_BASE is not set for the Emergent key; replies are sent whole through LlmChat, not streamed')
+    await blob_store.setup()
+    image_derivatives.start()
+    await archive_cache.start()
+    await image_jobs.start()
+    await image_pool.start()
+
 @app.on_event('shutdown')
 async def shutdown_db_client():
+    await image_jobs.stop()
+    await image_pool.stop()
+    await image_derivatives.stop()
+    await archive_cache.stop()
+    password_hasher.shutdown()
+    await providers.close()
     client.close()
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""Coalescing of identical in-flight calls.
+
+When several requests need the same result at the same time (a popular
+intention submitted by many seekers within seconds), only the first one
+calls the provider; the others wait on the same task and get its result
+or its exception. The shared task runs independently of any one request,
+and is cancelled only once every request waiting on it has gone away.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class _Flight:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable]):
+        """Return the result of `call()`, sharing one execution per key among concurrent callers"""
+        flight = self._flights.get(key)
+        if flight is None:
+            self.calls += 1
+            flight = _Flight(asyncio.create_task(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, task))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.task.cancelled():
+                raise
+            # This waiter went away; stop the call only if nobody else is waiting for it
+            if flight.waiters == 1 and not flight.task.done():
+                self.cancelled += 1
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key) is not None and self._flights[key].task is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even when every waiter was cancelled
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': len(self._flights),
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'cancelled': self.cancelled
+        }
@@ -0,0 +1,168 @@
+"""Result cache for /api/ai/generate-spell.
+
+Spells are keyed by the normalized intention, the archetype and whether an
+image was requested, so "Protection for my home!" and "protection for my
+home" share one entry. Two backends are available: an in-process LRU for a
+single worker and a Mongo collection that every worker can share.
+"""
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_intention(intention: str) -> str:
+    """Fold case, punctuation and whitespace so equivalent intentions match"""
+    text = unicodedata.normalize('NFKC', intention or '').casefold()
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def spell_cache_key(intention: str, archetype_id: Optional[str], generate_image: bool) -> str:
+    raw = '|'.join([
+        normalize_intention(intention),
+        archetype_id or 'neutral',
+        'image' if generate_image else 'text',
+    ])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class MemorySpellCacheBackend:
+    """Per-process LRU with a TTL; lost on restart and not shared between workers"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: int = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: dict):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def references(self, image_hash: str) -> bool:
+        now = time.monotonic()
+        return any(
+            expires_at > now and value.get('image_hash') == image_hash
+            for expires_at, value in self._entries.values()
+        )
+
+    async def clear(self):
+        self._entries.clear()
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+
+class MongoSpellCacheBackend:
+    """Cache stored in a Mongo collection so all workers share hits.
+
+    Expiry is handled by a TTL index on `expires_at`; the size bound is
+    enforced after each write by dropping the least recently used entries.
+    """
+
+    name = 'mongo'
+
+    def __init__(self, collection, max_entries: int = 5000, ttl_seconds: int = 86400):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        # The TTL monitor only runs once a minute, so check expiry here too
+        entry = await self.collection.find_one_and_update(
+            {'key': key, 'expires_at': {'$gt': now}},
+            {'$set': {'last_access': now}},
+            projection={'_id': 0, 'value': 1}
+        )
+        return entry['value'] if entry else None
+
+    async def set(self, key: str, value: dict):
+        now = datetime.now(timezone.utc)
+        await self.collection.update_one(
+            {'key': key},
+            {'$set': {
+                'value': value,
+                'last_access': now,
+                'expires_at': now + timedelta(seconds=self.ttl_seconds)
+            }},
+            upsert=True
+        )
+        overflow = await self.collection.count_documents({}) - self.max_entries
+        if overflow > 0:
+            stale = await self.collection.find({}, {'_id': 1}).sort('last_access', 1).to_list(overflow)
+            await self.collection.delete_many({'_id': {'$in': [doc['_id'] for doc in stale]}})
+
+    async def references(self, image_hash: str) -> bool:
+        return await self.collection.find_one({'value.image_hash': image_hash}, {'_id': 1}) is not None
+
+    async def clear(self):
+        await self.collection.delete_many({})
+
+    async def size(self) -> int:
+        return await self.collection.count_documents({})
+
+
+class SpellCache:
+    """Front for a cache backend that tracks hit and miss counts"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, intention: str, archetype_id: Optional[str], generate_image: bool) -> Optional[dict]:
+        value = await self.backend.get(spell_cache_key(intention, archetype_id, generate_image))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, intention: str, archetype_id: Optional[str], generate_image: bool, value: dict):
+        await self.backend.set(spell_cache_key(intention, archetype_id, generate_image), value)
+
+    async def references(self, image_hash: str) -> bool:
+        """Whether a cached spell still serves this image"""
+        return await self.backend.references(image_hash)
+
+    async def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'entries': await self.backend.size(),
+            'max_entries': self.backend.max_entries,
+            'ttl_seconds': self.backend.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def create_spell_cache(db, backend: str = 'memory', max_entries: int = 512, ttl_seconds: int = 86400) -> SpellCache:
+    if backend == 'mongo':
+        return SpellCache(MongoSpellCacheBackend(db.spell_cache, max_entries, ttl_seconds))
+    if backend == 'memory':
+        return SpellCache(MemorySpellCacheBackend(max_entries, ttl_seconds))
+    raise ValueError(f'Unknown spell cache backend: {backend}')
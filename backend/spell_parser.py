@@ -0,0 +1,256 @@
+"""Incremental, schema-aware parsing of the spell JSON produced by the LLM.
+
+`SpellFieldStream` is fed completion text as it arrives and reports each
+top-level field of the spell object (title, introduction, materials, ...)
+as soon as its value is syntactically complete and fits the spell schema,
+so streaming endpoints can forward fields long before the whole object has
+been generated.
+
+`SpellParser` turns a finished completion into a spell. Output that is not
+valid JSON is repaired locally (markdown fences and stray prose around the
+object, trailing commas, truncation) and whatever still fails the schema
+is reported as missing, so the caller can ask the model for just those
+sections instead of discarding the whole generation.
+"""
+import json
+import re
+from typing import List, Optional, Tuple
+
+_TRAILING_COMMA_RE = re.compile(r',\s*([\]}])')
+
+# Top-level spell fields and their JSON types, in the order the prompt asks for them
+SPELL_SCHEMA = {
+    'title': str,
+    'subtitle': str,
+    'image_prompt': str,
+    'introduction': str,
+    'materials': list,
+    'timing': dict,
+    'steps': list,
+    'spoken_words': dict,
+    'historical_context': dict,
+    'variations': list,
+    'warnings': list,
+    'closing_message': str,
+}
+
+OPTIONAL_FIELDS = frozenset({'variations', 'warnings'})
+
+REQUIRED_FIELDS = tuple(key for key in SPELL_SCHEMA if key not in OPTIONAL_FIELDS)
+
+# List fields whose items must be objects carrying this key
+LIST_ITEM_KEYS = {
+    'materials': 'name',
+    'steps': 'instruction',
+    'variations': 'name',
+}
+
+# Truncation repair retries at most this many earlier cut points
+MAX_REPAIR_CUTS = 64
+
+
+def _load_value(text: str):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # The schema example in the prompt has a trailing comma that models copy
+        return json.loads(_TRAILING_COMMA_RE.sub(r'\1', text))
+
+
+def clean_field(key: str, value):
+    """Return the value if it fits the spell schema (dropping malformed list items), else None"""
+    expected = SPELL_SCHEMA.get(key)
+    if expected is None:
+        return value
+    if not isinstance(value, expected):
+        return None
+    if key in LIST_ITEM_KEYS:
+        item_key = LIST_ITEM_KEYS[key]
+        value = [item for item in value if isinstance(item, dict) and item.get(item_key)]
+    elif key == 'warnings':
+        value = [item for item in value if isinstance(item, str) and item]
+    return value or None
+
+
+def _scan(text: str):
+    """Return (end of the top-level object or None, open closers, in_string, comma cut points)"""
+    closers = []
+    cuts = []
+    in_string = False
+    escape = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if closers:
+                closers.pop()
+            if not closers:
+                return i + 1, closers, False, cuts
+        elif char == ',':
+            cuts.append((i, ''.join(reversed(closers))))
+    return None, closers, in_string, cuts
+
+
+def repair_json(text: str) -> Optional[dict]:
+    """Parse a spell object out of model output, repairing common defects; None if hopeless"""
+    start = text.find('{')
+    if start < 0:
+        return None
+    text = text[start:]
+    end, closers, in_string, cuts = _scan(text)
+
+    if end is not None:
+        # Complete object; anything after it (closing fence, sign-off prose) is ignored
+        candidates = [text[:end]]
+    else:
+        # Truncated: close what is open, then retry from earlier commas to drop a half-written member
+        tail = text.rstrip()
+        if in_string:
+            tail = tail.rstrip('\\') + '"'
+        candidates = [tail + ''.join(reversed(closers))]
+        candidates += [text[:position] + closing for position, closing in reversed(cuts[-MAX_REPAIR_CUTS:])]
+
+    for candidate in candidates:
+        try:
+            value = _load_value(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+class SpellParser:
+    """Parses finished spell completions and counts how each one was recovered"""
+
+    def __init__(self):
+        self.strict = 0
+        self.repaired = 0
+        self.partial = 0
+        self.failed = 0
+
+    def parse(self, text: str) -> Tuple[dict, List[str]]:
+        """Return (schema-valid fields, missing required field names)"""
+        try:
+            data = json.loads(text.strip())
+            self.strict += isinstance(data, dict)
+        except json.JSONDecodeError:
+            data = None
+        if not isinstance(data, dict):
+            data = repair_json(text)
+            if data is not None:
+                self.repaired += 1
+        if data is None:
+            # Keep every field that completed before the output went wrong
+            stream = SpellFieldStream()
+            stream.feed(text)
+            data = stream.fields
+            if data:
+                self.partial += 1
+            else:
+                self.failed += 1
+
+        spell = {}
+        for key, value in data.items():
+            value = clean_field(key, value)
+            if value is not None:
+                spell[key] = value
+        missing = [key for key in REQUIRED_FIELDS if key not in spell]
+        return spell, missing
+
+    def stats(self) -> dict:
+        return {
+            'strict': self.strict,
+            'repaired': self.repaired,
+            'partial': self.partial,
+            'failed': self.failed
+        }
+
+
+class SpellFieldStream:
+    """Scans a streamed JSON object and emits completed top-level fields"""
+
+    def __init__(self):
+        self.buffer = ''
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_key = False
+        self._key_start = 0
+        self._key: Optional[str] = None
+        self._phase = 'key'
+        self._value_start = 0
+
+    def feed(self, text: str) -> List[Tuple[str, object]]:
+        """Consume more completion text and return newly completed (key, value) pairs"""
+        self.buffer += text
+        completed = []
+        buffer = self.buffer
+        i = self._pos
+        while i < len(buffer) and not self.done:
+            char = buffer[i]
+            if self._depth == 0:
+                # Skip everything before the opening brace: prose (which may hold quotes or
+                # brackets of its own) and markdown fences
+                if char == '{':
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._in_key:
+                        self._in_key = False
+                        self._key = json.loads(buffer[self._key_start:i + 1])
+                        self._phase = 'colon'
+            elif char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._phase == 'key':
+                    self._in_key = True
+                    self._key_start = i
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 1 and self._phase == 'value':
+                    self._complete_field(buffer[self._value_start:i], completed)
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+            elif self._depth == 1:
+                if char == ':' and self._phase == 'colon':
+                    self._phase = 'value'
+                    self._value_start = i + 1
+                elif char == ',' and self._phase == 'value':
+                    self._complete_field(buffer[self._value_start:i], completed)
+                    self._phase = 'key'
+            i += 1
+        self._pos = i
+        return completed
+
+    def _complete_field(self, raw_value: str, completed: list):
+        raw_value = raw_value.strip()
+        if self._key is None or not raw_value:
+            return
+        try:
+            value = clean_field(self._key, _load_value(raw_value))
+        except json.JSONDecodeError:
+            return
+        if value is None:
+            return
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+        self._key = None
@@ -0,0 +1,142 @@
+"""Template spells for when the model is unavailable.
+
+When the LLM circuit breaker is open, spell requests that miss the result
+cache get one of these instead of waiting on a provider that is known to
+be failing. Each intention category has a short, traditional working in
+the same shape as a generated spell; citations are attached by the caller
+as usual, and `degraded` marks the spell so it is never cached.
+"""
+
+_CATEGORY_WORKINGS = {
+    'protection': {
+        'title': 'A Warding at the Threshold',
+        'focus': 'protection',
+        'materials': [
+            ('Salt', 'salt', 'Laid across the threshold as a boundary'),
+            ('White candle', 'candle', 'Lit to mark the space as held'),
+            ('Iron nail or key', 'cord', 'Kept by the door afterwards as a ward'),
+            ('Rosemary', 'herb', 'An old cleansing and guarding herb'),
+        ],
+        'incantation': 'By salt and flame and iron bound, no harm shall cross this ground.',
+        'tradition': 'British folk magic and household warding',
+        'moon_phase': 'Waning',
+    },
+    'courage': {
+        'title': 'A Working for a Steady Heart',
+        'focus': 'courage',
+        'materials': [
+            ('Red or gold candle', 'candle', 'For the fire you are calling up'),
+            ('Bay leaf', 'herb', 'Write the fear on it, then let it burn'),
+            ('A small stone', 'crystal', 'Carried afterwards as a reminder'),
+        ],
+        'incantation': 'What I fear has no hold on me; I stand, I speak, I walk through free.',
+        'tradition': 'Ceremonial magic of the early twentieth century',
+        'moon_phase': 'Waxing',
+    },
+    'love': {
+        'title': 'A Working to Open the Heart',
+        'focus': 'love',
+        'materials': [
+            ('Pink or red candle', 'candle', 'For warmth and welcome'),
+            ('Rose petals', 'herb', 'Scattered in a circle around the candle'),
+            ('Rose quartz', 'crystal', 'Held while you speak the words'),
+            ('Red cord', 'cord', 'Knotted three times to seal the working'),
+        ],
+        'incantation': 'As the rose opens to the sun, let love that is true and free come in.',
+        'tradition': 'European folk love charms',
+        'moon_phase': 'Waxing',
+    },
+    'healing': {
+        'title': 'A Working for Rest and Mending',
+        'focus': 'healing',
+        'materials': [
+            ('Blue or green candle', 'candle', 'For calm and renewal'),
+            ('Bowl of clean water', 'water', 'To receive what you release'),
+            ('Lavender or chamomile', 'herb', 'For ease and rest'),
+        ],
+        'incantation': 'Water take what weighs on me; let what is hurt now mend and be.',
+        'tradition': 'Folk healing and spiritualist practice',
+        'moon_phase': 'Waning',
+    },
+    'divination': {
+        'title': 'A Working for Clear Sight',
+        'focus': 'clarity and guidance',
+        'materials': [
+            ('White candle', 'candle', 'To light the question'),
+            ('Mirror or bowl of dark water', 'mirror', 'A surface to gaze into'),
+            ('Mugwort', 'herb', 'Traditionally burned or kept near for visions'),
+            ('Paper and pen', 'pen', 'To write down what comes'),
+        ],
+        'incantation': 'Show me what is hidden, true and plain; let what I need to see be made clear.',
+        'tradition': 'Scrying and the tarot revival of the Golden Dawn era',
+        'moon_phase': 'Full Moon',
+    },
+    'ancestors': {
+        'title': 'A Working to Honour Those Before',
+        'focus': 'remembrance of the ancestors',
+        'materials': [
+            ('White candle', 'candle', 'A light for those who came before'),
+            ('Photograph or keepsake', 'photo', 'Something of theirs, or of their place'),
+            ('Bowl of water', 'water', 'An offering of refreshment'),
+            ('Bread or salt', 'salt', 'A simple offering of food'),
+        ],
+        'incantation': 'Those who came before me, I remember you; walk with me, and I will carry your name.',
+        'tradition': 'Ancestor veneration in folk and spiritualist practice',
+        'moon_phase': 'New Moon',
+    },
+    'general': {
+        'title': 'A Simple Working of Intention',
+        'focus': 'your intention',
+        'materials': [
+            ('White candle', 'candle', 'Stands in for any colour'),
+            ('Paper and pen', 'pen', 'To write your intention plainly'),
+            ('Bowl of water or salt', 'bowl', 'To ground the working when done'),
+        ],
+        'incantation': 'As I will it and speak it, so let it begin.',
+        'tradition': 'Practical folk magic',
+        'moon_phase': 'Any',
+    },
+}
+
+
+def template_spell(intention: str, category: str) -> dict:
+    """A complete spell for the intention's category, built without the model"""
+    working = _CATEGORY_WORKINGS.get(category, _CATEGORY_WORKINGS['general'])
+    focus = working['focus']
+    return {
+        'title': working['title'],
+        'subtitle': f'A traditional working for {focus}',
+        'image_prompt': f'a candlelit altar prepared for a working of {focus}',
+        'introduction': (
+            f'The oracle is resting just now, so here is a traditional working for {focus} '
+            f'to hold your intention: "{intention}". Ask again later for one written for you alone.'
+        ),
+        'materials': [{'name': name, 'icon': icon, 'note': note} for name, icon, note in working['materials']],
+        'timing': {
+            'moon_phase': working['moon_phase'],
+            'time_of_day': 'Night',
+            'day': 'Any',
+            'note': 'Choose a quiet time when you will not be disturbed'
+        },
+        'steps': [
+            {'number': 1, 'title': 'Prepare the space', 'instruction': 'Clear a small surface and set out your materials. Breathe slowly until you feel settled.', 'duration': '5 minutes'},
+            {'number': 2, 'title': 'Light the candle', 'instruction': f'Light the candle and name your intention aloud: {intention}', 'duration': '2 minutes'},
+            {'number': 3, 'title': 'Speak the words', 'instruction': 'Speak the incantation three times, slowly, holding the intention in mind.', 'duration': '5 minutes'},
+            {'number': 4, 'title': 'Sit with it', 'instruction': 'Sit quietly with the flame and notice what comes to you. Write it down if you wish.', 'duration': '10 minutes'},
+            {'number': 5, 'title': 'Close the working', 'instruction': 'Speak the closing words, extinguish the candle and put the materials away with care.', 'duration': '3 minutes'},
+        ],
+        'spoken_words': {
+            'invocation': 'I come to this work with an open heart and a clear purpose.',
+            'main_incantation': working['incantation'],
+            'closing': 'The work is done; so let it be.'
+        },
+        'historical_context': {
+            'tradition': working['tradition'],
+            'time_period': '1910-1945',
+            'practitioners': [],
+            'cultural_notes': 'A simple working of the kind kept in household books of charms and prayers.'
+        },
+        'warnings': ['Never leave a lit candle unattended'],
+        'closing_message': 'Every spell is a formula others have used. Adapt this one as you need.',
+        'degraded': True
+    }
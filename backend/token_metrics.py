@@ -0,0 +1,72 @@
+"""Per-endpoint LLM token and latency accounting.
+
+Each model call records its prompt, completion and prefix-cached prompt
+tokens along with its time to first token. Splitting time to first token
+by whether the provider served part of the prompt from its prefix cache
+shows what the static prompt prefixes are worth. When the provider reports
+no usage (the non-streaming fallback), counts are estimated from the text.
+"""
+from typing import Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+class _EndpointTokens:
+    __slots__ = ('requests', 'estimated', 'prompt_tokens', 'completion_tokens', 'cached_tokens',
+                 'cache_hits', 'ttft_hit_seconds', 'ttft_miss_seconds')
+
+    def __init__(self):
+        self.requests = 0
+        self.estimated = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cache_hits = 0
+        self.ttft_hit_seconds = 0.0
+        self.ttft_miss_seconds = 0.0
+
+
+class TokenMetrics:
+    def __init__(self):
+        self._endpoints = {}
+
+    def record(self, endpoint: str, usage: dict, prompt_text: str = '', completion_text: Optional[str] = None):
+        entry = self._endpoints.setdefault(endpoint, _EndpointTokens())
+        entry.requests += 1
+        if 'prompt_tokens' in usage:
+            prompt_tokens = usage['prompt_tokens']
+            completion_tokens = usage['completion_tokens']
+        else:
+            entry.estimated += 1
+            prompt_tokens = estimate_tokens(prompt_text)
+            completion_tokens = estimate_tokens(completion_text or '')
+        cached_tokens = usage.get('cached_tokens', 0)
+        entry.prompt_tokens += prompt_tokens
+        entry.completion_tokens += completion_tokens
+        entry.cached_tokens += cached_tokens
+        if cached_tokens:
+            entry.cache_hits += 1
+            entry.ttft_hit_seconds += usage.get('ttft_seconds', 0.0)
+        else:
+            entry.ttft_miss_seconds += usage.get('ttft_seconds', 0.0)
+
+    def stats(self) -> dict:
+        stats = {}
+        for endpoint, entry in self._endpoints.items():
+            misses = entry.requests - entry.cache_hits
+            stats[endpoint] = {
+                'requests': entry.requests,
+                'estimated': entry.estimated,
+                'prompt_tokens': entry.prompt_tokens,
+                'completion_tokens': entry.completion_tokens,
+                'cached_tokens': entry.cached_tokens,
+                'cached_ratio': round(entry.cached_tokens / (entry.prompt_tokens or 1), 3),
+                'avg_prompt_tokens': round(entry.prompt_tokens / entry.requests, 1),
+                'avg_completion_tokens': round(entry.completion_tokens / entry.requests, 1),
+                'avg_ttft_ms_cache_hit': round(entry.ttft_hit_seconds / entry.cache_hits * 1000, 1) if entry.cache_hits else None,
+                'avg_ttft_ms_cache_miss': round(entry.ttft_miss_seconds / misses * 1000, 1) if misses else None
+            }
+        return stats
@@ -0,0 +1,65 @@
+"""Short-lived per-process cache of authenticated user documents.
+
+Every authenticated request resolves its JWT to a user document. Caching
+those documents for a few seconds removes that Mongo round trip from the
+hot path; every code path that writes to a user calls `invalidate`, and
+the TTL bounds how long another worker's write can go unseen here.
+"""
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+
+class UserCache:
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 30):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        # Callers get their own copy so a handler can't alter the cached document
+        return dict(user)
+
+    def set(self, user_id: str, user: dict):
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Drop a user after any write to their document"""
+        self.invalidations += 1
+        self._entries.pop(user_id, None)
+
+    async def get_or_load(self, user_id: str, load: Callable[[str], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        user = self.get(user_id)
+        if user is not None:
+            self.hits += 1
+            return user
+        self.misses += 1
+        invalidations = self.invalidations
+        user = await load(user_id)
+        # A write that landed while we were reading may not be in this copy; don't cache it
+        if user is not None and invalidations == self.invalidations:
+            self.set(user_id, user)
+        return dict(user) if user is not None else None
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations
+        }
@@ -464,8 +464,8 @@ class SpiritualAppAPITester:
             data=image_data
         )
         
-        if success and isinstance(response, dict) and 'image_base64' in response:
-            print(f"   Image generated successfully (base64 length: {len(response['image_base64'])})")
+        if success and isinstance(response, dict) and response.get('image_url'):
+            print(f"   Image generated successfully ({response['image_url']})")
             return True
         return False
 
@@ -659,9 +659,9 @@ class SpiritualAppAPITester:
         
         if success and isinstance(response, dict):
             # Check if image was generated
-            image_base64 = response.get('image_base64')
-            if image_base64:
-                print(f"   ✅ Image generated (base64 length: {len(image_base64)})")
+            image_url = response.get('image_url')
+            if image_url:
+                print(f"   ✅ Image generated ({image_url})")
             else:
                 print(f"   ⚠️  Image generation was requested but no image returned")
             
@@ -755,7 +755,7 @@ class SpiritualAppAPITester:
             "archetype_id": "shiggy",
             "archetype_name": "Sheila \"Shiggy\" Tayler",
             "archetype_title": "The Psychic Matriarch",
-            "image_base64": None
+            "image_hash": None
         }
         
         success, response = self.run_test(
@@ -798,13 +798,14 @@ class SpiritualAppAPITester:
             200
         )
         
-        if success and isinstance(response, list):
-            print(f"   ✅ Found {len(response)} spells in grimoire")
+        if success and isinstance(response, dict) and isinstance(response.get('spells'), list):
+            spells = response['spells']
+            print(f"   ✅ Found {len(spells)} spells on the first grimoire page")
             
-            # Verify spell structure if any spells exist
-            if len(response) > 0:
-                spell = response[0]
-                required_fields = ['id', 'user_id', 'spell_data', 'title', 'created_at']
+            # Verify summary structure if any spells exist
+            if len(spells) > 0:
+                spell = spells[0]
+                required_fields = ['id', 'title', 'created_at']
                 missing_fields = [field for field in required_fields if field not in spell]
                 
                 if missing_fields:
@@ -814,6 +815,17 @@ class SpiritualAppAPITester:
                 print(f"   ✅ First spell title: {spell.get('title')}")
                 if spell.get('archetype_name'):
                     print(f"   ✅ First spell archetype: {spell.get('archetype_name')}")
+                
+                # The full spell is loaded from the detail endpoint
+                detail_success, detail = self.run_test(
+                    "Get Grimoire Spell Detail",
+                    "GET",
+                    f"grimoire/spells/{spell['id']}",
+                    200
+                )
+                if not detail_success or 'spell_data' not in detail:
+                    print(f"   ❌ Spell detail missing spell_data")
+                    return False
             
             return True
         
@@ -8,7 +8,7 @@ import {
 } from 'lucide-react';
 import { toast } from 'sonner';
 import html2pdf from 'html2pdf.js';
-import { grimoireAPI, subscriptionAPI } from '../utils/api';
+import { grimoireAPI, subscriptionAPI, resolveImageUrl } from '../utils/api';
 import { useNavigate } from 'react-router-dom';
 
 // Icon mapping for materials
@@ -67,7 +67,9 @@ const ARCHETYPE_STYLES = {
   },
 };
 
-export const GrimoirePage = ({ spell, archetype, imageBase64, onNewSpell }) => {
+export const GrimoirePage = ({ spell, archetype, imageUrl, imageHash, onNewSpell }) => {
+  const headerImage = imageUrl ? resolveImageUrl(imageUrl) : null;
+
   const [showHistoricalContext, setShowHistoricalContext] = useState(false);
   const [checklistMode, setChecklistMode] = useState(false);
   const [completedSteps, setCompletedSteps] = useState(new Set());
@@ -197,7 +199,7 @@ export const GrimoirePage = ({ spell, archetype, imageBase64, onNewSpell }) => {
         archetype?.id,
         archetype?.name,
         archetype?.title,
-        imageBase64
+        imageHash
       );
       toast.success('Spell saved to your grimoire!');
     } catch (error) {
@@ -236,10 +238,10 @@ export const GrimoirePage = ({ spell, archetype, imageBase64, onNewSpell }) => {
       style={{ backgroundColor: '#D8CBB3' }}
     >
       {/* Header Image */}
-      {imageBase64 && (
+      {headerImage && (
         <div className="relative h-48 md:h-64 overflow-hidden">
           <img 
-            src={`data:image/png;base64,${imageBase64}`}
+            src={headerImage}
             alt={spell.title}
             className="w-full h-full object-cover"
           />
@@ -256,7 +258,7 @@ export const GrimoirePage = ({ spell, archetype, imageBase64, onNewSpell }) => {
       )}
 
       {/* No image header */}
-      {!imageBase64 && (
+      {!headerImage && (
         <div className={`p-6 ${style.bgAccent} border-b border-border`}>
           <h1 className="font-italiana text-3xl md:text-4xl text-primary">{spell.title}</h1>
           {spell.subtitle && (
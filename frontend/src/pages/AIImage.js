@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import { motion } from 'framer-motion';
 import { GlassCard } from '../components/GlassCard';
-import { aiAPI } from '../utils/api';
+import { aiAPI, resolveImageUrl } from '../utils/api';
 import { Image as ImageIcon, Wand2 } from 'lucide-react';
 import { toast } from 'sonner';
 
@@ -10,7 +10,7 @@ export const AIImage = () => {
   const [generatedImage, setGeneratedImage] = useState(null);
   const [loading, setLoading] = useState(false);
 
-  const handleGenerate = async () => {
+  const handleGenerate = async (fresh = false) => {
     if (!prompt.trim()) {
       toast.error('Please enter a prompt');
       return;
@@ -18,8 +18,8 @@ export const AIImage = () => {
 
     setLoading(true);
     try {
-      const response = await aiAPI.generateImage(prompt);
-      setGeneratedImage(response.image_base64);
+      const response = await aiAPI.generateImage(prompt, fresh);
+      setGeneratedImage(resolveImageUrl(response.image_url));
       toast.success('Image generated successfully!');
     } catch (error) {
       toast.error('Failed to generate image');
@@ -29,6 +29,24 @@ export const AIImage = () => {
     }
   };
 
+  const handleDownload = async () => {
+    // The image is served from the API origin, where a plain link's download attribute is ignored
+    try {
+      const response = await fetch(generatedImage);
+      if (!response.ok) throw new Error(`HTTP ${response.status}`);
+      const blob = await response.blob();
+      const objectUrl = URL.createObjectURL(blob);
+      const link = document.createElement('a');
+      link.href = objectUrl;
+      link.download = 'mystic-image.png';
+      link.click();
+      setTimeout(() => URL.revokeObjectURL(objectUrl), 0);
+    } catch (error) {
+      toast.error('Failed to download image');
+      console.error('Image download error:', error);
+    }
+  };
+
   const examplePrompts = [
     'Hecate at a moonlit crossroads',
     'The Morrigan in crow form',
@@ -70,7 +88,7 @@ export const AIImage = () => {
             </div>
 
             <button
-              onClick={handleGenerate}
+              onClick={() => handleGenerate()}
               data-testid="generate-image-button"
               disabled={loading || !prompt.trim()}
               className="w-full px-6 py-3 bg-primary text-primary-foreground rounded-sm font-montserrat tracking-widest uppercase text-sm hover:bg-primary/90 transition-all duration-300 disabled:opacity-50 flex items-center justify-center gap-2"
@@ -110,23 +128,26 @@ export const AIImage = () => {
             {generatedImage ? (
               <div className="space-y-4">
                 <img
-                  src={`data:image/png;base64,${generatedImage}`}
+                  src={generatedImage}
                   alt="Generated artwork"
                   data-testid="generated-image"
                   className="w-full rounded-sm border border-primary/30"
                 />
                 <button
-                  onClick={() => {
-                    const link = document.createElement('a');
-                    link.href = `data:image/png;base64,${generatedImage}`;
-                    link.download = 'mystic-image.png';
-                    link.click();
-                  }}
+                  onClick={handleDownload}
                   data-testid="download-image-button"
                   className="w-full px-6 py-2 bg-transparent text-primary border border-primary/30 rounded-sm font-montserrat tracking-widest uppercase text-sm hover:bg-primary/10 transition-all duration-300"
                 >
                   Download Image
                 </button>
+                <button
+                  onClick={() => handleGenerate(true)}
+                  disabled={loading || !prompt.trim()}
+                  data-testid="new-variation-button"
+                  className="w-full px-6 py-2 bg-transparent text-secondary border border-secondary/30 rounded-sm font-montserrat tracking-widest uppercase text-sm hover:bg-secondary/10 transition-all duration-300 disabled:opacity-50"
+                >
+                  New Variation
+                </button>
               </div>
             ) : (
               <div className="flex flex-col items-center justify-center h-[400px] text-center">
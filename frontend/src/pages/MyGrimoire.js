@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { motion } from 'framer-motion';
 import { BookOpen, Trash2, Eye, Loader2, Calendar, Sparkles } from 'lucide-react';
-import { grimoireAPI } from '../utils/api';
+import { grimoireAPI, resolveImageUrl } from '../utils/api';
 import { GrimoirePage } from '../components/GrimoirePage';
 import { toast } from 'sonner';
 
@@ -10,6 +10,9 @@ export const MyGrimoire = () => {
   const [loading, setLoading] = useState(true);
   const [selectedSpell, setSelectedSpell] = useState(null);
   const [deleting, setDeleting] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [opening, setOpening] = useState(null);
 
   useEffect(() => {
     loadSpells();
@@ -17,8 +20,9 @@ export const MyGrimoire = () => {
 
   const loadSpells = async () => {
     try {
-      const data = await grimoireAPI.getAllSpells();
-      setSpells(data);
+      const data = await grimoireAPI.getSpells();
+      setSpells(data.spells);
+      setNextCursor(data.next_cursor);
     } catch (error) {
       console.error('Failed to load grimoire:', error);
       if (error.response?.status === 401) {
@@ -31,6 +35,20 @@ export const MyGrimoire = () => {
     }
   };
 
+  const loadMoreSpells = async () => {
+    setLoadingMore(true);
+    try {
+      const data = await grimoireAPI.getSpells(nextCursor);
+      setSpells((current) => [...current, ...data.spells]);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error('Failed to load more spells:', error);
+      toast.error('Failed to load more spells');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleDeleteSpell = async (spellId) => {
     if (!window.confirm('Are you sure you want to remove this spell from your grimoire?')) {
       return;
@@ -52,8 +70,18 @@ export const MyGrimoire = () => {
     }
   };
 
-  const handleViewSpell = (spell) => {
-    setSelectedSpell(spell);
+  const handleViewSpell = async (spell) => {
+    // The list only carries summaries; load the full spell on demand
+    setOpening(spell.id);
+    try {
+      const fullSpell = await grimoireAPI.getSpell(spell.id);
+      setSelectedSpell(fullSpell);
+    } catch (error) {
+      console.error('Failed to open spell:', error);
+      toast.error('Failed to open spell');
+    } finally {
+      setOpening(null);
+    }
   };
 
   const handleBackToList = () => {
@@ -78,7 +106,8 @@ export const MyGrimoire = () => {
               name: selectedSpell.archetype_name,
               title: selectedSpell.archetype_title
             }}
-            imageBase64={selectedSpell.image_base64}
+            imageUrl={selectedSpell.image_url}
+            imageHash={selectedSpell.image_hash}
             onNewSpell={handleBackToList}
           />
         </div>
@@ -136,10 +165,16 @@ export const MyGrimoire = () => {
                 className="bg-card/80 border-2 border-border rounded-sm overflow-hidden hover:border-primary/30 transition-all group"
               >
                 {/* Spell Image */}
-                {spell.image_base64 ? (
-                  <div className="relative h-48 overflow-hidden">
+                {spell.image_url ? (
+                  <div
+                    className="relative h-48 overflow-hidden bg-cover bg-center"
+                    style={spell.image_placeholder ? { backgroundImage: `url(${spell.image_placeholder})` } : undefined}
+                  >
                     <img
-                      src={`data:image/png;base64,${spell.image_base64}`}
+                      src={resolveImageUrl(spell.image_url, 640)}
+                      srcSet={`${resolveImageUrl(spell.image_url, 320)} 320w, ${resolveImageUrl(spell.image_url, 640)} 640w, ${resolveImageUrl(spell.image_url, 1024)} 1024w`}
+                      sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
+                      loading="lazy"
                       alt={spell.title}
                       className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300"
                     />
@@ -178,9 +213,14 @@ export const MyGrimoire = () => {
                   <div className="flex gap-2">
                     <button
                       onClick={() => handleViewSpell(spell)}
-                      className="flex-1 px-3 py-2 bg-primary text-primary-foreground rounded-sm font-montserrat text-xs tracking-wider uppercase hover:bg-primary/90 transition-all flex items-center justify-center gap-1"
+                      disabled={opening === spell.id}
+                      className="flex-1 px-3 py-2 bg-primary text-primary-foreground rounded-sm font-montserrat text-xs tracking-wider uppercase hover:bg-primary/90 transition-all flex items-center justify-center gap-1 disabled:opacity-50"
                     >
-                      <Eye className="w-3 h-3" />
+                      {opening === spell.id ? (
+                        <Loader2 className="w-3 h-3 animate-spin" />
+                      ) : (
+                        <Eye className="w-3 h-3" />
+                      )}
                       View
                     </button>
                     <button
@@ -200,6 +240,18 @@ export const MyGrimoire = () => {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="text-center mt-10">
+            <button
+              onClick={loadMoreSpells}
+              disabled={loadingMore}
+              className="px-6 py-3 bg-transparent text-primary border border-primary/30 rounded-sm font-montserrat tracking-widest uppercase text-xs hover:bg-primary/10 transition-all disabled:opacity-50"
+            >
+              {loadingMore ? 'Loading...' : 'Load More Spells'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -93,6 +93,9 @@ export const SpellRequest = ({ selectedArchetype: propArchetype }) => {
       // Check if it's a limit error
       if (error.response?.status === 403 && error.response?.data?.detail?.error === 'spell_limit_reached') {
         toast.error(error.response.data.detail.message, { duration: 6000 });
+      } else if (error.response?.status === 429) {
+        const retryAfter = error.response.headers?.['retry-after'] || error.response.data?.retry_after;
+        toast.error(`The oracle is busy. Please try again in ${retryAfter || 'a few'} seconds.`);
       } else {
         toast.error('Failed to generate spell. Please try again.');
       }
@@ -129,7 +132,8 @@ export const SpellRequest = ({ selectedArchetype: propArchetype }) => {
           <GrimoirePage 
             spell={spellResult.spell}
             archetype={spellResult.archetype}
-            imageBase64={spellResult.image_base64}
+            imageUrl={spellResult.image_url}
+            imageHash={spellResult.image_hash}
             onNewSpell={handleNewSpell}
           />
         </div>
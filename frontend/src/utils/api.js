@@ -3,6 +3,13 @@ import axios from 'axios';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Image references from the API are paths like /api/images/<hash>; pass a width
+// to get a resized WebP/AVIF derivative instead of the full-size original
+export const resolveImageUrl = (path, width) => {
+  if (!path) return null;
+  return width ? `${BACKEND_URL}${path}?w=${width}` : `${BACKEND_URL}${path}`;
+};
+
 const getAuthHeader = () => {
   const token = localStorage.getItem('token');
   return token ? { Authorization: `Bearer ${token}` } : {};
@@ -96,8 +103,9 @@ export const aiAPI = {
     });
     return response.data;
   },
-  generateImage: async (prompt) => {
-    const response = await axios.post(`${API}/ai/generate-image`, { prompt });
+  // fresh skips the server's prompt cache and renders a new variation
+  generateImage: async (prompt, fresh = false) => {
+    const response = await axios.post(`${API}/ai/generate-image`, { prompt, fresh });
     return response.data;
   },
 };
@@ -134,7 +142,7 @@ export const favoritesAPI = {
 };
 
 export const grimoireAPI = {
-  saveSpell: async (spellData, archetypeId, archetypeName, archetypeTitle, imageBase64) => {
+  saveSpell: async (spellData, archetypeId, archetypeName, archetypeTitle, imageHash) => {
     const response = await axios.post(
       `${API}/grimoire/save`,
       {
@@ -142,14 +150,21 @@ export const grimoireAPI = {
         archetype_id: archetypeId,
         archetype_name: archetypeName,
         archetype_title: archetypeTitle,
-        image_base64: imageBase64,
+        image_hash: imageHash,
       },
       { headers: getAuthHeader() }
     );
     return response.data;
   },
-  getAllSpells: async () => {
+  getSpells: async (cursor = null, limit = 24) => {
     const response = await axios.get(`${API}/grimoire/spells`, {
+      params: { cursor, limit },
+      headers: getAuthHeader(),
+    });
+    return response.data;
+  },
+  getSpell: async (spellId) => {
+    const response = await axios.get(`${API}/grimoire/spells/${spellId}`, {
       headers: getAuthHeader(),
     });
     return response.data;
@@ -200,12 +200,12 @@ def test_spell_generation():
         if response.status_code == 200:
             data = response.json()
             spell = data.get('spell', {})
-            image_base64 = data.get('image_base64')
+            image_url = data.get('image_url')
             
             if spell.get('title'):
                 print(f"✅ Spell generated: {spell.get('title')}")
-                if image_base64:
-                    print(f"✅ Image generated (length: {len(image_base64)} chars)")
+                if image_url:
+                    print(f"✅ Image generated ({image_url})")
                     tests_passed += 1
                 else:
                     print(f"⚠️  Spell generated but no image (may be expected)")
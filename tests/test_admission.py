@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from admission import (
+    PRIORITY_ANONYMOUS,
+    PRIORITY_FREE,
+    PRIORITY_PAID,
+    AdmissionController,
+    AdmissionRejected,
+)
+
+
+def _controller(capacity=1, max_queue=10, queue_timeout=5):
+    return AdmissionController({'spell': (capacity, max_queue, queue_timeout)})
+
+
+async def _hold(controller, priority, order, release, label=None):
+    async with controller.slot('spell', priority):
+        order.append(label if label is not None else priority)
+        await release.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    async def main():
+        controller = _controller(capacity=1)
+        order = []
+        gate = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, PRIORITY_ANONYMOUS, order, gate, 'holder'))
+        await _settle()
+
+        releases = {}
+        waiters = {}
+        for label, priority in [('anon', PRIORITY_ANONYMOUS), ('free 1', PRIORITY_FREE), ('paid', PRIORITY_PAID), ('free 2', PRIORITY_FREE)]:
+            releases[label] = asyncio.Event()
+            waiters[label] = asyncio.create_task(_hold(controller, priority, order, releases[label], label))
+            await _settle()
+
+        gate.set()
+        await holder
+        # Releasing each slot hands it straight to the best remaining waiter
+        for _ in waiters:
+            await _settle()
+            admitted = order[-1]
+            releases[admitted].set()
+            await waiters[admitted]
+        return order
+
+    assert asyncio.run(main()) == ['holder', 'paid', 'free 1', 'free 2', 'anon']
+
+
+def test_full_queue_rejects_equal_or_lower_priority():
+    async def main():
+        controller = _controller(capacity=1, max_queue=1)
+        gate = asyncio.Event()
+        order = []
+        holder = asyncio.create_task(_hold(controller, PRIORITY_FREE, order, gate))
+        waiter = asyncio.create_task(_hold(controller, PRIORITY_FREE, order, gate))
+        await _settle()
+
+        assert controller.saturated('spell', PRIORITY_FREE)
+        assert controller.saturated('spell', PRIORITY_ANONYMOUS)
+        assert not controller.saturated('spell', PRIORITY_PAID)
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await _hold(controller, PRIORITY_ANONYMOUS, order, gate)
+        assert excinfo.value.retry_after >= 1
+        with pytest.raises(AdmissionRejected):
+            await _hold(controller, PRIORITY_FREE, order, gate)
+
+        gate.set()
+        await asyncio.gather(holder, waiter)
+        return controller.stats()['spell']
+
+    stats = asyncio.run(main())
+    assert stats['rejected'] == 2
+    assert stats['admitted'] == 2
+    assert stats['active'] == 0
+
+
+def test_higher_priority_evicts_the_newest_anonymous_waiter():
+    async def main():
+        controller = _controller(capacity=1, max_queue=2)
+        gate = asyncio.Event()
+        order = []
+        holder = asyncio.create_task(_hold(controller, PRIORITY_FREE, order, gate, 'holder'))
+        await _settle()
+        first = asyncio.create_task(_hold(controller, PRIORITY_ANONYMOUS, order, gate, 'anon 1'))
+        await _settle()
+        second = asyncio.create_task(_hold(controller, PRIORITY_ANONYMOUS, order, gate, 'anon 2'))
+        await _settle()
+
+        paid = asyncio.create_task(_hold(controller, PRIORITY_PAID, order, gate, 'paid'))
+        await _settle()
+        with pytest.raises(AdmissionRejected):
+            await second
+
+        gate.set()
+        await asyncio.gather(holder, first, paid)
+        return order, controller.stats()['spell']
+
+    order, stats = asyncio.run(main())
+    assert order == ['holder', 'paid', 'anon 1']
+    assert stats['evicted'] == 1
+    assert stats['active'] == 0
+
+
+def test_queue_timeout_rejects_the_waiter():
+    async def main():
+        controller = _controller(capacity=1, queue_timeout=0.05)
+        gate = asyncio.Event()
+        order = []
+        holder = asyncio.create_task(_hold(controller, PRIORITY_PAID, order, gate))
+        await _settle()
+        with pytest.raises(AdmissionRejected):
+            await _hold(controller, PRIORITY_PAID, order, gate)
+        gate.set()
+        await holder
+        return controller.stats()['spell']
+
+    stats = asyncio.run(main())
+    assert stats['timed_out'] == 1
+    assert stats['waiting'] == 0
+    assert stats['active'] == 0
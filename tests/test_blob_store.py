@@ -0,0 +1,63 @@
+import asyncio
+
+from blob_store import FileSystemBlobStore, content_hash, is_content_hash, read_blob, sniff_content_type
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 16
+
+
+def test_put_is_addressed_by_content_and_deduplicated(tmp_path):
+    async def main():
+        store = FileSystemBlobStore(str(tmp_path / 'blobs'))
+        await store.setup()
+        first = await store.put(PNG)
+        again = await store.put(PNG)
+        other = await store.put(b'another image')
+        return store, first, again, other
+
+    store, first, again, other = asyncio.run(main())
+    assert first == again == content_hash(PNG)
+    assert other != first
+    files = [path for path in (tmp_path / 'blobs').rglob('*') if path.is_file()]
+    assert sorted(path.name for path in files) == sorted([first, other])
+    # Sharded by the first two byte pairs of the hash
+    assert store._path(first).relative_to(tmp_path / 'blobs').parts[:2] == (first[:2], first[2:4])
+
+
+def test_get_exists_and_delete(tmp_path):
+    async def main():
+        store = FileSystemBlobStore(str(tmp_path))
+        blob_hash = await store.put(PNG)
+        before = (await store.get(blob_hash), await store.exists(blob_hash))
+        await store.delete(blob_hash)
+        # Deleting twice is harmless
+        await store.delete(blob_hash)
+        return before, (await store.get(blob_hash), await store.exists(blob_hash))
+
+    before, after = asyncio.run(main())
+    assert before == (PNG, True)
+    assert after == (None, False)
+
+
+def test_read_blob_rejects_anything_but_a_hash(tmp_path):
+    async def main():
+        store = FileSystemBlobStore(str(tmp_path))
+        blob_hash = await store.put(PNG)
+        return (
+            await read_blob(store, blob_hash),
+            await read_blob(store, '../' + blob_hash[3:]),
+            await read_blob(store, content_hash(b'never stored'))
+        )
+
+    found, traversal, missing = asyncio.run(main())
+    assert found == (PNG, 'image/png')
+    assert traversal is None
+    assert missing is None
+    assert not is_content_hash(content_hash(PNG).upper())
+
+
+def test_sniff_content_type():
+    assert sniff_content_type(PNG) == 'image/png'
+    assert sniff_content_type(b'\xff\xd8\xff\xe0rest') == 'image/jpeg'
+    assert sniff_content_type(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'image/webp'
+    assert sniff_content_type(b'\x00\x00\x00\x1cftypavif') == 'image/avif'
+    assert sniff_content_type(b'plain bytes') == 'application/octet-stream'
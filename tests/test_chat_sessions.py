@@ -0,0 +1,67 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+motor_asyncio = pytest.importorskip('motor.motor_asyncio')
+
+from chat_sessions import ChatSessionStore
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+
+
+def _run(test):
+    """Run `test(store)` against a throwaway collection, skipping when Mongo is unreachable"""
+    async def main():
+        client = motor_asyncio.AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=500)
+        try:
+            try:
+                await client.admin.command('ping')
+            except Exception:
+                return False
+            db = client[f'test_chat_sessions_{uuid.uuid4().hex[:8]}']
+            try:
+                await db.chat_sessions.create_index('id', unique=True)
+                await test(ChatSessionStore(db.chat_sessions))
+            finally:
+                await client.drop_database(db.name)
+            return True
+        finally:
+            client.close()
+
+    if not asyncio.run(main()):
+        pytest.skip(f'MongoDB is not reachable at {MONGO_URL}')
+
+
+def test_owner_continues_their_own_session():
+    async def test(store):
+        session_id = await store.resolve(None, 'alice')
+        await store.append(session_id, 'alice', None, 'hello', 'greetings')
+        assert await store.resolve(session_id, 'alice') == session_id
+        session = await store.load(session_id, 'alice')
+        assert [turn['content'] for turn in session.turns] == ['hello', 'greetings']
+
+    _run(test)
+
+
+def test_another_owner_gets_a_new_session():
+    async def test(store):
+        session_id = await store.resolve(None, 'alice')
+        await store.append(session_id, 'alice', None, 'a secret', 'kept')
+        for intruder in ('mallory', None):
+            assert await store.load(session_id, intruder) is None
+            assert await store.resolve(session_id, intruder) != session_id
+
+    _run(test)
+
+
+def test_anonymous_sessions_stay_anonymous():
+    async def test(store):
+        session_id = await store.resolve(None, None)
+        await store.append(session_id, None, None, 'hello', 'greetings')
+        assert await store.resolve(session_id, None) == session_id
+        assert await store.load(session_id, 'alice') is None
+        assert await store.resolve(session_id, 'alice') != session_id
+
+    _run(test)
@@ -0,0 +1,91 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+motor_asyncio = pytest.importorskip('motor.motor_asyncio')
+
+from image_cache import ImagePromptCache
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+
+
+class _Store:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete(self, blob_hash):
+        self.deleted.append(blob_hash)
+
+
+def _run(test, **kwargs):
+    """Run `test(cache)` against throwaway collections, skipping when Mongo is unreachable"""
+    async def main():
+        client = motor_asyncio.AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=500)
+        try:
+            try:
+                await client.admin.command('ping')
+            except Exception:
+                return False
+            db = client[f'test_image_cache_{uuid.uuid4().hex[:8]}']
+            try:
+                await test(ImagePromptCache(db.image_cache, db.image_cache_releases, _Store(), **kwargs))
+            finally:
+                await client.drop_database(db.name)
+            return True
+        finally:
+            client.close()
+
+    if not asyncio.run(main()):
+        pytest.skip(f'MongoDB is not reachable at {MONGO_URL}')
+
+
+def test_shared_blobs_count_once():
+    async def test(cache):
+        await cache.put('model', 'a moonlit door', 'hash-1', 10)
+        await cache.put('model', 'a moonlit door, again', 'hash-1', 10)
+        await cache.put('model', 'a silver key', 'hash-2', 5)
+        assert await cache.total_bytes() == 15
+        assert cache.stats()['bytes'] == 15
+
+    _run(test)
+
+
+def test_aggregate_runs_only_when_the_counter_crosses_the_budget():
+    async def test(cache):
+        totals = []
+        total_bytes = cache.total_bytes
+
+        async def counted():
+            totals.append(1)
+            return await total_bytes()
+
+        cache.total_bytes = counted
+        for i in range(3):
+            await cache.put('model', f'prompt {i}', f'hash-{i}', 10)
+        # Only the first put syncs the counter
+        assert len(totals) == 1
+        await cache.put('model', 'prompt 3', 'hash-3', 10)
+        assert len(totals) == 2
+        assert cache.evicted == 1
+        assert cache.stats()['bytes'] == 30
+        assert await cache.get('model', 'prompt 0') is None
+
+    _run(test, max_bytes=35)
+
+
+def test_evicting_a_shared_blob_keeps_its_bytes():
+    async def test(cache):
+        await cache.put('model', 'old', 'hash-shared', 10)
+        await cache.put('model', 'other', 'hash-other', 10)
+        await cache.put('model', 'newer', 'hash-shared', 10)
+        await cache.get('model', 'newer')
+        await cache.put('model', 'last', 'hash-last', 10)
+        # 'old' goes first, but 'newer' still holds its blob, so 'other' must go too
+        assert await cache.get('model', 'old') is None
+        assert await cache.get('model', 'other') is None
+        assert await cache.get('model', 'newer') == 'hash-shared'
+        assert cache.stats()['bytes'] == 20
+
+    _run(test, max_bytes=25)
@@ -0,0 +1,97 @@
+import asyncio
+import io
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from blob_store import FileSystemBlobStore
+from image_derivatives import ImageDerivatives, build_derivatives
+
+
+class _Manifests:
+    """Just enough of a collection for the manifest lookups discard() makes"""
+
+    def __init__(self, *manifests):
+        self.docs = {manifest['source']: manifest for manifest in manifests}
+
+    async def find_one(self, query, projection=None):
+        return self.docs.get(query['source'])
+
+    async def delete_one(self, query):
+        self.docs.pop(query['source'], None)
+
+
+def _png(width, height):
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), (120, 40, 160)).save(out, format='PNG')
+    return out.getvalue()
+
+
+def _derivatives(store=None, collection=None):
+    derivatives = ImageDerivatives(store, collection or _Manifests(), widths=(320, 640, 1024))
+    # Independent of which encoders this Pillow build has
+    derivatives.formats = ('avif', 'webp')
+    return derivatives
+
+
+MANIFEST = {
+    'source': 'source',
+    'variants': {
+        'avif': {'320': 'avif-320', '640': 'avif-640'},
+        'webp': {'320': 'webp-320', '640': 'webp-640', '1024': 'webp-1024'},
+    },
+}
+
+
+def test_build_derivatives_never_upscales():
+    result = build_derivatives(_png(800, 400), (320, 640, 1024), ('webp',))
+    assert (result['width'], result['height']) == (800, 400)
+    assert sorted(result['variants']['webp']) == [320, 640]
+    with Image.open(io.BytesIO(result['variants']['webp'][320])) as small:
+        assert small.format == 'WEBP'
+        assert small.size == (320, 160)
+    with Image.open(io.BytesIO(result['placeholder'])) as placeholder:
+        assert placeholder.size == (16, 8)
+
+
+def test_choose_picks_the_smallest_fitting_width_in_the_best_accepted_format():
+    derivatives = _derivatives()
+    accept_all = 'image/avif,image/webp,*/*'
+    assert derivatives.choose(MANIFEST, 300, accept_all) == ('avif-320', 'image/avif')
+    assert derivatives.choose(MANIFEST, 321, accept_all) == ('avif-640', 'image/avif')
+    # Too wide for any AVIF, so the next format that has one wins
+    assert derivatives.choose(MANIFEST, 1000, accept_all) == ('webp-1024', 'image/webp')
+    assert derivatives.choose(MANIFEST, 640, 'image/webp,*/*') == ('webp-640', 'image/webp')
+
+
+def test_choose_falls_back_to_the_original():
+    derivatives = _derivatives()
+    assert derivatives.choose(MANIFEST, 2048, 'image/avif,image/webp') is None
+    assert derivatives.choose(MANIFEST, 320, 'image/png,*/*') is None
+    assert derivatives.choose({'source': 'source', 'variants': {}}, 320, 'image/webp') is None
+
+
+def test_discard_deletes_derivatives_and_manifest(tmp_path):
+    async def main():
+        store = FileSystemBlobStore(str(tmp_path))
+        source = await store.put(b'source image')
+        small = await store.put(b'small derivative')
+        large = await store.put(b'large derivative')
+        manifests = _Manifests({'source': source, 'variants': {'webp': {'320': small, '640': large}}})
+        derivatives = _derivatives(store, manifests)
+        assert await derivatives.manifest(source) is not None
+        await derivatives.discard(source)
+        # Unknown images are a no-op
+        await derivatives.discard('unknown')
+        return (
+            [await store.exists(blob) for blob in (source, small, large)],
+            manifests.docs,
+            await derivatives.manifest(source)
+        )
+
+    exists, docs, manifest = asyncio.run(main())
+    # The source itself is the caller's to delete
+    assert exists == [True, False, False]
+    assert docs == {}
+    assert manifest is None
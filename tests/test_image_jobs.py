@@ -0,0 +1,90 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+motor_asyncio = pytest.importorskip('motor.motor_asyncio')
+
+from image_jobs import JOB_COMPLETED, JOB_FAILED, ImageJobQueue, JobQueueFull
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+
+
+def _run(test):
+    """Run `test(jobs_collection)` against a throwaway collection, skipping when Mongo is unreachable"""
+    async def main():
+        client = motor_asyncio.AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=500)
+        try:
+            try:
+                await client.admin.command('ping')
+            except Exception:
+                return False
+            db = client[f'test_image_jobs_{uuid.uuid4().hex[:8]}']
+            try:
+                await test(db.image_jobs)
+            finally:
+                await client.drop_database(db.name)
+            return True
+        finally:
+            client.close()
+
+    if not asyncio.run(main()):
+        pytest.skip(f'MongoDB is not reachable at {MONGO_URL}')
+
+
+def test_job_result_is_returned_once_rendered():
+    async def test(collection):
+        rendered = []
+
+        async def render(prompt, fresh):
+            rendered.append((prompt, fresh))
+            return 'image-hash'
+
+        jobs = ImageJobQueue(collection, render, workers=1)
+        await jobs.start()
+        try:
+            job = await jobs.submit('a moonlit door', fresh=True)
+            assert 'image_hash' not in await jobs.get(job['id'])
+            done = await jobs.wait(job['id'], timeout=5)
+        finally:
+            await jobs.stop()
+        assert done['status'] == JOB_COMPLETED
+        assert done['image_hash'] == 'image-hash'
+        assert rendered == [('a moonlit door', True)]
+        assert jobs.stats()['completed'] == 1
+
+    _run(test)
+
+
+def test_failed_render_fails_the_job():
+    async def test(collection):
+        async def render(prompt, fresh):
+            raise RuntimeError('provider unavailable')
+
+        jobs = ImageJobQueue(collection, render, workers=1)
+        await jobs.start()
+        try:
+            job = await jobs.submit('a moonlit door')
+            done = await jobs.wait(job['id'], timeout=5)
+        finally:
+            await jobs.stop()
+        assert done['status'] == JOB_FAILED
+        assert done['error'] == 'provider unavailable'
+        assert jobs.stats()['failed'] == 1
+
+    _run(test)
+
+
+def test_full_queue_rejects_new_jobs():
+    async def test(collection):
+        async def render(prompt, fresh):
+            return 'image-hash'
+
+        # Not started, so nothing drains the queue
+        jobs = ImageJobQueue(collection, render, max_queue=1)
+        await jobs.submit('first')
+        with pytest.raises(JobQueueFull):
+            await jobs.submit('second')
+
+    _run(test)
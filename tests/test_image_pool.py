@@ -0,0 +1,86 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+motor_asyncio = pytest.importorskip('motor.motor_asyncio')
+
+from image_pool import ImagePool
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+
+PROMPTS = {('seer', 'love'): 'a rose window', ('seer', 'wealth'): 'a golden key'}
+
+
+def _run(test):
+    """Run `test(pool_collection)` against a throwaway collection, skipping when Mongo is unreachable"""
+    async def main():
+        client = motor_asyncio.AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=500)
+        try:
+            try:
+                await client.admin.command('ping')
+            except Exception:
+                return False
+            db = client[f'test_image_pool_{uuid.uuid4().hex[:8]}']
+            try:
+                await test(db.image_pool)
+            finally:
+                await client.drop_database(db.name)
+            return True
+        finally:
+            client.close()
+
+    if not asyncio.run(main()):
+        pytest.skip(f'MongoDB is not reachable at {MONGO_URL}')
+
+
+def _renderer(fail_after=None):
+    rendered = []
+
+    async def render(prompt):
+        if fail_after is not None and len(rendered) >= fail_after:
+            raise RuntimeError('provider busy')
+        rendered.append(prompt)
+        return f'hash-{len(rendered)}'
+
+    return render, rendered
+
+
+def test_refill_tops_up_every_pair_and_take_is_oldest_first():
+    async def test(collection):
+        render, rendered = _renderer()
+        pool = ImagePool(collection, render, PROMPTS, size=2)
+        assert await pool._refill()
+        assert await pool.levels() == {'seer/love': 2, 'seer/wealth': 2}
+        assert len(rendered) == 4
+        first = await pool.take('seer', 'love')
+        second = await pool.take('seer', 'love')
+        assert int(first.split('-')[1]) < int(second.split('-')[1])
+        assert await pool.take('seer', 'love') is None
+        # Unknown pairs are not pooled
+        assert await pool.take('sage', 'love') is None
+        assert (pool.taken, pool.empty) == (2, 1)
+        # A second pass only renders what was taken
+        assert await pool._refill()
+        assert len(rendered) == 6
+
+    _run(test)
+
+
+def test_failed_render_stops_the_refill_pass():
+    async def test(collection):
+        render, rendered = _renderer(fail_after=1)
+        pool = ImagePool(collection, render, PROMPTS, size=2)
+        assert not await pool._refill()
+        assert sum((await pool.levels()).values()) == 1
+        assert pool.render_errors == 1
+
+    _run(test)
+
+
+def test_disabled_pool_hands_out_nothing():
+    render, rendered = _renderer()
+    pool = ImagePool(None, render, PROMPTS, size=0)
+    assert asyncio.run(pool.take('seer', 'love')) is None
+    assert rendered == []
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('emergentintegrations')
+
+import llm_stream
+from llm_stream import _with_transcript, streams_directly
+
+
+class _FakeChat:
+    def __init__(self, api_key, session_id, system_message):
+        self.system_message = system_message
+
+    def with_model(self, provider, model):
+        return self
+
+    async def send_message(self, message):
+        return 'whole reply'
+
+
+def _collect(stream):
+    async def run():
+        return [chunk async for chunk in stream]
+    return asyncio.run(run())
+
+
+def test_fallback_replays_history_in_the_system_message():
+    history = [
+        {'role': 'user', 'content': 'Which herbs ward a threshold?'},
+        {'role': 'assistant', 'content': 'Rosemary and salt, traditionally.'},
+    ]
+    message = _with_transcript('You are a guide.', history)
+    assert message.startswith('You are a guide.')
+    assert 'Seeker: Which herbs ward a threshold?' in message
+    assert 'Guide: Rosemary and salt, traditionally.' in message
+
+
+def test_no_history_leaves_the_system_message_alone():
+    assert _with_transcript('You are a guide.', None) == 'You are a guide.'
+
+
+def test_emergent_key_streams_only_through_a_configured_base(monkeypatch):
+    monkeypatch.setattr(llm_stream, 'LLM_API_BASE', None)
+    assert not streams_directly('sk-emergent-abc')
+    assert streams_directly('sk-provider-abc')
+    monkeypatch.setattr(llm_stream, 'LLM_API_BASE', 'https://proxy.example/v1')
+    assert streams_directly('sk-emergent-abc')
+
+
+def test_emergent_key_is_never_sent_to_the_provider_without_a_base(monkeypatch):
+    async def refuse(**kwargs):
+        raise AssertionError('litellm must not be called')
+
+    monkeypatch.setattr(llm_stream, 'LLM_API_BASE', None)
+    monkeypatch.setattr(llm_stream.litellm, 'acompletion', refuse)
+    monkeypatch.setattr(llm_stream, 'LlmChat', _FakeChat)
+    usage = {}
+    chunks = _collect(llm_stream.stream_chat_completion('sk-emergent-abc', 'system', 'hello', usage=usage))
+    assert chunks == ['whole reply']
+    assert 'ttft_seconds' in usage
+
+
+def test_spell_completion_skips_litellm_for_an_emergent_key(monkeypatch):
+    async def refuse(**kwargs):
+        raise AssertionError('litellm must not be called')
+
+    monkeypatch.setattr(llm_stream, 'LLM_API_BASE', None)
+    monkeypatch.setattr(llm_stream.litellm, 'acompletion', refuse)
+    monkeypatch.setattr(llm_stream, 'LlmChat', _FakeChat)
+    reply = asyncio.run(llm_stream.complete_chat('sk-emergent-abc', 'spell system', 'an intention'))
+    assert reply == 'whole reply'
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+motor_asyncio = pytest.importorskip('motor.motor_asyncio')
+
+from quota import QuotaExceeded, SpellQuota
+
+# The reservation is a Mongo update pipeline, so these run against a real server
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+
+
+def _run(test):
+    """Run `test(users)` against a throwaway collection, skipping when Mongo is unreachable"""
+    async def main():
+        client = motor_asyncio.AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=500)
+        try:
+            try:
+                await client.admin.command('ping')
+            except Exception:
+                return False
+            db = client[f'test_quota_{uuid.uuid4().hex[:8]}']
+            try:
+                await test(db.users)
+            finally:
+                await client.drop_database(db.name)
+            return True
+        finally:
+            client.close()
+
+    if not asyncio.run(main()):
+        pytest.skip(f'MongoDB is not reachable at {MONGO_URL}')
+
+
+async def _new_user(users, **fields):
+    user_id = str(uuid.uuid4())
+    await users.insert_one({'id': user_id, 'subscription_tier': 'free', **fields})
+    return user_id
+
+
+def test_reserve_up_to_the_limit_then_reject():
+    async def test(users):
+        quota = SpellQuota(users, limit=2)
+        user_id = await _new_user(users)
+        assert (await quota.reserve(user_id)).count == 1
+        reservation = await quota.reserve(user_id)
+        assert reservation.count == 2
+        assert quota.limit_info(reservation)['remaining'] == 0
+        with pytest.raises(QuotaExceeded):
+            await quota.reserve(user_id)
+        assert (await users.find_one({'id': user_id}))['spell_generation_count'] == 2
+
+    _run(test)
+
+
+def test_concurrent_reservations_never_overshoot():
+    async def test(users):
+        quota = SpellQuota(users, limit=3)
+        user_id = await _new_user(users)
+        results = await asyncio.gather(*[quota.reserve(user_id) for _ in range(10)], return_exceptions=True)
+        assert sum(1 for result in results if not isinstance(result, Exception)) == 3
+        assert (await users.find_one({'id': user_id}))['spell_generation_count'] == 3
+
+    _run(test)
+
+
+def test_paid_users_are_not_counted():
+    async def test(users):
+        quota = SpellQuota(users, limit=1)
+        user_id = await _new_user(users, subscription_tier='paid')
+        for _ in range(3):
+            reservation = await quota.reserve(user_id)
+            assert not reservation.charged
+        assert quota.limit_info(reservation)['remaining'] == -1
+
+    _run(test)
+
+
+def test_refund_within_the_window():
+    async def test(users):
+        quota = SpellQuota(users, limit=1)
+        user_id = await _new_user(users)
+        reservation = await quota.reserve(user_id)
+        await quota.refund(reservation)
+        assert (await users.find_one({'id': user_id}))['spell_generation_count'] == 0
+        # Refunding twice gives back nothing more
+        await quota.refund(reservation)
+        assert (await users.find_one({'id': user_id}))['spell_generation_count'] == 0
+        assert (await quota.reserve(user_id)).count == 1
+
+    _run(test)
+
+
+def test_refund_after_the_window_rolls_over_is_ignored():
+    async def test(users):
+        quota = SpellQuota(users, limit=3)
+        user_id = await _new_user(users)
+        stale = await quota.reserve(user_id)
+        expired = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+        await users.update_one({'id': user_id}, {'$set': {'spell_generation_reset': expired}})
+
+        fresh = await quota.reserve(user_id)
+        assert fresh.count == 1
+        assert fresh.window != stale.window
+        # The stale reservation belonged to the old window, so the new one's count stands
+        await quota.refund(stale)
+        assert (await users.find_one({'id': user_id}))['spell_generation_count'] == 1
+
+    _run(test)
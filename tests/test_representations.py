@@ -0,0 +1,46 @@
+from starlette.requests import Request
+
+from representations import MIN_COMPRESS_BYTES, RepresentationCache
+
+
+def _request(**headers):
+    return Request({
+        'type': 'http',
+        'method': 'GET',
+        'path': '/',
+        'headers': [(name.replace('_', '-').encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def _body():
+    return b'[' + b','.join([b'{"name": "ritual"}'] * MIN_COMPRESS_BYTES) + b']'
+
+
+def test_each_coding_has_its_own_etag():
+    representation = RepresentationCache().get('rituals', 'list', _body)
+    identity = representation.response(_request())
+    gzipped = representation.response(_request(accept_encoding='gzip'))
+    assert gzipped.headers['content-encoding'] == 'gzip'
+    assert identity.headers['etag'] != gzipped.headers['etag']
+    assert gzipped.headers['etag'].endswith('-gzip"')
+
+
+def test_if_none_match_only_matches_the_selected_coding():
+    representation = RepresentationCache().get('rituals', 'list', _body)
+    gzip_etag = representation.response(_request(accept_encoding='gzip')).headers['etag']
+    assert representation.response(_request(accept_encoding='gzip', if_none_match=gzip_etag)).status_code == 304
+    assert representation.response(_request(if_none_match=gzip_etag)).status_code == 200
+    assert representation.response(_request(accept_encoding='gzip', if_none_match=f'W/{gzip_etag}')).status_code == 304
+
+
+def test_groups_are_bounded():
+    cache = RepresentationCache(max_entries=2)
+    for key in ('a', 'b'):
+        cache.get('rituals', key, lambda: b'[]')
+    cache.get('rituals', 'a', lambda: b'[]')
+    cache.get('rituals', 'c', lambda: b'[]')
+    assert cache.stats()['entries'] == {'rituals': 2}
+    assert cache.evictions == 1
+    builds = cache.builds
+    cache.get('rituals', 'a', lambda: b'[]')
+    assert cache.builds == builds
@@ -0,0 +1,295 @@
+import asyncio
+import time
+
+import pytest
+
+from resilience import (
+    CLOSED,
+    HALF_OPEN,
+    MIN_HEDGE_SAMPLES,
+    OPEN,
+    BudgetSpent,
+    CircuitBreaker,
+    CircuitOpen,
+    DeadlineExceeded,
+    ProviderGuard,
+    deadline_in,
+    deadline_scope,
+)
+
+
+class ProviderDown(Exception):
+    status_code = 503
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def _guard(**kwargs):
+    kwargs.setdefault('timeout', 5)
+    kwargs.setdefault('backoff', 0)
+    kwargs.setdefault('hedge', False)
+    return ProviderGuard('test', **kwargs)
+
+
+def _stream_of(*chunks):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+    return stream
+
+
+def _collect(stream):
+    async def run():
+        return [chunk async for chunk in stream]
+    return asyncio.run(run())
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() > 1
+
+
+def test_breaker_half_open_admits_one_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opens == 2
+
+
+def test_non_transient_error_does_not_close_a_half_open_circuit():
+    guard = _guard(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+    guard.breaker.record_failure()
+
+    async def bad_request():
+        raise BadRequest('malformed')
+
+    with pytest.raises(BadRequest):
+        asyncio.run(guard.call(bad_request))
+    assert guard.breaker.state == HALF_OPEN
+    assert guard.breaker.failures == 1
+    # The probe slot is free again for the next request
+    assert guard.breaker.allow()
+
+
+def test_non_transient_error_is_not_retried_or_counted():
+    guard = _guard()
+    attempts = []
+
+    async def bad_request():
+        attempts.append(1)
+        raise BadRequest('malformed')
+
+    with pytest.raises(BadRequest):
+        asyncio.run(guard.call(bad_request))
+    assert len(attempts) == 1
+    assert guard.failures == 0
+
+
+def test_transient_errors_are_retried():
+    guard = _guard(retries=2)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ProviderDown('unavailable')
+        return 'ok'
+
+    assert asyncio.run(guard.call(flaky)) == 'ok'
+    assert len(attempts) == 3
+    assert guard.retried == 2
+    assert guard.breaker.state == CLOSED
+
+
+def test_open_circuit_short_circuits_calls():
+    guard = _guard(retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30))
+
+    async def down():
+        raise ProviderDown('unavailable')
+
+    with pytest.raises(ProviderDown):
+        asyncio.run(guard.call(down))
+    with pytest.raises(CircuitOpen) as excinfo:
+        asyncio.run(guard.call(down))
+    assert excinfo.value.retry_after >= 1
+    assert guard.short_circuited == 1
+
+
+def test_call_is_bounded_by_its_timeout():
+    guard = _guard(timeout=0.05, retries=0)
+
+    async def hang():
+        await asyncio.sleep(5)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(guard.call(hang))
+    assert time.monotonic() - started < 1
+    assert guard.deadline_exceeded == 1
+
+
+def test_deadline_scope_shortens_the_timeout():
+    guard = _guard(timeout=5, retries=0)
+
+    async def run():
+        with deadline_scope(0.05):
+            await guard.call(lambda: asyncio.sleep(5))
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert time.monotonic() - started < 1
+
+
+def test_endpoint_deadline_never_extends_the_timeout():
+    guard = _guard(timeout=0.05, retries=0)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(guard.call(lambda: asyncio.sleep(5), deadline=deadline_in(5)))
+    assert time.monotonic() - started < 1
+
+
+def test_spent_budget_never_reaches_the_breaker():
+    guard = _guard(retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30))
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return 'ok'
+
+    for _ in range(3):
+        with pytest.raises(BudgetSpent):
+            asyncio.run(guard.call(call, deadline=time.monotonic() - 1))
+        with pytest.raises(BudgetSpent):
+            _collect(guard.stream(_stream_of('a'), deadline=time.monotonic() - 1))
+    assert calls == []
+    assert guard.breaker.state == CLOSED
+    assert guard.failures == 0
+    assert guard.deadline_exceeded == 6
+
+
+def test_call_timeout_counts_against_the_breaker():
+    guard = _guard(timeout=0.05, retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30))
+    with pytest.raises(DeadlineExceeded) as excinfo:
+        asyncio.run(guard.call(lambda: asyncio.sleep(5)))
+    assert not isinstance(excinfo.value, BudgetSpent)
+    assert guard.breaker.state == OPEN
+
+
+def test_slow_call_is_hedged():
+    guard = _guard(hedge=True, min_hedge_delay=0.01)
+    guard._latencies.extend([0.01] * MIN_HEDGE_SAMPLES)
+    calls = []
+
+    async def first_slow():
+        calls.append(1)
+        await asyncio.sleep(5 if len(calls) == 1 else 0)
+        return len(calls)
+
+    started = time.monotonic()
+    assert asyncio.run(guard.call(first_slow)) == 2
+    assert time.monotonic() - started < 1
+    assert guard.hedged == 1
+    assert guard.hedge_wins == 1
+
+
+def test_no_hedging_before_enough_samples():
+    guard = _guard(hedge=True, min_hedge_delay=0.01)
+    calls = []
+
+    async def slowish():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'ok'
+
+    assert asyncio.run(guard.call(slowish)) == 'ok'
+    assert len(calls) == 1
+    assert guard.hedged == 0
+
+
+def test_stream_retries_before_the_first_chunk():
+    guard = _guard(retries=1)
+    opened = []
+
+    async def stream():
+        opened.append(1)
+        if len(opened) == 1:
+            raise ProviderDown('unavailable')
+        yield 'a'
+        yield 'b'
+
+    assert _collect(guard.stream(stream)) == ['a', 'b']
+    assert len(opened) == 2
+
+
+def test_stream_is_not_retried_after_the_first_chunk():
+    guard = _guard(retries=2)
+    opened = []
+
+    async def stream():
+        opened.append(1)
+        yield 'a'
+        raise ProviderDown('dropped')
+
+    with pytest.raises(ProviderDown):
+        _collect(guard.stream(stream))
+    assert len(opened) == 1
+
+
+def test_slow_first_chunk_is_hedged():
+    guard = _guard(hedge=True, min_hedge_delay=0.01)
+    guard._first_chunk_latencies.extend([0.01] * MIN_HEDGE_SAMPLES)
+    opened = []
+    closed = []
+
+    async def stream():
+        index = len(opened)
+        opened.append(index)
+        try:
+            if index == 0:
+                await asyncio.sleep(5)
+            yield f'stream {index}'
+        finally:
+            closed.append(index)
+
+    started = time.monotonic()
+    assert _collect(guard.stream(stream)) == ['stream 1']
+    assert time.monotonic() - started < 1
+    assert guard.hedged == 1
+    assert guard.hedge_wins == 1
+    assert sorted(closed) == [0, 1]
+
+
+def test_stream_is_bounded_by_its_deadline():
+    guard = _guard(retries=0)
+
+    async def stream():
+        yield 'a'
+        await asyncio.sleep(5)
+        yield 'b'
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        _collect(guard.stream(stream, deadline=deadline_in(0.05)))
+    assert time.monotonic() - started < 1
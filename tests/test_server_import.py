@@ -0,0 +1,22 @@
+import asyncio
+import importlib
+import os
+
+import pytest
+
+
+def test_server_imports(monkeypatch):
+    """Module-level wiring (singletons, prompt tables, pools) must not depend on later definitions"""
+    pytest.importorskip('emergentintegrations')
+    monkeypatch.setenv('MONGO_URL', os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    monkeypatch.setenv('DB_NAME', os.environ.get('DB_NAME', 'test_database'))
+    # Earlier asyncio.run() calls leave no current loop; import under a loop of our own
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        server = importlib.import_module('server')
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+    assert server.app is not None
+    assert server.image_pool.prompts
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_calls_share_one_execution():
+    async def main():
+        flights = SingleFlight()
+        calls = []
+        gate = asyncio.Event()
+
+        async def call():
+            calls.append(1)
+            await gate.wait()
+            return 'spell'
+
+        waiters = [asyncio.create_task(flights.do('key', call)) for _ in range(5)]
+        await _settle()
+        gate.set()
+        return await asyncio.gather(*waiters), calls, flights.stats()
+
+    results, calls, stats = asyncio.run(main())
+    assert results == ['spell'] * 5
+    assert len(calls) == 1
+    assert stats == {'in_flight': 0, 'calls': 1, 'coalesced': 4, 'cancelled': 0}
+
+
+def test_waiters_share_the_exception():
+    async def main():
+        flights = SingleFlight()
+        gate = asyncio.Event()
+
+        async def call():
+            await gate.wait()
+            raise ValueError('provider failed')
+
+        waiters = [asyncio.create_task(flights.do('key', call)) for _ in range(3)]
+        await _settle()
+        gate.set()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_different_keys_and_later_calls_run_separately():
+    async def main():
+        flights = SingleFlight()
+        calls = []
+
+        async def call():
+            calls.append(1)
+            return len(calls)
+
+        first, other = await asyncio.gather(flights.do('a', call), flights.do('b', call))
+        again = await flights.do('a', call)
+        return first, other, again
+
+    assert asyncio.run(main()) == (1, 2, 3)
+
+
+def test_call_survives_while_any_waiter_remains():
+    async def main():
+        flights = SingleFlight()
+        gate = asyncio.Event()
+
+        async def call():
+            await gate.wait()
+            return 'spell'
+
+        leaving = asyncio.create_task(flights.do('key', call))
+        staying = asyncio.create_task(flights.do('key', call))
+        await _settle()
+        leaving.cancel()
+        await _settle()
+        gate.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying, flights.stats()
+
+    result, stats = asyncio.run(main())
+    assert result == 'spell'
+    assert stats['cancelled'] == 0
+
+
+def test_last_waiter_leaving_cancels_the_call():
+    async def main():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def call():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flights.do('key', call)) for _ in range(2)]
+        await _settle()
+        for waiter in waiters:
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await _settle()
+        return flights.stats()
+
+    stats = asyncio.run(main())
+    assert stats['cancelled'] == 1
+    assert stats['in_flight'] == 0
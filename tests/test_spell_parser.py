@@ -0,0 +1,93 @@
+import json
+
+from spell_parser import SpellFieldStream, SpellParser, repair_json
+
+SPELL = {
+    'title': 'A Warding at the Threshold',
+    'subtitle': 'For a safe home',
+    'image_prompt': 'salt across a doorway',
+    'introduction': 'An old working, "kept" by many households.',
+    'materials': [{'name': 'Salt', 'icon': 'salt', 'note': 'A boundary'}],
+    'timing': {'moon_phase': 'Waning'},
+    'steps': [{'number': 1, 'title': 'Lay the salt', 'instruction': 'Across the threshold, {left to right}.'}],
+    'spoken_words': {'main_incantation': 'By salt and flame.'},
+    'historical_context': {'tradition': 'British folk magic'},
+    'warnings': ['Never leave a candle unattended'],
+    'closing_message': 'So let it be.',
+}
+
+
+def _stream(text, chunk_size):
+    stream = SpellFieldStream()
+    emitted = []
+    for start in range(0, len(text), chunk_size):
+        emitted.extend(stream.feed(text[start:start + chunk_size]))
+    return stream, emitted
+
+
+def test_stream_emits_each_field_once_across_chunk_boundaries():
+    text = json.dumps(SPELL, indent=2)
+    for chunk_size in (1, 7, len(text)):
+        stream, emitted = _stream(text, chunk_size)
+        assert [name for name, _ in emitted] == list(SPELL)
+        assert stream.fields == SPELL
+        assert stream.done
+
+
+def test_stream_skips_prose_with_brackets_and_quotes_before_the_object():
+    text = 'Here is your spell [as "requested"]:\n```json\n' + json.dumps(SPELL) + '\n```\nBlessed be [always].'
+    stream, emitted = _stream(text, 5)
+    assert stream.fields == SPELL
+    assert len(emitted) == len(SPELL)
+
+
+def test_stream_holds_back_a_field_until_it_is_complete():
+    stream = SpellFieldStream()
+    assert stream.feed('{"title": "A Warding", "materials": [{"name": "Salt"') == [('title', 'A Warding')]
+    assert stream.feed('}], ') == [('materials', [{'name': 'Salt'}])]
+
+
+def test_stream_drops_fields_that_do_not_fit_the_schema():
+    stream = SpellFieldStream()
+    emitted = stream.feed('{"title": ["not", "a", "string"], "materials": [{"note": "no name"}], "subtitle": "ok"}')
+    assert emitted == [('subtitle', 'ok')]
+
+
+def test_repair_ignores_fences_and_trailing_commas():
+    text = '```json\n{"title": "A Warding", "warnings": ["Care",],}\n```'
+    assert repair_json(text) == {'title': 'A Warding', 'warnings': ['Care']}
+
+
+def test_repair_closes_a_truncated_string_and_object():
+    assert repair_json('{"title": "A Warding", "introduction": "An old work') == {
+        'title': 'A Warding',
+        'introduction': 'An old work',
+    }
+
+
+def test_repair_drops_a_half_written_member():
+    repaired = repair_json('{"title": "A Warding", "materials": [{"name": "Salt"}], "timing": {"moon_phase":')
+    assert repaired == {'title': 'A Warding', 'materials': [{'name': 'Salt'}]}
+
+
+def test_repair_gives_up_without_an_object():
+    assert repair_json('The oracle is silent.') is None
+
+
+def test_parser_reports_missing_required_fields():
+    parser = SpellParser()
+    truncated = json.dumps(SPELL)[:json.dumps(SPELL).index('"timing"')]
+    spell, missing = parser.parse(truncated)
+    assert spell['title'] == SPELL['title']
+    assert spell['materials'] == SPELL['materials']
+    assert 'timing' in missing and 'steps' in missing
+    assert 'warnings' not in missing
+    assert parser.stats()['repaired'] == 1
+
+
+def test_parser_accepts_strict_json():
+    parser = SpellParser()
+    spell, missing = parser.parse(json.dumps(SPELL))
+    assert spell == SPELL
+    assert missing == []
+    assert parser.stats()['strict'] == 1